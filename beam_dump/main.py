@@ -1,13 +1,20 @@
-import pyray as rl
-import random
 import math
 import json
 import concurrent.futures
+import time
 from collections import deque
 from dataclasses import dataclass, asdict
 from typing import List
 from datetime import datetime
-from epics import caput
+from epics_common import epicsdb, instrumentation, pool, snapshot
+from epics_common.batch import BatchWriter
+from epics_common.health import HealthMonitor
+from epics_common.lazy import lazy_import
+from epics_common.scheduler import PublishScheduler, publish_periods
+
+# Loaded on first use, so CA searches start while raylib and NumPy load
+rl = lazy_import("pyray")
+np = lazy_import("numpy")
 
 
 @dataclass
@@ -20,6 +27,7 @@ class TargetDistribution:
     max_deviation: float = 0.0
     total_particles: int = 0
 
+    @instrumentation.timed("DUMP:DIST_UPDATE")
     def update(self, particles_data: deque):
         if len(particles_data) == 0:
             return
@@ -43,6 +51,43 @@ class TargetDistribution:
         self.max_deviation = max(distances)
 
 
+class DumpHistogram:
+    """2D x/y histogram and radial density profile of the particles at the dump"""
+
+    def __init__(self, bins: int, limits, radial_bins: int, radial_max: float):
+        self.edges = np.linspace(limits[0], limits[1], bins + 1)
+        self.radial_edges = np.linspace(0.0, radial_max, radial_bins + 1)
+        self.radial_centers = 0.5 * (self.radial_edges[:-1] + self.radial_edges[1:])
+        self.ring_area = np.pi * np.diff(self.radial_edges**2)
+        self.counts = np.zeros((bins, bins), dtype=np.int32)
+        self.radial = np.zeros(radial_bins)
+
+    @instrumentation.timed("DUMP:HISTOGRAM")
+    def update(self, particles_data: deque):
+        """Rebin every particle, those outside the histogram range are not counted"""
+        bins = len(self.edges) - 1
+        radial_bins = len(self.radial_edges) - 1
+        if len(particles_data) == 0:
+            self.counts = np.zeros((bins, bins), dtype=np.int32)
+            self.radial = np.zeros(radial_bins)
+            return
+
+        # Uniform bins, so each index is one multiply instead of a search
+        points = np.array(particles_data)
+        x, y = points[:, 0], points[:, 1]
+        scale = bins / (self.edges[-1] - self.edges[0])
+        ix = np.floor((x - self.edges[0]) * scale).astype(np.intp)
+        iy = np.floor((y - self.edges[0]) * scale).astype(np.intp)
+        inside = (ix >= 0) & (ix < bins) & (iy >= 0) & (iy < bins)
+        self.counts = np.bincount(
+            iy[inside] * bins + ix[inside], minlength=bins * bins
+        ).reshape(bins, bins)
+
+        ring = (np.hypot(x, y) * (radial_bins / self.radial_edges[-1])).astype(np.intp)
+        ring = ring[ring < radial_bins]
+        self.radial = np.bincount(ring, minlength=radial_bins) / self.ring_area
+
+
 @dataclass
 class SteeringMagnet:
     z_position: float
@@ -52,42 +97,42 @@ class SteeringMagnet:
     strength: float = 1.0
     is_corrector: bool = True
 
-    def get_effective_kick_x(self, jitter: float = 0.0) -> float:
-        return self.kick_x + random.gauss(0, jitter)
-
-    def get_effective_kick_y(self, jitter: float = 0.0) -> float:
-        return self.kick_y + random.gauss(0, jitter)
-
 
 SCREEN_WIDTH = 2000
 SCREEN_HEIGHT = 900
 CAMERA_DISTANCE = 50.0
-IOC_PREFIX = "bradm"
-PVS = {
-    "mean_x": f"{IOC_PREFIX}:DUMP:MEAN_X",
-    "mean_y": f"{IOC_PREFIX}:DUMP:MEAN_Y",
-    "std_x": f"{IOC_PREFIX}:DUMP:STD_X",
-    "std_y": f"{IOC_PREFIX}:DUMP:STD_Y",
-    "rms_radius": f"{IOC_PREFIX}:DUMP:RMS_RADIUS",
-    "max_dev": f"{IOC_PREFIX}:DUMP:MAX_DEV",
-    "particles": f"{IOC_PREFIX}:DUMP:PARTICLES",
-    "timestamp": f"{IOC_PREFIX}:DUMP:TIMESTAMP",
-    "inj_kick_x": f"{IOC_PREFIX}:STEER:INJ:KICK_X",
-    "inj_kick_y": f"{IOC_PREFIX}:STEER:INJ:KICK_Y",
-    "inj_strength": f"{IOC_PREFIX}:STEER:INJ:STRENGTH",
-    "h1_kick_x": f"{IOC_PREFIX}:STEER:H1:KICK_X",
-    "h1_kick_y": f"{IOC_PREFIX}:STEER:H1:KICK_Y",
-    "h1_strength": f"{IOC_PREFIX}:STEER:H1:STRENGTH",
-    "v1_kick_x": f"{IOC_PREFIX}:STEER:V1:KICK_X",
-    "v1_kick_y": f"{IOC_PREFIX}:STEER:V1:KICK_Y",
-    "v1_strength": f"{IOC_PREFIX}:STEER:V1:STRENGTH",
-    "h2_kick_x": f"{IOC_PREFIX}:STEER:H2:KICK_X",
-    "h2_kick_y": f"{IOC_PREFIX}:STEER:H2:KICK_Y",
-    "h2_strength": f"{IOC_PREFIX}:STEER:H2:STRENGTH",
-    "final_kick_x": f"{IOC_PREFIX}:STEER:FINAL:KICK_X",
-    "final_kick_y": f"{IOC_PREFIX}:STEER:FINAL:KICK_Y",
-    "final_strength": f"{IOC_PREFIX}:STEER:FINAL:STRENGTH",
+# PV names, units and limits come from beam_dump.db via user.substitutions
+IOC = epicsdb.load_ioc()
+IOC_PREFIX = IOC.prefix
+PVS = IOC.pv_map("DUMP", "STEER", writable=True)
+HIST_BINS = math.isqrt(PVS["hist_xy"].nelm)
+HIST_RANGE = (PVS["hist_edges"].lopr, PVS["hist_edges"].hopr)
+RADIAL_BINS = PVS["radial_profile"].nelm
+RADIAL_MAX = PVS["radial_r"].hopr
+# Every DUMP and STEER record is Passive; the beam readbacks publish at
+# PASSIVE_PERIOD, magnet settings only change on a key press
+PASSIVE_PERIOD = 0.5  # s
+PUBLISH_PERIODS = {
+    "timestamp": 1.0,
+    **{spec.key: 1.0 for spec in IOC.subsystem("STEER")},
 }
+# Bin edges and ring centers are put once at startup, HealthMonitor owns HEALTH
+AXIS_PVS = (PVS["hist_edges"].name, PVS["radial_r"].name)
+# A batch whose centroid passes a MAJOR limit of OFFSET latches DUMP:TRIP
+# without waiting for a publish, see beam_dump.db for why not single particles
+TRIP_PV = PVS["trip"].name
+TRIP_LIMIT = min(
+    limit
+    for name, (limit, severity) in IOC[f"{IOC_PREFIX}:DUMP:OFFSET"].alarm_limits.items()
+    if name in ("HIHI", "HIGH") and severity >= epicsdb.SEVERITIES["MAJOR"]
+)
+# Particles tracked each frame for the trip check, only the first is drawn
+TRIP_BATCH = 64
+PUBLISHED = [
+    pv
+    for pv in PVS.values()
+    if pv.name not in AXIS_PVS and pv.name != TRIP_PV and ":HEALTH:" not in pv.name
+]
 
 STEERING_MAGNETS = [
     SteeringMagnet(0.0, "Injector Corrector", strength=0.8),
@@ -158,41 +203,125 @@ def get_heatmap_color(distance, max_distance=2.0):
     return rl.Color(r, g, b, 200)
 
 
-def calculate_beam_trajectory(
-    z: float,
-    magnets: List[SteeringMagnet],
-    start_x: float = 0.2,
-    start_y: float = 0.6,
-    emittance_x: float = 2.0,
-    emittance_y: float = 4.0,
-    magnet_jitter_x: float = 0.05,
-    magnet_jitter_y: float = 0.5,
-) -> tuple:
-    x = start_x
-    y = start_y
-    angle_x = random.gauss(0, emittance_x)
-    angle_y = random.gauss(0, emittance_y)
-
-    last_z = 0.0
-
-    for magnet in magnets:
-        if magnet.z_position > z:
-            drift = z - last_z
-            x += angle_x * 0.001 * drift
-            y += angle_y * 0.001 * drift
-            break
-
-        drift = magnet.z_position - last_z
-        x += angle_x * 0.001 * drift
-        y += angle_y * 0.001 * drift
-
-        if magnet.is_corrector:
-            angle_x += magnet.get_effective_kick_x(magnet_jitter_x) * magnet.strength
-            angle_y += magnet.get_effective_kick_y(magnet_jitter_y) * magnet.strength
-
-        last_z = magnet.z_position
+# Positions move 0.001 per unit z per mrad of angle
+ANGLE_SCALE = 0.001
+
+
+def drift_map(length: float):
+    """4x4 affine map of (x, y, x', y') over a drift, as a 5x5 homogeneous matrix"""
+    m = np.eye(5)
+    m[0, 2] = m[1, 3] = ANGLE_SCALE * length
+    return m
+
+
+def kick_map(kick_x: float, kick_y: float):
+    """Angle kick in mrad as a 5x5 homogeneous matrix"""
+    m = np.eye(5)
+    m[2, 4] = kick_x
+    m[3, 4] = kick_y
+    return m
+
+
+class Lattice:
+    """
+    Steering magnets compiled into cumulative transfer maps
+
+    Every element is a drift to its z followed by a kick, both affine, so the
+    mean state (x, y, x', y') just after each element is a product of 5x5
+    homogeneous maps. The random initial angles and kick jitter are Gaussian
+    and pass through the same linear part, so each element also stores the
+    4x4 covariance of the state. A particle at any z is then one drift from
+    the preceding element and a Gaussian sample, however many elements there
+    are. The maps are recompiled when a magnet's position, kick or strength
+    changes.
+    """
+
+    def __init__(
+        self,
+        magnets: List[SteeringMagnet],
+        start=(0.2, 0.6),
+        emittance=(2.0, 4.0),
+        jitter=(0.05, 0.5),
+    ):
+        self.magnets = magnets
+        self.start = start
+        self.emittance = emittance
+        self.jitter = jitter
+        self.rng = np.random.default_rng()
+        self._signature = None
+
+    def signature(self) -> tuple:
+        return tuple(
+            (m.z_position, m.kick_x, m.kick_y, m.strength, m.is_corrector)
+            for m in self.magnets
+        )
 
-    return (x, y, angle_x, angle_y)
+    def compile(self):
+        """Compose the maps of every element, magnets must be sorted by z"""
+        n = len(self.magnets)
+        # Index 0 is the entrance at z = 0, element i is magnets[i - 1]
+        self.z = np.zeros(n + 1)
+        self.maps = np.empty((n + 1, 5, 5))
+        self.cov = np.zeros((n + 1, 4, 4))
+        self.maps[0] = np.eye(5)
+        self.cov[0, 2, 2] = self.emittance[0] ** 2
+        self.cov[0, 3, 3] = self.emittance[1] ** 2
+        for i, magnet in enumerate(self.magnets, 1):
+            self.z[i] = magnet.z_position
+            drift = drift_map(self.z[i] - self.z[i - 1])
+            self.maps[i] = drift @ self.maps[i - 1]
+            self.cov[i] = drift[:4, :4] @ self.cov[i - 1] @ drift[:4, :4].T
+            if magnet.is_corrector:
+                kick = kick_map(
+                    magnet.kick_x * magnet.strength, magnet.kick_y * magnet.strength
+                )
+                self.maps[i] = kick @ self.maps[i]
+                self.cov[i, 2, 2] += (self.jitter[0] * magnet.strength) ** 2
+                self.cov[i, 3, 3] += (self.jitter[1] * magnet.strength) ** 2
+        initial = np.array([self.start[0], self.start[1], 0.0, 0.0, 1.0])
+        self.mean = self.maps @ initial
+        self._signature = self.signature()
+
+    def update(self) -> bool:
+        """Recompile if a magnet changed since the last compile"""
+        if self.signature() == self._signature:
+            return False
+        self.compile()
+        return True
+
+    @instrumentation.timed("DUMP:TRAJECTORY")
+    def sample(self, z, count: int = 1):
+        """
+        (x, y, x', y') of independent particles at z, shape (n, 4)
+
+        z is one position for count particles or an array with one particle
+        per position.
+        """
+        self.update()
+        z = np.asarray(z, dtype=float)
+        if z.ndim == 0:
+            z = np.full(count, float(z))
+        i = np.maximum(np.searchsorted(self.z, z, side="right") - 1, 0)
+        k = ANGLE_SCALE * (z - self.z[i])
+        mean = self.mean[i, :4].copy()
+        mean[:, :2] += k[:, None] * mean[:, 2:]
+
+        # x and y are uncoupled, so sample each (position, angle) plane from
+        # its 2x2 covariance drifted to z, angle first then position given angle
+        state = np.empty((len(z), 4))
+        normal = self.rng.standard_normal((len(z), 4))
+        for p in (0, 1):
+            a = p + 2
+            var_a = self.cov[i, a, a]
+            cov_pa = self.cov[i, p, a] + k * var_a
+            var_p = self.cov[i, p, p] + 2 * k * self.cov[i, p, a] + k * k * var_a
+            state[:, a] = mean[:, a] + np.sqrt(var_a) * normal[:, a]
+            slope = np.divide(cov_pa, var_a, out=np.zeros_like(k), where=var_a > 0)
+            spread = np.sqrt(np.maximum(var_p - slope * cov_pa, 0.0))
+            state[:, p] = (
+                mean[:, p] + slope * (state[:, a] - mean[:, a]) + spread * normal[:, p]
+            )
+        return state
 
 
 def draw_steering_magnet(magnet: SteeringMagnet, is_selected: bool):
@@ -228,29 +357,28 @@ def draw_steering_magnet(magnet: SteeringMagnet, is_selected: bool):
         )
 
 
-def draw_beam_trajectory(magnets: List[SteeringMagnet]):
+def draw_beam_trajectory(lattice: Lattice):
     num_segments = 1000
     z_start = 0
-    z_end = magnets[-1].z_position
+    z_end = lattice.magnets[-1].z_position
 
+    z = np.linspace(z_start, z_end, num_segments + 1)
+    points = lattice.sample(z)
     for i in range(num_segments):
-        z1 = z_start + (z_end - z_start) * i / num_segments
-        z2 = z_start + (z_end - z_start) * (i + 1) / num_segments
-
-        x1, y1, _, _ = calculate_beam_trajectory(z1, magnets)
-        x2, y2, _, _ = calculate_beam_trajectory(z2, magnets)
-
+        x1, y1 = points[i, :2]
+        x2, y2 = points[i + 1, :2]
         rl.draw_line_3d(
-            rl.Vector3(x1, y1, z1), rl.Vector3(x2, y2, z2), rl.Color(0, 255, 255, 180)
+            rl.Vector3(x1, y1, z[i]),
+            rl.Vector3(x2, y2, z[i + 1]),
+            rl.Color(0, 255, 255, 180),
         )
 
     envelope_samples = 20
-    for i in range(envelope_samples):
-        z = z_start + (z_end - z_start) * i / envelope_samples
-        x, y, _, _ = calculate_beam_trajectory(z, magnets)
+    z = z_start + (z_end - z_start) * np.arange(envelope_samples) / envelope_samples
+    for (x, y, _, _), zi in zip(lattice.sample(z), z):
         radius = 0.3
         rl.draw_circle_3d(
-            rl.Vector3(x, y, z),
+            rl.Vector3(x, y, zi),
             radius,
             rl.Vector3(0, 0, 1),
             90.0,
@@ -262,6 +390,7 @@ def draw_ui(
     selected_magnet_idx: int,
     magnets: List[SteeringMagnet],
     target_dist: TargetDistribution,
+    trip: "TripPath",
 ):
     rl.draw_text(
         "Beamline Control Simulator",
@@ -289,7 +418,9 @@ def draw_ui(
     y_pos += 20
     rl.draw_text("C: Clear particles", 15, y_pos, 14, rl.RAYWHITE)
     y_pos += 20
-    rl.draw_text("D: Dump params to console (JSON)", 15, y_pos, 14, rl.RAYWHITE)
+    rl.draw_text("D: Dump params + save snapshot", 15, y_pos, 14, rl.RAYWHITE)
+    y_pos += 20
+    rl.draw_text("T: Reset machine protection trip", 15, y_pos, 14, rl.RAYWHITE)
 
     info_x = SCREEN_WIDTH - 400
     y_pos = 45
@@ -310,6 +441,14 @@ def draw_ui(
         13,
         rl.RAYWHITE,
     )
+    y_pos += 18
+    rl.draw_text(
+        f"Trip: {'TRIPPED' if trip.tripped else 'OK'} (centroid limit {trip.limit:.1f} m)",
+        info_x,
+        y_pos,
+        13,
+        rl.RED if trip.tripped else rl.RAYWHITE,
+    )
     y_pos += 30
 
     rl.draw_text("Steering Magnets", info_x, y_pos, 18, rl.RAYWHITE)
@@ -389,39 +528,142 @@ def dump_system_state(
     print(json.dumps(state, indent=2))
 
 
-def publish_to_epics(target_dist: TargetDistribution, magnets: List[SteeringMagnet]):
+def save_machine_snapshot():
     try:
-        caput(PVS["mean_x"], target_dist.mean_x, wait=False)
-        caput(PVS["mean_y"], target_dist.mean_y, wait=False)
-        caput(PVS["std_x"], target_dist.std_x, wait=False)
-        caput(PVS["std_y"], target_dist.std_y, wait=False)
-        caput(PVS["rms_radius"], target_dist.rms_radius, wait=False)
-        caput(PVS["max_dev"], target_dist.max_deviation, wait=False)
-        caput(PVS["particles"], target_dist.total_particles, wait=False)
-        caput(
-            PVS["timestamp"], datetime.now().strftime("%Y-%m-%d %H:%M:%S"), wait=False
-        )
-        caput(PVS["inj_kick_x"], magnets[0].kick_x, wait=False)
-        caput(PVS["inj_kick_y"], magnets[0].kick_y, wait=False)
-        caput(PVS["inj_strength"], magnets[0].strength, wait=False)
-        caput(PVS["h1_kick_x"], magnets[1].kick_x, wait=False)
-        caput(PVS["h1_kick_y"], magnets[1].kick_y, wait=False)
-        caput(PVS["h1_strength"], magnets[1].strength, wait=False)
-        caput(PVS["v1_kick_x"], magnets[2].kick_x, wait=False)
-        caput(PVS["v1_kick_y"], magnets[2].kick_y, wait=False)
-        caput(PVS["v1_strength"], magnets[2].strength, wait=False)
-        caput(PVS["h2_kick_x"], magnets[3].kick_x, wait=False)
-        caput(PVS["h2_kick_y"], magnets[3].kick_y, wait=False)
-        caput(PVS["h2_strength"], magnets[3].strength, wait=False)
-        caput(PVS["final_kick_x"], magnets[4].kick_x, wait=False)
-        caput(PVS["final_kick_y"], magnets[4].kick_y, wait=False)
-        caput(PVS["final_strength"], magnets[4].strength, wait=False)
+        machine = snapshot.capture(IOC)
+        path = machine.save()
+        print(f"Saved {len(machine)} PVs to {path} ({machine.digest[:12]})")
     except Exception as e:
-        print(f"\nWarning: Could not publish to EPICS: {e}")
-        pass
+        print(f"Warning: Could not save machine snapshot: {e}")
+
+
+def publish_histogram_axes(histogram: DumpHistogram):
+    """Bin edges and ring centers only change with the records, put them once"""
+    pool.caput(PVS["hist_edges"].name, histogram.edges)
+    pool.caput(PVS["radial_r"].name, histogram.radial_centers)
+
+
+@instrumentation.timed("DUMP:PUBLISH")
+def publish_to_epics(
+    writer: BatchWriter,
+    due,
+    target_dist: TargetDistribution,
+    magnets: List[SteeringMagnet],
+    histogram: DumpHistogram,
+) -> int:
+    """Write the PVs in due with a single flush, returns the failed count"""
+    values = [
+        (PVS["hist_xy"].name, histogram.counts.ravel()),
+        (PVS["radial_profile"].name, histogram.radial),
+        (PVS["mean_x"].name, target_dist.mean_x),
+        (PVS["mean_y"].name, target_dist.mean_y),
+        (PVS["std_x"].name, target_dist.std_x),
+        (PVS["std_y"].name, target_dist.std_y),
+        (PVS["rms_radius"].name, target_dist.rms_radius),
+        (PVS["max_dev"].name, target_dist.max_deviation),
+        (PVS["particles"].name, target_dist.total_particles),
+        (PVS["timestamp"].name, datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+        (PVS["inj_kick_x"].name, magnets[0].kick_x),
+        (PVS["inj_kick_y"].name, magnets[0].kick_y),
+        (PVS["inj_strength"].name, magnets[0].strength),
+        (PVS["h1_kick_x"].name, magnets[1].kick_x),
+        (PVS["h1_kick_y"].name, magnets[1].kick_y),
+        (PVS["h1_strength"].name, magnets[1].strength),
+        (PVS["v1_kick_x"].name, magnets[2].kick_x),
+        (PVS["v1_kick_y"].name, magnets[2].kick_y),
+        (PVS["v1_strength"].name, magnets[2].strength),
+        (PVS["h2_kick_x"].name, magnets[3].kick_x),
+        (PVS["h2_kick_y"].name, magnets[3].kick_y),
+        (PVS["h2_strength"].name, magnets[3].strength),
+        (PVS["final_kick_x"].name, magnets[4].kick_x),
+        (PVS["final_kick_y"].name, magnets[4].kick_y),
+        (PVS["final_strength"].name, magnets[4].strength),
+    ]
+    due = set(due)
+    failed = writer.write((pv, value) for pv, value in values if pv in due)
+    if failed:
+        instrumentation.count("DUMP:PUBLISH_ERRORS", failed)
+    return failed
+
+
+class TripPath:
+    """
+    Machine-protection path from newly tracked particles straight to DUMP:TRIP
+
+    check() runs on every particle batch as soon as it is tracked, ahead of
+    the histogram, the publish scheduler and drawing. The first batch whose
+    centroid is more than limit off center puts TRIP with a put callback on
+    a channel opened at startup and flushes at once, so a beam swinging off
+    center trips within one IOC round trip rather than at the next publish
+    up to PASSIVE_PERIOD later. It watches the centroid rather than single
+    particles, since the tails of the nominal beam cross the limit every few
+    frames. The trip latches until reset(). The time from detection to the
+    put callback is observed as DUMP:TRIP_LATENCY and kept in latency.
+    """
+
+    def __init__(self, pvname: str, limit: float):
+        from epics import ca
+
+        self._ca = ca
+        self.pvname = pvname
+        self.limit = limit
+        self.chid = ca.create_channel(pvname, connect=False, auto_cb=False)
+        self.tripped = False
+        self.latency = None
+
+    def check(self, batch) -> bool:
+        """Trip if the x/y centroid of an (n, 2+) batch is beyond the limit, True if it tripped now"""
+        if self.tripped:
+            return False
+        x, y = batch[:, 0].mean(), batch[:, 1].mean()
+        deviation = math.hypot(x, y)
+        if deviation <= self.limit:
+            return False
+        detected = time.perf_counter()
+        try:
+            if not self._ca.isConnected(self.chid):
+                raise ConnectionError(f"{self.pvname} not connected")
+            self._ca.put(
+                self.chid,
+                1,
+                callback=self._confirmed,
+                callback_data={"detected": detected, "deviation": deviation},
+            )
+        except Exception as e:
+            # Not latched, so the next batch beyond the limit tries again
+            instrumentation.count("DUMP:TRIP_ERRORS")
+            print(f"Warning: Could not trip at {deviation:.3f} m: {e}")
+            return False
+        self.tripped = True
+        return True
+
+    def _confirmed(self, pvname=None, detected=0.0, deviation=0.0, **kwargs):
+        """Put callback on the CA thread once the IOC has processed TRIP"""
+        self.latency = time.perf_counter() - detected
+        instrumentation.observe("DUMP:TRIP_LATENCY", self.latency)
+        print(
+            f"TRIP: centroid {deviation:.3f} m off center, beyond {self.limit} m, "
+            f"{pvname} processed {self.latency * 1e3:.2f} ms after detection"
+        )
+
+    def reset(self):
+        """Clear the latch and TRIP, the next batch beyond the limit trips again"""
+        self.tripped = False
+        if self._ca.isConnected(self.chid):
+            self._ca.put(self.chid, 0)
 
 
 def main():
+    epics_executor = concurrent.futures.ThreadPoolExecutor()
+    # Search for every published PV up front rather than on the first publish,
+    # in the background while the window opens
+    epics_executor.submit(pool.warm_up, AXIS_PVS)
+    writer = BatchWriter([pv.name for pv in PUBLISHED], connect_timeout=0)
+    trip = TripPath(TRIP_PV, TRIP_LIMIT)
+    scheduler = PublishScheduler(
+        publish_periods(PUBLISHED, PASSIVE_PERIOD, PUBLISH_PERIODS)
+    )
+
     rl.set_config_flags(rl.ConfigFlags.FLAG_BORDERLESS_WINDOWED_MODE)
     rl.set_config_flags(rl.ConfigFlags.FLAG_WINDOW_UNDECORATED)
     rl.init_window(SCREEN_WIDTH, SCREEN_HEIGHT, "Beamline Control Simulator")
@@ -430,9 +672,11 @@ def main():
     camera_3d = Camera3D()
     selected_magnet_idx = 0
     target_dist = TargetDistribution()
-    epics_executor = concurrent.futures.ThreadPoolExecutor()
-    last_publish_time = 0.0
-    publish_interval = 0.5
+    histogram = DumpHistogram(HIST_BINS, HIST_RANGE, RADIAL_BINS, RADIAL_MAX)
+    lattice = Lattice(STEERING_MAGNETS)
+    perf_reporter = instrumentation.start_from_env(IOC_PREFIX)
+    health = HealthMonitor(IOC_PREFIX, "DUMP").start()
+    epics_executor.submit(publish_histogram_axes, histogram)
 
     while not rl.window_should_close():
         camera_3d.update()
@@ -475,13 +719,18 @@ def main():
         if rl.is_key_pressed(rl.KeyboardKey.KEY_C):
             particles.clear()
 
+        if rl.is_key_pressed(rl.KeyboardKey.KEY_T):
+            trip.reset()
+
         if rl.is_key_pressed(rl.KeyboardKey.KEY_D):
             dump_system_state(STEERING_MAGNETS, target_dist)
+            epics_executor.submit(save_machine_snapshot)
 
         dump_magnet = STEERING_MAGNETS[-1]
-        px, py, _, _ = calculate_beam_trajectory(
-            dump_magnet.z_position, STEERING_MAGNETS
-        )
+        batch = lattice.sample(dump_magnet.z_position, TRIP_BATCH)
+        # Before anything else in the frame, so a trip never waits for drawing
+        trip.check(batch)
+        px, py, _, _ = batch[0]
 
         ideal_x = 0
         ideal_y = 0
@@ -490,32 +739,50 @@ def main():
 
         target_dist.update(particles)
 
-        current_time = rl.get_time()
-        if current_time - last_publish_time >= publish_interval:
-            epics_executor.submit(publish_to_epics, target_dist, STEERING_MAGNETS)
-            last_publish_time = current_time
+        # Everything due on this tick goes out in one batch, a dropped batch
+        # goes out again with the next tick
+        due = scheduler.due()
+        if due:
+            if PVS["hist_xy"].name in due:
+                # update() replaces the arrays, so the publisher never sees them change
+                histogram.update(particles)
+            future = health.submit(
+                epics_executor,
+                publish_to_epics,
+                writer,
+                due,
+                target_dist,
+                STEERING_MAGNETS,
+                histogram,
+            )
+            if future is None:
+                scheduler.defer(due)
 
-        rl.begin_drawing()
-        rl.clear_background(rl.BLACK)
+        with instrumentation.timer("DUMP:DRAW"):
+            rl.begin_drawing()
+            rl.clear_background(rl.BLACK)
 
-        camera = camera_3d.get_camera()
-        rl.begin_mode_3d(camera)
+            camera = camera_3d.get_camera()
+            rl.begin_mode_3d(camera)
 
-        for i, magnet in enumerate(STEERING_MAGNETS):
-            draw_steering_magnet(magnet, i == selected_magnet_idx)
+            for i, magnet in enumerate(STEERING_MAGNETS):
+                draw_steering_magnet(magnet, i == selected_magnet_idx)
 
-        draw_beam_trajectory(STEERING_MAGNETS)
+            draw_beam_trajectory(lattice)
 
-        for px, py, pz, dist in particles:
-            color = get_heatmap_color(dist)
-            rl.draw_sphere(rl.Vector3(px, py, pz), 0.12, color)
+            for px, py, pz, dist in particles:
+                color = get_heatmap_color(dist)
+                rl.draw_sphere(rl.Vector3(px, py, pz), 0.12, color)
 
-        rl.end_mode_3d()
+            rl.end_mode_3d()
 
-        draw_ui(selected_magnet_idx, STEERING_MAGNETS, target_dist)
+            draw_ui(selected_magnet_idx, STEERING_MAGNETS, target_dist, trip)
 
-        rl.end_drawing()
+            rl.end_drawing()
 
+    health.stop()
+    if perf_reporter:
+        perf_reporter.stop()
     rl.close_window()
 
 
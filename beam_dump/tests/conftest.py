@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The simulator is a script, not a package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
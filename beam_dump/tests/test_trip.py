@@ -0,0 +1,84 @@
+import sys
+import types
+
+import numpy as np
+import pytest
+
+from main import TripPath
+
+
+class StubCA:
+    """The parts of epics.ca TripPath uses, recording puts instead of sending them"""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.puts = []
+
+    def create_channel(self, pvname, connect=False, auto_cb=True):
+        return pvname
+
+    def isConnected(self, chid):
+        return True
+
+    def put(self, chid, value, callback=None, callback_data=None):
+        if self.fail:
+            raise RuntimeError("put failed")
+        self.puts.append((chid, value))
+        if callback:
+            callback(pvname=chid, **(callback_data or {}))
+
+
+@pytest.fixture
+def ca(monkeypatch):
+    stub = StubCA()
+    monkeypatch.setitem(sys.modules, "epics", types.SimpleNamespace(ca=stub))
+    return stub
+
+
+def batch(x, y, n=64):
+    """n particles centred on (x, y) with a spread wider than the limit"""
+    rng = np.random.default_rng(0)
+    spread = rng.normal(0.0, 2.0, (n, 2))
+    spread -= spread.mean(axis=0)
+    return np.column_stack([spread + (x, y), np.zeros(n), np.zeros(n)])
+
+
+def test_centroid_under_limit_does_not_put(ca):
+    trip = TripPath("TEST:DUMP:TRIP", 1.0)
+    # Single particles are far beyond the limit, the centroid is not
+    assert not trip.check(batch(0.6, 0.6))
+    assert ca.puts == []
+    assert not trip.tripped
+
+
+def test_centroid_over_limit_puts_once_and_latches(ca):
+    trip = TripPath("TEST:DUMP:TRIP", 1.0)
+    assert trip.check(batch(0.9, 0.9))
+    assert not trip.check(batch(1.5, 0.0))
+    assert ca.puts == [("TEST:DUMP:TRIP", 1)]
+    assert trip.tripped
+    assert trip.latency is not None
+
+
+def test_put_failure_does_not_latch(ca):
+    trip = TripPath("TEST:DUMP:TRIP", 1.0)
+    ca.fail = True
+    assert not trip.check(batch(2.0, 0.0))
+    assert not trip.tripped
+    ca.fail = False
+    assert trip.check(batch(2.0, 0.0))
+    assert ca.puts == [("TEST:DUMP:TRIP", 1)]
+
+
+def test_reset_rearms_the_trip(ca):
+    trip = TripPath("TEST:DUMP:TRIP", 1.0)
+    assert trip.check(batch(0.0, 2.0))
+    trip.reset()
+    assert not trip.tripped
+    assert ca.puts[-1] == ("TEST:DUMP:TRIP", 0)
+    assert trip.check(batch(0.0, 2.0))
+    assert ca.puts == [
+        ("TEST:DUMP:TRIP", 1),
+        ("TEST:DUMP:TRIP", 0),
+        ("TEST:DUMP:TRIP", 1),
+    ]
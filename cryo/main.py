@@ -0,0 +1,268 @@
+import argparse
+import concurrent.futures
+import queue
+import sys
+import time
+import numpy as np
+from epics import PV
+from epics_common import epicsdb, instrumentation
+from epics_common.alarms import AlarmEngine
+from epics_common.batch import BatchWriter
+from epics_common.health import HealthMonitor
+
+IOC = epicsdb.load_ioc()
+IOC_PREFIX = IOC.prefix
+PVS = IOC.pv_map("CRYO", writable=True)
+
+NUM_LOOPS = 3
+TICK_RATE = 10.0  # Hz
+PUBLISH_INTERVAL = 0.5  # s, matches the ".5 second" SCAN of the sensors
+BATH_TEMP = 1.95  # K, 2 K helium bath at nominal return pressure
+HEAT_CAPACITY = 100.0  # J/K per cavity
+CONDUCTANCE = 50.0  # W/K from cavity to bath with coolant flowing
+STATIC_LOAD = 1.0  # W per cavity
+RF_LOAD = (2.0, 6.0)  # W per cavity, dynamic load range
+SUPPLY_FLOW = 30.0  # g/s
+SUPPLY_PRESSURE = 3.0  # bar
+SUPPLY_TEMP = 4.4  # K
+SHIELD_TEMP = 70.0  # K
+HELIUM_CP = 5.2  # J/(g K)
+LATENT_HEAT = 23.0  # J/g at 2 K
+VALVE_TIME = 3.0  # s, valve stroke and flow settling time constant
+READY_BAND = 0.05  # K around setpoint
+
+# Loop parameters monitored from the IOC, (loop key suffix, array name)
+LOOP_PARAMS = (("sp", "setpoint"), ("kp", "kp"), ("ki", "ki"), ("kd", "kd"))
+SENSORS = [PVS[f"temp_cav{i + 1}"] for i in range(NUM_LOOPS)] + [PVS["flow_supply"]]
+
+
+class CryoPlant:
+    """Cavity thermal model and PID loops for many cryomodules as (module, loop) arrays"""
+
+    def __init__(self, modules=1, seed=None):
+        shape = (modules, NUM_LOOPS)
+        self.modules = modules
+        self.rng = np.random.default_rng(seed)
+        self.temp = np.full(shape, BATH_TEMP)
+        self.rf_load = self.rng.uniform(*RF_LOAD, shape)
+        self.heater = np.zeros(shape)
+        self.integral = np.zeros(shape)
+        self.last_temp = self.temp.copy()
+
+        setpoints = [PVS[f"pid{i + 1}_sp"] for i in range(NUM_LOOPS)]
+        heaters = [PVS[f"htr{i + 1}_power"] for i in range(NUM_LOOPS)]
+        self.span = np.array([s.drvh - s.drvl for s in setpoints])
+        self.heater_min = np.array([h.drvl for h in heaters])
+        self.heater_max = np.array([h.drvh for h in heaters])
+        for suffix, name in LOOP_PARAMS:
+            values = [PVS[f"pid{i + 1}_{suffix}"].value for i in range(NUM_LOOPS)]
+            setattr(self, name, np.array(values, dtype=float))
+
+        self.inlet = float(PVS["valve_inlet"].value)
+        self.outlet = float(PVS["valve_outlet"].value)
+        self.flow = SUPPLY_FLOW * self.inlet
+        self.return_flow = self.flow * self.outlet
+        self.shield = SHIELD_TEMP
+        self.ticks = 0
+        self.updates = queue.SimpleQueue()
+
+    def set_parameter(self, name, loop, value):
+        """Queue a loop parameter or valve change for the start of the next tick"""
+        self.updates.put((name, loop, value))
+
+    def _apply_updates(self):
+        while True:
+            try:
+                name, loop, value = self.updates.get_nowait()
+            except queue.Empty:
+                return
+            if loop is None:
+                setattr(self, name, float(value))
+            else:
+                getattr(self, name)[loop] = value
+
+    @instrumentation.timed("CRYO:TICK")
+    def tick(self, dt):
+        """Apply pending parameter changes, run every PID loop, advance the plant"""
+        self._apply_updates()
+
+        # PID on normalized error, derivative on measurement to avoid setpoint kicks
+        error = (self.setpoint - self.temp) / self.span
+        rate = (self.temp - self.last_temp) / (dt * self.span)
+        span = self.heater_max - self.heater_min
+        output = self.kp * error + self.ki * self.integral - self.kd * rate
+        # Conditional integration: stop integrating into a saturated heater
+        saturated = ((output >= 1.0) & (error > 0)) | ((output <= 0.0) & (error < 0))
+        self.integral += np.where(saturated, 0.0, error * dt)
+        output = self.kp * error + self.ki * self.integral - self.kd * rate
+        self.heater = self.heater_min + span * np.clip(output, 0.0, 1.0)
+        self.last_temp = self.temp.copy()
+
+        # Valves move the coolant flow, which sets the cavity-to-bath coupling
+        settle = 1.0 - np.exp(-dt / VALVE_TIME)
+        self.flow += (SUPPLY_FLOW * self.inlet - self.flow) * settle
+        coupling = CONDUCTANCE * (0.05 + 0.95 * self.flow / SUPPLY_FLOW)
+
+        self.rf_load += self.rng.normal(0.0, 0.05, self.rf_load.shape) * np.sqrt(dt)
+        np.clip(self.rf_load, *RF_LOAD, out=self.rf_load)
+        load = STATIC_LOAD + self.rf_load + self.heater
+
+        # Implicit step of C dT/dt = Q - G (T - T_bath), stable for any dt
+        bath = BATH_TEMP + 0.02 * (self.return_pressure()[:, None] - 1.0)
+        self.temp = (HEAT_CAPACITY * self.temp + dt * (load + coupling * bath)) / (
+            HEAT_CAPACITY + dt * coupling
+        )
+
+        boiloff = load.sum(axis=1) / LATENT_HEAT
+        target_return = self.outlet * (0.95 * self.flow + boiloff[0])
+        self.return_flow += (target_return - self.return_flow) * settle
+        self.shield += (SHIELD_TEMP - self.shield) * settle + self.rng.normal(0, 0.02)
+        self.ticks += 1
+
+    def return_pressure(self):
+        """Return line pressure of every module, rising with its heat load"""
+        return 1.0 + 0.005 * (STATIC_LOAD + self.rf_load + self.heater).sum(axis=1)
+
+    def readings(self):
+        """Sensor values for the module published to cryo.db"""
+        noise = self.rng.normal(0.0, 1.0, 6)
+        load = (STATIC_LOAD + self.rf_load[0] + self.heater[0]).sum()
+        return_temp = SUPPLY_TEMP + load / (max(self.flow, 1.0) * HELIUM_CP)
+        return {
+            "temp_cav1": self.temp[0, 0] + 0.001 * noise[0],
+            "temp_cav2": self.temp[0, 1] + 0.001 * noise[1],
+            "temp_cav3": self.temp[0, 2] + 0.001 * noise[2],
+            "temp_supply": SUPPLY_TEMP + 0.005 * noise[3],
+            "temp_return": return_temp + 0.005 * noise[4],
+            "temp_shield": self.shield,
+            "flow_supply": max(self.flow + 0.1 * noise[5], 0.0),
+            "flow_return": max(self.return_flow, 0.0),
+            "press_supply": SUPPLY_PRESSURE * (0.1 + 0.9 * self.inlet),
+            "press_return": self.return_pressure()[0],
+            "htr1_power": self.heater[0, 0],
+            "htr2_power": self.heater[0, 1],
+            "htr3_power": self.heater[0, 2],
+        }
+
+    def ready(self):
+        return bool(np.all(np.abs(self.temp[0] - self.setpoint) < READY_BAND))
+
+
+def subscribe(plant: CryoPlant):
+    """Monitor setpoints, gains and valves, queueing changes for the next tick"""
+    monitors = []
+    for i in range(NUM_LOOPS):
+        for suffix, name in LOOP_PARAMS:
+            pv = PVS[f"pid{i + 1}_{suffix}"]
+            callback = lambda value=None, name=name, loop=i, **kw: (
+                plant.set_parameter(name, loop, value)
+            )
+            monitors.append(PV(pv.name, callback=callback))
+    for name in ("inlet", "outlet"):
+        pv = PVS[f"valve_{name}"]
+        callback = lambda value=None, name=name, **kw: (
+            plant.set_parameter(name, None, value)
+        )
+        monitors.append(PV(pv.name, callback=callback))
+    return monitors
+
+
+@instrumentation.timed("CRYO:PUBLISH")
+def publish_to_epics(writer: BatchWriter, readings, status, ready) -> int:
+    items = [(PVS[key].name, value) for key, value in readings.items()]
+    items.append((PVS["status"].name, int(status)))
+    items.append((PVS["ready"].name, int(ready)))
+    return writer.write(items)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Cryogenic plant simulator")
+    parser.add_argument(
+        "--modules",
+        type=int,
+        default=1,
+        help="cryomodules to simulate, the first is published to cryo.db",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=TICK_RATE,
+        help="loop tick rate in Hz, 0 runs ticks back to back",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    print("Cryogenic Plant Simulator")
+    print("Press Ctrl+C to exit\n")
+
+    plant = CryoPlant(args.modules)
+    monitors = subscribe(plant)
+    alarms = AlarmEngine(SENSORS)
+    sensor_keys = [s.key for s in SENSORS]
+    dt = 1.0 / (args.rate or TICK_RATE)
+    writer = BatchWriter(
+        [PVS[key].name for key in plant.readings()]
+        + [PVS["status"].name, PVS["ready"].name]
+    )
+    epics_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    perf_reporter = instrumentation.start_from_env(IOC_PREFIX)
+    health = HealthMonitor(IOC_PREFIX, "CRYO").start()
+
+    start_time = time.time()
+    next_tick = start_time
+    last_publish_time = 0.0
+    window_start, window_ticks, tick_rate = start_time, 0, 0.0
+
+    try:
+        while True:
+            now = time.time()
+            if args.rate and now < next_tick:
+                time.sleep(next_tick - now)
+            next_tick += dt
+
+            plant.tick(dt)
+            window_ticks += 1
+            now = time.time()
+            if now - window_start >= 1.0:
+                tick_rate = window_ticks / (now - window_start)
+                window_start, window_ticks = now, 0
+
+            if now - start_time - last_publish_time >= PUBLISH_INTERVAL:
+                last_publish_time = now - start_time
+                readings = plant.readings()
+                alarms.evaluate([readings[key] for key in sensor_keys], now)
+                status = alarms.severity.max() < epicsdb.SEVERITIES["MAJOR"]
+                health.submit(
+                    epics_executor,
+                    publish_to_epics,
+                    writer,
+                    readings,
+                    status,
+                    plant.ready(),
+                )
+
+                temps = " ".join(f"{t:.3f}K" for t in plant.temp[0])
+                heaters = " ".join(f"{p:.1f}W" for p in plant.heater[0])
+                color = "\033[92m" if status else "\033[91m"
+                sys.stdout.write(
+                    f"\r{color}CAV {temps}\033[0m | HTR {heaters} | "
+                    f"flow={plant.flow:.1f}g/s | "
+                    f"{plant.modules * NUM_LOOPS} loops @ {tick_rate:.0f} Hz  "
+                )
+                sys.stdout.flush()
+
+    except KeyboardInterrupt:
+        print("\n\nSimulator stopped.")
+        print(f"Total ticks: {plant.ticks}")
+        for pv in monitors:
+            pv.clear_callbacks()
+        health.stop()
+        if perf_reporter:
+            perf_reporter.stop()
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
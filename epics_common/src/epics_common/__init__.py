@@ -0,0 +1,3 @@
+"""
+Shared helpers for the EPICS simulators and Channel Access clients
+"""
@@ -0,0 +1,219 @@
+"""
+Streaming Anomaly Detection
+Vectorized EWMA, z-score and CUSUM state for many channels, updated as samples arrive
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+STEP, DRIFT_UP, DRIFT_DOWN = "STEP", "DRIFT_UP", "DRIFT_DOWN"
+
+
+@dataclass
+class Anomaly:
+    """A channel flagged by the detector"""
+
+    pvname: str
+    timestamp: float
+    value: float
+    kind: str
+    # z-score for a STEP, CUSUM sum for a drift
+    score: float
+    # EWMA mean for a STEP, CUSUM reference for a drift
+    baseline: float
+
+
+class AnomalyDetector:
+    """
+    Step and drift detection for many channels held in flat arrays
+
+    Each channel keeps an exponentially weighted mean and variance. A sample
+    more than z_limit standard deviations from the mean is a STEP. Smaller
+    persistent offsets are caught by a two-sided CUSUM with slack cusum_k,
+    flagged as DRIFT_UP or DRIFT_DOWN when a sum passes cusum_h. The CUSUM
+    measures against its own reference, a much slower mean (cusum_alpha)
+    that starts from the warmup mean, so a slow ramp is not absorbed into
+    the baseline it is compared with. While either sum is past half of
+    cusum_h the mean, variance and reference are held, so a developing
+    drift cannot pull them along. After any flag the channel warms up
+    again from the new level. Nothing is flagged during the first warmup
+    samples of a channel. The standard deviation is floored at min_std or
+    rel_std of the mean, so channels that sit at one value, or at 1e-9 Torr,
+    still get a sensible scale.
+
+    Every update is a fixed number of array operations over the channels in
+    it, O(1) per sample however many channels there are.
+    """
+
+    def __init__(
+        self,
+        names,
+        alpha=0.02,
+        z_limit=6.0,
+        cusum_k=0.5,
+        cusum_h=10.0,
+        cusum_alpha=0.002,
+        warmup=20,
+        min_std=1e-12,
+        rel_std=1e-3,
+    ):
+        self.names = list(names)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.alpha = alpha
+        self.z_limit = z_limit
+        self.cusum_k = cusum_k
+        self.cusum_h = cusum_h
+        self.cusum_alpha = cusum_alpha
+        self.warmup = warmup
+        self.min_std = min_std
+        self.rel_std = rel_std
+        n = len(self.names)
+        self.count = np.zeros(n, dtype=np.int64)
+        self.mean = np.zeros(n)
+        self.var = np.zeros(n)
+        # CUSUM reference level and samples since it was started
+        self.ref = np.zeros(n)
+        self.ref_count = np.zeros(n, dtype=np.int64)
+        self.z = np.zeros(n)
+        self.cusum_pos = np.zeros(n)
+        self.cusum_neg = np.zeros(n)
+        self.flagged = np.zeros(n, dtype=np.int64)
+        self.samples = 0
+
+    def channels(self, names):
+        """Indices for a list of PV names, for use with update(index=...)"""
+        return np.array([self.index[name] for name in names], dtype=np.intp)
+
+    def update(self, values, timestamp=0.0, index=None):
+        """
+        Add one sample for each channel and return the anomalies it raised
+
+        values covers every channel, or only the channels in index, which
+        must not repeat. timestamp is one time or one per value. NaN values
+        are skipped.
+        """
+        values = np.asarray(values, dtype=float)
+        if index is None:
+            channels = np.arange(len(self.names))
+        else:
+            channels = np.asarray(index, dtype=np.intp)
+        timestamps = np.broadcast_to(np.asarray(timestamp, dtype=float), values.shape)
+        valid = ~np.isnan(values)
+        if not valid.all():
+            values, channels = values[valid], channels[valid]
+            timestamps = timestamps[valid]
+        if not len(channels):
+            return []
+        self.samples += len(channels)
+
+        count = self.count[channels] + 1
+        first = count == 1
+        mean = np.where(first, values, self.mean[channels])
+        var = self.var[channels]
+        resid = values - mean
+        std = np.sqrt(
+            np.maximum(var, np.maximum(self.min_std, self.rel_std * np.abs(mean)) ** 2)
+        )
+        z = resid / std
+        armed = count > self.warmup
+        # The reference starts from the warmup mean when the channel arms
+        starting = count == self.warmup + 1
+        ref = np.where(starting, mean, self.ref[channels])
+        ref_count = np.where(starting, 0, self.ref_count[channels]) + 1
+        drift = (values - ref) / std
+
+        pos = np.where(
+            armed, np.maximum(0.0, self.cusum_pos[channels] + drift - self.cusum_k), 0.0
+        )
+        neg = np.where(
+            armed, np.maximum(0.0, self.cusum_neg[channels] - drift - self.cusum_k), 0.0
+        )
+        step = armed & (np.abs(z) > self.z_limit)
+        up = ~step & (pos > self.cusum_h)
+        down = ~step & ~up & (neg > self.cusum_h)
+        flagged = step | up | down
+        hold = armed & ~flagged & (np.maximum(pos, neg) > 0.5 * self.cusum_h)
+
+        # Plain running means and variance until 1/count drops below alpha, so
+        # the estimates have settled by the end of the warmup
+        alpha = np.where(hold, 0.0, np.maximum(self.alpha, 1.0 / count))
+        ref_alpha = np.where(
+            hold, 0.0, np.maximum(self.cusum_alpha, 1.0 / (self.warmup + ref_count))
+        )
+        self.mean[channels] = np.where(flagged, values, mean + alpha * resid)
+        # After a flag the next sample counts as the second of a new warmup,
+        # so the variance carries over while the means restart
+        self.var[channels] = np.where(
+            flagged, var, (1.0 - alpha) * (var + alpha * resid * resid)
+        )
+        self.count[channels] = np.where(flagged, 1, count)
+        self.ref[channels] = ref + ref_alpha * (values - ref)
+        self.ref_count[channels] = ref_count
+        self.cusum_pos[channels] = np.where(flagged, 0.0, pos)
+        self.cusum_neg[channels] = np.where(flagged, 0.0, neg)
+        self.z[channels] = z
+
+        hits = np.flatnonzero(flagged)
+        if not len(hits):
+            return []
+        self.flagged[channels[hits]] += 1
+        anomalies = []
+        for k in hits:
+            if step[k]:
+                kind, score, baseline = STEP, z[k], mean[k]
+            elif up[k]:
+                kind, score, baseline = DRIFT_UP, pos[k], ref[k]
+            else:
+                kind, score, baseline = DRIFT_DOWN, neg[k], ref[k]
+            anomalies.append(
+                Anomaly(
+                    self.names[channels[k]],
+                    float(timestamps[k]),
+                    float(values[k]),
+                    kind,
+                    float(score),
+                    float(baseline),
+                )
+            )
+        return anomalies
+
+    def observe(self, events):
+        """
+        Update from a batch of MonitorEvents and return their anomalies
+
+        Suits a MonitorDispatcher consumer. Events for unknown PVs or with
+        non-numeric values are ignored. A PV updating several times in one
+        batch is applied in order, one vectorized update per repeat.
+        """
+        index = []
+        values = []
+        times = []
+        rounds = []
+        seen = {}
+        for event in events:
+            i = self.index.get(event.pvname)
+            if i is None:
+                continue
+            try:
+                value = float(event.value)
+            except (TypeError, ValueError):
+                continue
+            repeat = seen.get(i, 0)
+            seen[i] = repeat + 1
+            index.append(i)
+            values.append(value)
+            times.append(event.timestamp)
+            rounds.append(repeat)
+        if not index:
+            return []
+
+        index = np.array(index, dtype=np.intp)
+        values = np.array(values)
+        times = np.array(times)
+        rounds = np.array(rounds)
+        anomalies = []
+        for r in range(rounds.max() + 1):
+            take = np.flatnonzero(rounds == r)
+            anomalies.extend(self.update(values[take], times[take], index[take]))
+        return anomalies
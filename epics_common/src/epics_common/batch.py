@@ -0,0 +1,108 @@
+"""
+Batched Channel Access Writes
+Puts (and gets) many PVs over persistent channels and flushes the send buffer once
+"""
+
+import ctypes
+import time
+
+from .lazy import lazy_import
+
+np = lazy_import("numpy")
+
+# Status returned by ca_array_put on success
+ECA_NORMAL = 1
+
+
+class BatchWriter:
+    """
+    Persistent channels for a fixed set of PVs
+
+    caput() flushes and polls after every put and blocks on the connection
+    timeout for a missing PV. write() queues all puts without waiting, skips
+    channels that are not connected and flushes once per batch.
+    """
+
+    def __init__(self, pvnames, connect_timeout=2.0):
+        from epics import ca, dbr
+
+        self._ca = ca
+        self._dbr = dbr
+        self.chids = {
+            name: ca.create_channel(name, connect=False, auto_cb=False)
+            for name in pvnames
+        }
+        self.connect(connect_timeout)
+
+    def connect(self, timeout):
+        """Wait up to timeout for all channels, searching in parallel"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if all(self._ca.isConnected(c) for c in self.chids.values()):
+                return True
+            self._ca.pend_event(0.01)
+        return False
+
+    def add(self, pvname):
+        """Open a channel for a PV outside the initial set"""
+        if pvname not in self.chids:
+            self.chids[pvname] = self._ca.create_channel(
+                pvname, connect=False, auto_cb=False
+            )
+        return self.chids[pvname]
+
+    def _put(self, chid, value):
+        ca, dbr = self._ca, self._dbr
+        if isinstance(value, str):
+            data = (dbr.string_t * 1)()
+            data[0].value = value.encode()[: dbr.MAX_STRING_SIZE - 1]
+            return ca.libca.ca_array_put(dbr.STRING, 1, chid, data)
+        array = np.ascontiguousarray(value, dtype=np.float64).ravel()
+        count = min(array.size, ca.element_count(chid))
+        data = array.ctypes.data_as(ctypes.POINTER(ctypes.c_double))
+        return ca.libca.ca_array_put(dbr.DOUBLE, count, chid, data)
+
+    def write(self, items):
+        """
+        Put every (pvname, value) pair and flush once
+
+        Values may be scalars, strings or NumPy arrays. Returns the number of
+        puts that could not be queued.
+        """
+        ca = self._ca
+        ca.use_initial_context()
+        failed = 0
+        for pvname, value in items:
+            chid = self.chids.get(pvname)
+            if chid is None:
+                chid = self.add(pvname)
+            if not ca.isConnected(chid) or self._put(chid, value) != ECA_NORMAL:
+                failed += 1
+        ca.flush_io()
+        return failed
+
+    def read(self, pvnames=None, timeout=2.0):
+        """
+        Get many PVs with every request in flight at once
+
+        Returns {pvname: value} for pvnames (default all channels), with None
+        for PVs that are not connected or did not answer within timeout.
+        """
+        ca = self._ca
+        ca.use_initial_context()
+        names = list(self.chids if pvnames is None else pvnames)
+        values = dict.fromkeys(names)
+        pending = []
+        for pvname in names:
+            chid = self.chids.get(pvname)
+            if chid is None:
+                chid = self.add(pvname)
+            if ca.isConnected(chid):
+                ca.get(chid, wait=False)
+                pending.append((pvname, chid))
+        ca.flush_io()
+        deadline = time.monotonic() + timeout
+        for pvname, chid in pending:
+            remaining = max(deadline - time.monotonic(), 1e-3)
+            values[pvname] = ca.get_complete(chid, timeout=remaining)
+        return values
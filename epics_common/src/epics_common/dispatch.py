@@ -0,0 +1,121 @@
+"""
+Monitor Dispatch
+Takes monitor callbacks off the Channel Access thread and hands them to consumers in batches
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Any, NamedTuple
+
+
+class MonitorEvent(NamedTuple):
+    """One raw monitor update as delivered by pyepics"""
+
+    pvname: str
+    value: Any
+    timestamp: float
+    status: int
+    severity: int
+
+
+class MonitorDispatcher:
+    """
+    Single-producer queue between pyepics callbacks and a consumer thread
+
+    callback() only builds a MonitorEvent and appends it to a deque, which is
+    safe without a lock for one producer and one consumer. The consumer
+    thread drains everything queued so far and calls consumer(events) once
+    per batch, so slow work such as formatting, printing or file I/O never
+    holds up the CA callback thread. With coalesce=True only the newest
+    event per PV in each batch is delivered, which suits displays.
+    """
+
+    def __init__(self, consumer, coalesce=False, max_batch=4096, interval=0.0):
+        self.consumer = consumer
+        self.coalesce = coalesce
+        self.max_batch = max_batch
+        self.interval = interval
+        self.received = 0
+        self.delivered = 0
+        self.errors = 0
+        self._queue = deque()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @property
+    def backlog(self):
+        """Events queued but not yet handed to the consumer"""
+        return len(self._queue)
+
+    def callback(
+        self,
+        pvname=None,
+        value=None,
+        timestamp=None,
+        status=None,
+        severity=None,
+        **kwargs,
+    ):
+        """pyepics monitor callback, runs on the CA thread"""
+        self._queue.append(
+            MonitorEvent(
+                pvname,
+                value,
+                timestamp if timestamp is not None else time.time(),
+                status or 0,
+                severity or 0,
+            )
+        )
+        self.received += 1
+        if not self._wake.is_set():
+            self._wake.set()
+
+    def drain(self):
+        """Deliver everything queued now on the calling thread, returns the count"""
+        queue = self._queue
+        events = []
+        while queue and len(events) < self.max_batch:
+            events.append(queue.popleft())
+        if not events:
+            return 0
+        if self.coalesce:
+            events = list({e.pvname: e for e in events}.values())
+        try:
+            self.consumer(events)
+        except Exception as e:
+            self.errors += 1
+            print(f"\nWarning: Monitor consumer failed: {e}")
+        self.delivered += len(events)
+        return len(events)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=1.0):
+        """
+        Stop the consumer thread after delivering anything still queued
+
+        If the thread is still inside a callback after timeout it keeps the
+        queue and drains it before exiting, so events are never delivered
+        by two threads at once.
+        """
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout=timeout)
+        if self._thread.is_alive():
+            return
+        while self.drain():
+            pass
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            while self.drain():
+                pass
+            if self.interval:
+                # Let updates accumulate so each batch covers more of them
+                self._stop.wait(self.interval)
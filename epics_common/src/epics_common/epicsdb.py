@@ -0,0 +1,410 @@
+"""
+IOC Database Parser
+Builds typed PV maps from the .db and .substitutions files loaded by the IOC
+"""
+
+import hashlib
+import os
+import pickle
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+
+DEFAULT_DB_DIR = Path(
+    os.environ.get(
+        "EPICS_DB_DIR",
+        Path(__file__).resolve().parents[3] / "MyProject" / "MyProjectApp" / "Db",
+    )
+)
+DEFAULT_SUBSTITUTIONS = "user.substitutions"
+CACHE_DIR = Path(
+    os.environ.get("EPICS_COMMON_CACHE", Path.home() / ".cache" / "epics-common")
+)
+CACHE_VERSION = 1
+
+_TOKEN_RE = re.compile(
+    r'(?P<str>"(?:[^"\\]|\\.)*")|(?P<comment>#[^\n]*)|(?P<punct>[{}(),=])'
+    r'|(?P<word>[^\s{}(),="#]+)'
+)
+_MACRO_RE = re.compile(r"\$[({](\w+)(?:=([^)}]*))?[)}]")
+
+FLOAT_TYPES = {"ai", "ao", "calc", "calcout"}
+INT_TYPES = {"longin", "longout", "int64in", "int64out"}
+ENUM_TYPES = {"bi", "bo", "mbbi", "mbbo"}
+STRING_TYPES = {"stringin", "stringout", "lsi", "lso"}
+ARRAY_TYPES = {"waveform", "aai", "aao", "subArray"}
+
+SEVERITIES = {"NO_ALARM": 0, "MINOR": 1, "MAJOR": 2, "INVALID": 3}
+# mbbi/mbbo state field prefixes, ZRST is state 0 ... FFST is state 15
+MBB_STATES = (
+    "ZR", "ON", "TW", "TH", "FR", "FV", "SX", "SV",
+    "EI", "NI", "TE", "EL", "TV", "TT", "FT", "FF",
+)  # fmt: skip
+
+
+def _float(fields, name):
+    value = fields.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+@dataclass(frozen=True)
+class PVSpec:
+    """A record instance with the fields clients care about"""
+
+    name: str
+    record_type: str
+    fields: dict = field(default_factory=dict, compare=False, hash=False)
+
+    @property
+    def key(self):
+        """Lower-case name without the IOC prefix and subsystem, e.g. kick_x"""
+        return "_".join(self.name.split(":")[2:]).lower()
+
+    @property
+    def dtype(self):
+        if self.record_type in FLOAT_TYPES:
+            return float
+        if self.record_type in INT_TYPES or self.record_type in ENUM_TYPES:
+            return int
+        if self.record_type in STRING_TYPES:
+            return str
+        if self.record_type in ARRAY_TYPES:
+            return list
+        return float
+
+    @property
+    def desc(self):
+        return self.fields.get("DESC", "")
+
+    @property
+    def egu(self):
+        return self.fields.get("EGU", "")
+
+    @property
+    def prec(self):
+        return int(self.fields.get("PREC", 0))
+
+    @property
+    def scan(self):
+        return self.fields.get("SCAN", "Passive")
+
+    @property
+    def scan_period(self):
+        """SCAN as seconds, or None for Passive/event/I/O Intr records"""
+        match = re.fullmatch(r"\s*([\d.]+)\s+second", self.scan)
+        return float(match.group(1)) if match else None
+
+    @property
+    def nelm(self):
+        return int(self.fields.get("NELM", 1))
+
+    @property
+    def hopr(self):
+        return _float(self.fields, "HOPR")
+
+    @property
+    def lopr(self):
+        return _float(self.fields, "LOPR")
+
+    @property
+    def drvh(self):
+        return _float(self.fields, "DRVH")
+
+    @property
+    def drvl(self):
+        return _float(self.fields, "DRVL")
+
+    @property
+    def value(self):
+        """Initial VAL as the record's Python type"""
+        raw = self.fields.get("VAL")
+        if raw is None:
+            return None
+        try:
+            return self.dtype(raw) if self.dtype is not list else raw
+        except ValueError:
+            return raw
+
+    @property
+    def enum_strs(self):
+        """State strings of a bi/bo or mbbi/mbbo record indexed by value"""
+        if self.record_type in {"bi", "bo"}:
+            return [self.fields.get("ZNAM", "0"), self.fields.get("ONAM", "1")]
+        if self.record_type in {"mbbi", "mbbo"}:
+            return [self.fields.get(f"{s}ST", str(i)) for i, s in enumerate(MBB_STATES)]
+        return []
+
+    @property
+    def alarm_limits(self):
+        """{'HIHI': (limit, severity), ...} for limits with a non-zero severity"""
+        limits = {}
+        for limit, sevr in (
+            ("HIHI", "HHSV"),
+            ("HIGH", "HSV"),
+            ("LOW", "LSV"),
+            ("LOLO", "LLSV"),
+        ):
+            value = _float(self.fields, limit)
+            severity = SEVERITIES.get(self.fields.get(sevr, "NO_ALARM"), 0)
+            if value is not None and severity:
+                limits[limit] = (value, severity)
+        return limits
+
+    @property
+    def hyst(self):
+        return _float(self.fields, "HYST") or 0.0
+
+    @property
+    def writable(self):
+        """Whether clients are expected to put to this record"""
+        return self.record_type not in {"calc", "calcout"} and "INP" not in self.fields
+
+
+def expand_macros(text, macros):
+    """Replace $(name), ${name} and $(name=default), leaving unknown macros"""
+
+    def replace(match):
+        name, default = match.group(1), match.group(2)
+        if name in macros:
+            return macros[name]
+        return default if default is not None else match.group(0)
+
+    return _MACRO_RE.sub(replace, text)
+
+
+def _tokenize(text):
+    tokens = []
+    for match in _TOKEN_RE.finditer(text):
+        kind = match.lastgroup
+        if kind == "comment":
+            continue
+        token = match.group(kind)
+        if kind == "str":
+            token = ("str", token[1:-1])
+        tokens.append(token)
+    return tokens
+
+
+def _word(token):
+    return token[1] if isinstance(token, tuple) else token
+
+
+def _skip_block(tokens, i):
+    """Skip a balanced () or {} group starting at tokens[i]"""
+    opener = tokens[i]
+    closer = ")" if opener == "(" else "}"
+    depth = 0
+    while i < len(tokens):
+        if tokens[i] == opener:
+            depth += 1
+        elif tokens[i] == closer:
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return i
+
+
+def parse_db(text, macros=None):
+    """Parse record instances from .db text after macro expansion"""
+    tokens = _tokenize(expand_macros(text, macros or {}))
+    records = []
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token in ("record", "grecord") and tokens[i + 1] == "(":
+            record_type, name = _word(tokens[i + 2]), _word(tokens[i + 4])
+            i += 6
+            fields = {}
+            if i < len(tokens) and tokens[i] == "{":
+                i += 1
+                while tokens[i] != "}":
+                    if tokens[i] == "field":
+                        fields[_word(tokens[i + 2])] = _word(tokens[i + 4])
+                        i += 6
+                    elif tokens[i + 1] == "(":
+                        i = _skip_block(tokens, i + 1)
+                    else:
+                        i += 1
+                i += 1
+            records.append(PVSpec(name, record_type, fields))
+        elif i + 1 < len(tokens) and tokens[i + 1] == "(":
+            i = _skip_block(tokens, i + 1)
+        else:
+            i += 1
+    return records
+
+
+def parse_substitutions(text):
+    """Parse a substitutions file into [(db file, macros), ...]"""
+    tokens = _tokenize(text)
+    entries = []
+    global_macros = {}
+    i = 0
+
+    def read_set(i):
+        # { a = "x", b = "y" } or { "x", "y" } starting at "{"
+        values = []
+        i += 1
+        while tokens[i] != "}":
+            if tokens[i] != ",":
+                values.append(tokens[i])
+            i += 1
+        return values, i + 1
+
+    while i < len(tokens):
+        token = tokens[i]
+        if token == "global":
+            values, i = read_set(i + 1)
+            global_macros.update(_assignments(values))
+        elif token == "file":
+            filename = _word(tokens[i + 1])
+            i += 3
+            pattern = None
+            while tokens[i] != "}":
+                if tokens[i] == "pattern":
+                    names, i = read_set(i + 1)
+                    pattern = [_word(n) for n in names]
+                elif tokens[i] == "{":
+                    values, i = read_set(i)
+                    if pattern is None:
+                        macros = _assignments(values)
+                    else:
+                        macros = dict(zip(pattern, (_word(v) for v in values)))
+                    entries.append((filename, {**global_macros, **macros}))
+                else:
+                    i += 1
+            i += 1
+        else:
+            i += 1
+    return entries
+
+
+def _assignments(values):
+    macros = {}
+    for j in range(0, len(values) - 2, 3):
+        if values[j + 1] == "=":
+            macros[_word(values[j])] = _word(values[j + 2])
+    return macros
+
+
+class IOCDatabase:
+    """All records the IOC loads, indexed by PV name"""
+
+    def __init__(self, records, prefix):
+        self.records = {r.name: r for r in records}
+        self.prefix = prefix
+
+    def __contains__(self, name):
+        return name in self.records
+
+    def __getitem__(self, name):
+        return self.records[name]
+
+    def __iter__(self):
+        return iter(self.records.values())
+
+    def __len__(self):
+        return len(self.records)
+
+    def names(self):
+        return list(self.records)
+
+    def subsystem(self, group):
+        """Records under $(user):<group>:, e.g. DUMP or STEER"""
+        start = f"{self.prefix}:{group}:"
+        return [r for r in self.records.values() if r.name.startswith(start)]
+
+    def pv_map(self, *groups, writable=False):
+        """{key: PVSpec} for one or more subsystems, keyed like PVSpec.key"""
+        pvs = {}
+        for group in groups:
+            for record in self.subsystem(group):
+                if writable and not record.writable:
+                    continue
+                pvs[record.key] = record
+        return pvs
+
+
+def _cache_path(substitutions, macros):
+    key = f"{CACHE_VERSION}|{Path(substitutions).resolve()}|{sorted(macros.items())}"
+    return CACHE_DIR / f"{hashlib.sha1(key.encode()).hexdigest()}.pickle"
+
+
+def write_cache(path, obj):
+    """
+    Pickle obj to path atomically, False if it could not be written
+
+    Each process writes its own temporary file before the rename, so clients
+    started together on a cold cache do not truncate each other's copy.
+    """
+    path = Path(path)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp, "wb") as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp.replace(path)
+    except OSError:
+        tmp.unlink(missing_ok=True)
+        return False
+    return True
+
+
+def _stamp(paths):
+    stamps = []
+    for path in paths:
+        stat = path.stat()
+        stamps.append((str(path), stat.st_mtime_ns, stat.st_size))
+    return stamps
+
+
+def _compile(db_dir, substitutions, macros):
+    entries = parse_substitutions(substitutions.read_text())
+    records = []
+    sources = [substitutions]
+    prefix = macros.get("user")
+    for filename, file_macros in entries:
+        path = db_dir / Path(filename).name
+        file_macros = {**file_macros, **macros}
+        sources.append(path)
+        records.extend(parse_db(path.read_text(), file_macros))
+        prefix = prefix or file_macros.get("user")
+    return IOCDatabase(records, prefix), _stamp(sources)
+
+
+def load_ioc(
+    db_dir=None, substitutions=DEFAULT_SUBSTITUTIONS, macros=None, use_cache=True
+):
+    """
+    Load every record instantiated by a substitutions file
+
+    The parsed result is pickled under CACHE_DIR and reused until the
+    substitutions file or any .db file it references changes. Macros
+    override the substitutions, e.g. {"user": "myhost"}.
+    """
+    db_dir = Path(db_dir or DEFAULT_DB_DIR)
+    substitutions = db_dir / substitutions
+    macros = dict(macros or {})
+    if "user" not in macros and os.environ.get("EPICS_IOC_PREFIX"):
+        macros["user"] = os.environ["EPICS_IOC_PREFIX"]
+    cache = _cache_path(substitutions, macros)
+
+    if use_cache and cache.exists():
+        try:
+            with open(cache, "rb") as f:
+                stamps, ioc = pickle.load(f)
+            if _stamp(Path(p) for p, _, _ in stamps) == stamps:
+                return ioc
+        except (OSError, pickle.PickleError, EOFError, ValueError, AttributeError):
+            pass
+
+    ioc, stamps = _compile(db_dir, substitutions, macros)
+    if use_cache:
+        write_cache(cache, (stamps, ioc))
+    return ioc
@@ -0,0 +1,472 @@
+"""
+Event Log
+Append-only segmented log of PV updates that many readers can tail and resume
+"""
+
+import argparse
+import mmap
+import numbers
+import os
+import struct
+import threading
+import time
+import zlib
+from array import array
+from bisect import bisect_right
+from datetime import datetime
+from pathlib import Path
+from typing import Any, NamedTuple
+
+from .lazy import lazy_import
+
+np = lazy_import("numpy")
+
+SEGMENT_BYTES = 64 * 1024 * 1024
+# Each .index holds uint32 pairs (offset - segment base, file position), one
+# per INDEX_INTERVAL bytes of records, so seeking scans at most that much
+INDEX_INTERVAL = 4096
+# Record size incl. padding, CRC-32 of everything after it, offset, timestamp,
+# value length, status, severity, name length, value kind; value then name follow
+HEADER = struct.Struct("<IIQdIhhHB5x")
+FLOAT, INT, STRING, FLOAT_ARRAY, INT_ARRAY = range(5)
+_DOUBLE = struct.Struct("<d")
+_INT64 = struct.Struct("<q")
+
+
+class EventRecord(NamedTuple):
+    """One logged update, fields as in dispatch.MonitorEvent plus its offset"""
+
+    offset: int
+    pvname: str
+    value: Any
+    timestamp: float
+    status: int
+    severity: int
+
+
+def segment_path(directory, base):
+    """Segments are named by the offset of their first record, like Kafka"""
+    return Path(directory) / f"{base:020d}.log"
+
+
+def segment_bases(directory):
+    """Base offsets of the segments in directory, oldest first"""
+    return sorted(int(p.stem) for p in Path(directory).glob("*.log"))
+
+
+def _encode_value(value):
+    if value is None:
+        return FLOAT, _DOUBLE.pack(float("nan"))
+    if isinstance(value, str):
+        return STRING, value.encode()
+    if isinstance(value, numbers.Integral):
+        return INT, _INT64.pack(int(value))
+    if isinstance(value, numbers.Real):
+        return FLOAT, _DOUBLE.pack(value)
+    array_value = np.asarray(value)
+    if array_value.dtype.kind in "iub":
+        return INT_ARRAY, array_value.astype("<i8").tobytes()
+    return FLOAT_ARRAY, array_value.astype("<f8").tobytes()
+
+
+def _decode_value(kind, view):
+    """Scalars are unpacked, arrays are memoryviews into the mapped segment"""
+    if kind == FLOAT:
+        return _DOUBLE.unpack_from(view)[0]
+    if kind == INT:
+        return _INT64.unpack_from(view)[0]
+    if kind == STRING:
+        return str(view, "utf-8")
+    return view.cast("d" if kind == FLOAT_ARRAY else "q")
+
+
+def encode(offset, pvname, value, timestamp, status=0, severity=0):
+    """One record as bytes, padded to 8 so array values stay aligned"""
+    name = pvname.encode()
+    kind, payload = _encode_value(value)
+    length = HEADER.size + len(payload) + len(name)
+    size = (length + 7) & ~7
+    record = bytearray(size)
+    HEADER.pack_into(
+        record,
+        0,
+        size,
+        0,
+        offset,
+        timestamp,
+        len(payload),
+        status or 0,
+        severity or 0,
+        len(name),
+        kind,
+    )
+    record[HEADER.size : HEADER.size + len(payload)] = payload
+    record[HEADER.size + len(payload) : length] = name
+    struct.pack_into("<I", record, 4, zlib.crc32(memoryview(record)[8:]))
+    return record
+
+
+def _valid(buffer, position, size):
+    crc = struct.unpack_from("<I", buffer, position + 4)[0]
+    return zlib.crc32(memoryview(buffer)[position + 8 : position + size]) == crc
+
+
+def _scan(path, base):
+    """(end position, next offset, index) of the intact records in a segment"""
+    data = path.read_bytes()
+    position, offset, index, last_indexed = 0, base, array("I"), None
+    while position + HEADER.size <= len(data):
+        size = struct.unpack_from("<I", data, position)[0]
+        if size < HEADER.size or position + size > len(data):
+            break
+        if not _valid(data, position, size):
+            break
+        if last_indexed is None or position - last_indexed >= INDEX_INTERVAL:
+            index.extend((offset - base, position))
+            last_indexed = position
+        position += size
+        offset += 1
+    return position, offset, index
+
+
+class EventLogWriter:
+    """
+    Appends PV updates to numbered segment files in one directory
+
+    Each batch is encoded into one buffer and written with a single write
+    and flush, so readers see whole batches. A segment is closed once it
+    passes segment_bytes and a new one starts at the next offset. Opening
+    an existing log drops a torn record left at the end by a crash.
+    """
+
+    def __init__(
+        self, directory, segment_bytes=SEGMENT_BYTES, max_segments=None, fsync=False
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self.fsync = fsync
+        self.appended = 0
+        self._lock = threading.Lock()
+        bases = segment_bases(self.directory)
+        self._open(bases[-1] if bases else 0)
+
+    def _open(self, base):
+        path = segment_path(self.directory, base)
+        if path.exists():
+            position, offset, index = _scan(path, base)
+            os.truncate(path, position)
+        else:
+            position, offset, index = 0, base, array("I")
+        path.with_suffix(".index").write_bytes(index.tobytes())
+        self.base = base
+        self.next_offset = offset
+        self.position = position
+        self._last_indexed = index[-1] if index else None
+        self._file = open(path, "ab")
+        self._index = open(path.with_suffix(".index"), "ab")
+
+    def _roll(self):
+        self._close_files()
+        self._open(self.next_offset)
+        if self.max_segments:
+            for base in segment_bases(self.directory)[: -self.max_segments]:
+                segment_path(self.directory, base).unlink(missing_ok=True)
+                segment_path(self.directory, base).with_suffix(".index").unlink(
+                    missing_ok=True
+                )
+
+    def _write(self, chunk, index):
+        if chunk:
+            self._file.write(chunk)
+            self._index.write(index.tobytes())
+            self._file.flush()
+            self._index.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    def append_batch(self, events):
+        """
+        Append (pvname, value, timestamp, status, severity) tuples, such as
+        MonitorEvents, and return the offset of the last one (None if empty)
+        """
+        with self._lock:
+            chunk, index = bytearray(), array("I")
+            first = self.next_offset
+            for pvname, value, timestamp, status, severity in events:
+                record = encode(
+                    self.next_offset, pvname, value, timestamp, status, severity
+                )
+                if self.position and self.position + len(record) > self.segment_bytes:
+                    self._write(chunk, index)
+                    chunk, index = bytearray(), array("I")
+                    self._roll()
+                if (
+                    self._last_indexed is None
+                    or self.position - self._last_indexed >= INDEX_INTERVAL
+                ):
+                    index.extend((self.next_offset - self.base, self.position))
+                    self._last_indexed = self.position
+                chunk += record
+                self.position += len(record)
+                self.next_offset += 1
+            self._write(chunk, index)
+            self.appended += self.next_offset - first
+            return self.next_offset - 1 if self.next_offset > first else None
+
+    def append(self, pvname, value, timestamp=None, status=0, severity=0):
+        """Append one update, returns its offset"""
+        if timestamp is None:
+            timestamp = time.time()
+        return self.append_batch([(pvname, value, timestamp, status, severity)])
+
+    def _close_files(self):
+        self._file.close()
+        self._index.close()
+
+    def close(self):
+        with self._lock:
+            self._close_files()
+
+
+class EventLogReader:
+    """
+    Reads records in offset order from memory-mapped segments
+
+    Array values are returned as memoryviews into the mapping rather than
+    copies, wrap them with np.frombuffer or copy them to keep them past
+    close(). With a group name the reader starts from that group's committed
+    cursor, and commit() stores its position so a restarted consumer resumes
+    there. Readers are independent, any number can tail the same log.
+    """
+
+    def __init__(self, directory, group=None, start="earliest", verify=False):
+        self.directory = Path(directory)
+        self.group = group
+        self.verify = verify
+        self.offset = 0
+        self.base = None
+        self._map = None
+        self._file = None
+        self._position = 0
+        committed = self.committed()
+        if committed is not None:
+            self.seek(committed)
+        elif start == "latest":
+            self.seek(end_offset(self.directory))
+        elif start == "earliest":
+            bases = segment_bases(self.directory)
+            self.seek(bases[0] if bases else 0)
+        else:
+            self.seek(int(start))
+
+    @property
+    def cursor_path(self):
+        return self.directory / "cursors" / f"{self.group}.offset"
+
+    def committed(self):
+        """Offset last committed by this reader's group, None if never"""
+        if self.group is None or not self.cursor_path.exists():
+            return None
+        return int(self.cursor_path.read_text())
+
+    def commit(self, offset=None):
+        """Store the next offset to read for the group, atomically"""
+        if self.group is None:
+            raise ValueError("commit() needs a reader created with a group")
+        self.cursor_path.parent.mkdir(exist_ok=True)
+        tmp = self.cursor_path.with_suffix(".tmp")
+        tmp.write_text(str(self.offset if offset is None else offset))
+        os.replace(tmp, self.cursor_path)
+
+    def _unmap(self):
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                pass  # array values still reference it, freed with them
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _map_segment(self, base):
+        """Map segment base, or the current one again after it has grown"""
+        if base != self.base:
+            self._unmap()
+            self._file = open(segment_path(self.directory, base), "rb")
+            self.base = base
+        size = os.fstat(self._file.fileno()).st_size
+        if size and (self._map is None or size > len(self._map)):
+            if self._map is not None:
+                try:
+                    self._map.close()
+                except BufferError:
+                    pass
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def seek(self, offset):
+        """Position the reader so the next record read is offset"""
+        bases = segment_bases(self.directory)
+        if not bases:
+            self.offset, self.base, self._position = offset, None, 0
+            return
+        # Offsets deleted by retention resume at the oldest segment left
+        offset = max(offset, bases[0])
+        base = bases[bisect_right(bases, offset) - 1]
+        self._map_segment(base)
+        index = array("I")
+        index.frombytes(
+            segment_path(self.directory, base).with_suffix(".index").read_bytes()
+        )
+        relative, positions = index[0::2], index[1::2]
+        i = bisect_right(relative, offset - base) - 1
+        self.offset = base + (relative[i] if i >= 0 else 0)
+        self._position = positions[i] if i >= 0 else 0
+        while self.offset < offset and self._read() is not None:
+            pass
+
+    def _read(self):
+        """Next record in the current segment, None at its end"""
+        data = self._map
+        if data is None or self._position + HEADER.size > len(data):
+            self._map_segment(self.base)
+            data = self._map
+            if data is None or self._position + HEADER.size > len(data):
+                return None
+        (
+            size,
+            _,
+            offset,
+            timestamp,
+            value_length,
+            status,
+            severity,
+            name_length,
+            kind,
+        ) = HEADER.unpack_from(data, self._position)
+        if self._position + size > len(data):
+            return None
+        if self.verify and not _valid(data, self._position, size):
+            raise ValueError(
+                f"Corrupt record at offset {offset} in segment {self.base}"
+            )
+        start = self._position + HEADER.size
+        view = memoryview(data)
+        value = _decode_value(kind, view[start : start + value_length])
+        name = str(
+            view[start + value_length : start + value_length + name_length], "utf-8"
+        )
+        self._position += size
+        self.offset = offset + 1
+        return EventRecord(offset, name, value, timestamp, status, severity)
+
+    def _next(self):
+        if self.base is None:
+            self.seek(self.offset)
+            if self.base is None:
+                return None
+        record = self._read()
+        if record is not None:
+            return record
+        # The writer only starts a new segment after finishing this one
+        if (
+            segment_path(self.directory, self.offset).exists()
+            and self.offset != self.base
+        ):
+            self._unmap()
+            self.base = None
+            self._position = 0
+            self._map_segment(self.offset)
+            return self._read()
+        return None
+
+    def poll(self, max_records=None):
+        """Records appended since the last call, at most max_records"""
+        records = []
+        while max_records is None or len(records) < max_records:
+            record = self._next()
+            if record is None:
+                break
+            records.append(record)
+        return records
+
+    def tail(self, interval=0.05, max_records=4096, stop=None):
+        """Yield batches of new records forever, or until stop (an Event) is set"""
+        while stop is None or not stop.is_set():
+            records = self.poll(max_records)
+            if records:
+                yield records
+            else:
+                time.sleep(interval)
+
+    def close(self):
+        self._unmap()
+        self.base = None
+
+
+def end_offset(directory):
+    """Offset the next appended record will get"""
+    bases = segment_bases(directory)
+    if not bases:
+        return 0
+    return _scan(segment_path(directory, bases[-1]), bases[-1])[1]
+
+
+def info(directory):
+    """Segments as (base, records, bytes) and committed cursors as {group: offset}"""
+    directory = Path(directory)
+    bases = segment_bases(directory)
+    ends = bases[1:] + [end_offset(directory)]
+    segments = [
+        (base, end - base, segment_path(directory, base).stat().st_size)
+        for base, end in zip(bases, ends)
+    ]
+    cursors = {
+        path.stem: int(path.read_text())
+        for path in sorted((directory / "cursors").glob("*.offset"))
+    }
+    return segments, cursors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and tail a PV event log")
+    commands = parser.add_subparsers(dest="command", required=True)
+    show = commands.add_parser("info", help="segments, offsets and consumer cursors")
+    show.add_argument("directory", type=Path)
+    follow = commands.add_parser("tail", help="print records as they are appended")
+    follow.add_argument("directory", type=Path)
+    follow.add_argument("--group", help="resume from and commit this group's cursor")
+    follow.add_argument(
+        "--from", dest="start", default="latest", help="earliest, latest or an offset"
+    )
+    args = parser.parse_args()
+
+    if args.command == "info":
+        segments, cursors = info(args.directory)
+        for base, records, size in segments:
+            print(f"  {base:>12}  {records:>10} records  {size / 1e6:>9.2f} MB")
+        total = sum(records for _, records, _ in segments)
+        print(f"{len(segments)} segments, {total} records")
+        for group, offset in cursors.items():
+            print(f"  cursor {group}: {offset}")
+        return
+
+    reader = EventLogReader(args.directory, args.group, args.start)
+    try:
+        for records in reader.tail():
+            for r in records:
+                time_str = datetime.fromtimestamp(r.timestamp).strftime("%H:%M:%S.%f")
+                value = r.value.tolist() if isinstance(r.value, memoryview) else r.value
+                print(f"{r.offset:>10} {time_str[:-3]} {r.pvname} = {value}")
+            if args.group:
+                reader.commit()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reader.close()
+
+
+if __name__ == "__main__":
+    main()
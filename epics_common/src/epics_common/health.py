@@ -0,0 +1,123 @@
+"""
+Client Health Reporting
+Publishes publish-cycle latency, queue depth, failures and update rate to health.db
+"""
+
+import threading
+import time
+
+# STATE goes Offline when HEARTBEAT has not changed for this many seconds
+OFFLINE_AFTER = 5
+
+
+class HealthMonitor:
+    """Tracks a client's publish cycles and writes $(user):<client>:HEALTH:* records"""
+
+    def __init__(self, prefix, client, interval=1.0, max_pending=4):
+        self.base = f"{prefix}:{client}:HEALTH"
+        self.interval = interval
+        self.max_pending = max_pending
+        self.pending = 0
+        self.failed = 0
+        self.dropped = 0
+        self.heartbeat = 0
+        self._cycles = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+        self._window_faults = 0
+        self._window_start = time.perf_counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def submit(self, executor, fn, *args):
+        """
+        Queue fn on executor unless max_pending cycles are already waiting
+
+        fn returns the number of puts that failed. Returns the future, or None
+        when the cycle was dropped because the executor is backed up.
+        """
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.dropped += 1
+                self._window_faults += 1
+                return None
+            self.pending += 1
+        return executor.submit(self._run_cycle, time.perf_counter(), fn, args)
+
+    def _run_cycle(self, queued_at, fn, args):
+        with self._lock:
+            self.pending -= 1
+        failed = 0
+        try:
+            failed = fn(*args) or 0
+        except Exception as e:
+            failed = 1
+            print(f"\nWarning: Could not publish to EPICS: {e}")
+        finally:
+            self.record(time.perf_counter() - queued_at, failed)
+        return failed
+
+    def record(self, latency, failed=0):
+        """Account for one completed cycle of latency seconds"""
+        with self._lock:
+            self._cycles += 1
+            self._latency_total += latency
+            if latency > self._latency_max:
+                self._latency_max = latency
+            if failed:
+                self.failed += failed
+                self._window_faults += failed
+
+    def snapshot(self):
+        """Health figures for the current window, then start a new window"""
+        now = time.perf_counter()
+        with self._lock:
+            elapsed = max(now - self._window_start, 1e-9)
+            cycles = self._cycles
+            snap = {
+                "latency": self._latency_total / cycles if cycles else 0.0,
+                "latency_max": self._latency_max,
+                "queue": self.pending,
+                "failed": self.failed,
+                "dropped": self.dropped,
+                "rate": cycles / elapsed,
+                "fault": self._window_faults > 0,
+            }
+            self._cycles = 0
+            self._latency_total = 0.0
+            self._latency_max = 0.0
+            self._window_faults = 0
+            self._window_start = now
+        return snap
+
+    def publish(self):
+        """Write the current window to the health records"""
+        from .pool import caput
+
+        snap = self.snapshot()
+        self.heartbeat += 1
+        try:
+            caput(f"{self.base}:LATENCY", snap["latency"] * 1e3, wait=False)
+            caput(f"{self.base}:LATENCY_MAX", snap["latency_max"] * 1e3, wait=False)
+            caput(f"{self.base}:QUEUE", snap["queue"], wait=False)
+            caput(f"{self.base}:FAILED", snap["failed"], wait=False)
+            caput(f"{self.base}:DROPPED", snap["dropped"], wait=False)
+            caput(f"{self.base}:RATE", snap["rate"], wait=False)
+            caput(f"{self.base}:FAULT", int(snap["fault"]), wait=False)
+            caput(f"{self.base}:HEARTBEAT", self.heartbeat, wait=False)
+        except Exception as e:
+            print(f"\nWarning: Could not publish health: {e}")
+        return snap
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=self.interval)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.publish()
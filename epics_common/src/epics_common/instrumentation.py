@@ -0,0 +1,248 @@
+"""
+Hot-path Instrumentation
+Counters, latency histograms and timers that cost one flag check when disabled
+"""
+
+import bisect
+import functools
+import os
+import threading
+import time
+
+ENV_VAR = "EPICS_PERF"
+
+# Histogram bucket upper bounds in seconds, 1 us doubling up to ~8 s
+BUCKETS = tuple(1e-6 * 2**i for i in range(24))
+
+
+class Histogram:
+    """Latency histogram with fixed power-of-two buckets"""
+
+    __slots__ = ("counts", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def observe(self, value):
+        """Record a single sample in seconds"""
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q):
+        """Upper bucket bound below which a fraction q of samples fall"""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return min(BUCKETS[i] if i < len(BUCKETS) else self.max, self.max)
+        return self.max
+
+    def summary(self):
+        """Summary statistics in seconds"""
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "min": self.min if self.count else 0.0,
+            "max": self.max,
+            "p50": self.percentile(0.5),
+            "p99": self.percentile(0.99),
+        }
+
+
+class _NullTimer:
+    """Context manager handed out while instrumentation is disabled"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    """Context manager that records its elapsed time into a histogram"""
+
+    __slots__ = ("registry", "name", "start")
+
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Registry:
+    """Named counters and histograms shared by every thread in the process"""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def count(self, name, n=1):
+        """Increment a counter"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def observe(self, name, seconds):
+        """Add a duration sample to a histogram"""
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def timer(self, name):
+        """Context manager timing the enclosed block"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def timed(self, name):
+        """Decorator timing every call of the wrapped function"""
+
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.observe(name, time.perf_counter() - start)
+
+            return wrapper
+
+        return decorator
+
+    def snapshot(self, reset=False):
+        """Copy of all counters and histogram summaries"""
+        with self._lock:
+            snap = {
+                "time": time.time(),
+                "counters": dict(self._counters),
+                "histograms": {
+                    name: h.summary() for name, h in self._histograms.items()
+                },
+            }
+            if reset:
+                self._counters.clear()
+                self._histograms.clear()
+        return snap
+
+
+REGISTRY = Registry(enabled=os.environ.get(ENV_VAR, "0") not in ("", "0"))
+
+count = REGISTRY.count
+observe = REGISTRY.observe
+timer = REGISTRY.timer
+timed = REGISTRY.timed
+snapshot = REGISTRY.snapshot
+
+
+def enable(enabled=True):
+    """Turn instrumentation on or off for the default registry"""
+    REGISTRY.enabled = enabled
+
+
+def print_snapshot(snap):
+    """Print a snapshot as a table with times in milliseconds"""
+    stamp = time.strftime("%H:%M:%S", time.localtime(snap["time"]))
+    print(f"\n--- perf snapshot {stamp} ---")
+    for name, h in sorted(snap["histograms"].items()):
+        print(
+            f"{name:<24} n={h['count']:<7} "
+            f"mean={h['mean'] * 1e3:.3f}ms p50={h['p50'] * 1e3:.3f}ms "
+            f"p99={h['p99'] * 1e3:.3f}ms max={h['max'] * 1e3:.3f}ms"
+        )
+    for name, value in sorted(snap["counters"].items()):
+        print(f"{name:<24} {value}")
+
+
+def pv_publisher(prefix):
+    """Sink that publishes histogram summaries to $(user):PERF:<metric>:* records"""
+    from .pool import caput
+
+    def publish(snap):
+        for name, h in snap["histograms"].items():
+            base = f"{prefix}:PERF:{name}"
+            try:
+                caput(f"{base}:COUNT", h["count"], wait=False)
+                caput(f"{base}:MEAN", h["mean"] * 1e3, wait=False)
+                caput(f"{base}:P99", h["p99"] * 1e3, wait=False)
+                caput(f"{base}:MAX", h["max"] * 1e3, wait=False)
+            except Exception as e:
+                print(f"\nWarning: Could not publish perf metrics: {e}")
+
+    return publish
+
+
+class SnapshotReporter:
+    """Hands a registry snapshot to each sink at a fixed interval"""
+
+    def __init__(self, sinks, interval=5.0, registry=REGISTRY):
+        self.sinks = list(sinks)
+        self.interval = interval
+        self.registry = registry
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=self.interval)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            snap = self.registry.snapshot(reset=True)
+            for sink in self.sinks:
+                sink(snap)
+
+
+def start_from_env(prefix, interval=5.0):
+    """
+    Configure the default registry from EPICS_PERF and start reporting
+
+    EPICS_PERF=1 prints periodic snapshots, EPICS_PERF=publish also writes
+    them to the PERF records. Returns the reporter, or None when disabled.
+    """
+    mode = os.environ.get(ENV_VAR, "0")
+    if mode in ("", "0"):
+        return None
+    enable()
+    sinks = [print_snapshot]
+    if mode == "publish":
+        sinks.append(pv_publisher(prefix))
+    return SnapshotReporter(sinks, interval).start()
@@ -0,0 +1,28 @@
+"""
+Lazy Imports
+Module objects that only load pyepics, NumPy or raylib when first used
+"""
+
+import importlib.util
+import sys
+
+
+def lazy_import(name):
+    """
+    Return module name without executing it until an attribute is accessed
+
+    Lets `np = lazy_import("numpy")` sit at the top of a module like a normal
+    import while commands that never touch np skip its import cost. Later
+    plain imports of the same name get the same lazy module from sys.modules.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
@@ -0,0 +1,293 @@
+"""
+PV Metadata Cache
+Control info for every IOC record, discovered in one parallel pass and kept on disk
+"""
+
+import argparse
+import pickle
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from . import epicsdb
+
+CACHE_VERSION = 2
+# stringin with DTYP "Soft Timestamp" and PINI YES in ioc.db, set once at iocInit
+BOOT_TIME = "IOC:BOOT_TIME"
+
+
+@dataclass
+class PVInfo:
+    """What cainfo reports about a channel, minus the value"""
+
+    name: str
+    type: str
+    count: int
+    host: str
+    write_access: bool
+    egu: str = ""
+    prec: int = 0
+    hopr: Optional[float] = None
+    lopr: Optional[float] = None
+    drvh: Optional[float] = None
+    drvl: Optional[float] = None
+    hihi: Optional[float] = None
+    high: Optional[float] = None
+    low: Optional[float] = None
+    lolo: Optional[float] = None
+    enum_strs: tuple = field(default_factory=tuple)
+
+    def format(self):
+        """Multi-line description in the spirit of cainfo"""
+        rows = [
+            ("type", self.type),
+            ("count", self.count),
+            ("host", self.host),
+            ("access", "read/write" if self.write_access else "read-only"),
+        ]
+        if self.enum_strs:
+            rows.append(("enum strings", ", ".join(self.enum_strs)))
+        else:
+            rows.append(("units", self.egu))
+            rows.append(("precision", self.prec))
+            for label, low, high in (
+                ("display", self.lopr, self.hopr),
+                ("control", self.drvl, self.drvh),
+                ("warning", self.low, self.high),
+                ("alarm", self.lolo, self.hihi),
+            ):
+                if low is not None or high is not None:
+                    rows.append((f"{label} limits", f"{low} .. {high}"))
+        lines = [self.name] + [f"    {label:<15}= {value}" for label, value in rows]
+        return "\n".join(lines)
+
+
+def _limit(metadata, key):
+    value = metadata.get(key)
+    return None if value is None else float(value)
+
+
+def _open_channel(ca, pvname):
+    """
+    (chid, owned) for pvname
+
+    pyepics keeps one channel per name and context, shared with PV objects
+    and the pool, so only channels created here are owned and may be cleared.
+    """
+    owned = pvname not in ca._cache[ca.current_context()]
+    return ca.create_channel(pvname, connect=False, auto_cb=False), owned
+
+
+def discover(pvnames, timeout=2.0):
+    """
+    {pvname: PVInfo} for every PV that connects within timeout
+
+    All channels are searched at once and every CTRL request is issued
+    before any reply is awaited, so the whole pass costs about one round
+    trip instead of one per PV.
+    """
+    from epics import ca, dbr
+
+    ca.use_initial_context()
+    chids = {}
+    owned = []
+    for name in pvnames:
+        chids[name], new = _open_channel(ca, name)
+        if new:
+            owned.append(chids[name])
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if all(ca.isConnected(c) for c in chids.values()):
+            break
+        ca.pend_event(0.01)
+
+    pending = []
+    for name, chid in chids.items():
+        if ca.isConnected(chid):
+            ftype = ca.promote_type(chid, use_ctrl=True)
+            ca.get_with_metadata(chid, ftype=ftype, count=1, wait=False)
+            pending.append((name, chid, ftype))
+    ca.flush_io()
+
+    infos = {}
+    for name, chid, ftype in pending:
+        remaining = max(deadline - time.monotonic(), 0.5)
+        metadata = ca.get_complete_with_metadata(
+            chid, ftype=ftype, count=1, timeout=remaining
+        )
+        if metadata is None:
+            continue
+        enum_strs = metadata.get("enum_strs") or ()
+        infos[name] = PVInfo(
+            name=name,
+            type=dbr.Name(ca.field_type(chid)).lower(),
+            count=ca.element_count(chid),
+            host=ca.host_name(chid),
+            write_access=bool(ca.write_access(chid)),
+            egu=metadata.get("units", "") or "",
+            prec=int(metadata.get("precision", 0) or 0),
+            hopr=_limit(metadata, "upper_disp_limit"),
+            lopr=_limit(metadata, "lower_disp_limit"),
+            drvh=_limit(metadata, "upper_ctrl_limit"),
+            drvl=_limit(metadata, "lower_ctrl_limit"),
+            hihi=_limit(metadata, "upper_alarm_limit"),
+            high=_limit(metadata, "upper_warning_limit"),
+            low=_limit(metadata, "lower_warning_limit"),
+            lolo=_limit(metadata, "lower_alarm_limit"),
+            enum_strs=tuple(
+                s.decode() if isinstance(s, bytes) else s for s in enum_strs
+            ),
+        )
+    for chid in owned:
+        ca.clear_channel(chid)
+    return infos
+
+
+def read_boot_time(prefix, timeout=1.0):
+    """The IOC's boot timestamp string, or None if it cannot be read"""
+    from epics import ca
+
+    ca.use_initial_context()
+    chid, owned = _open_channel(ca, f"{prefix}:{BOOT_TIME}")
+    try:
+        if not ca.connect_channel(chid, timeout=timeout):
+            return None
+        value = ca.get(chid, as_string=True, timeout=timeout)
+        return value or None
+    finally:
+        if owned:
+            ca.clear_channel(chid)
+
+
+class MetadataCache:
+    """
+    PVInfo for every record the IOC loads, persisted under epicsdb.CACHE_DIR
+
+    load() reads the file and checks the IOC's IOC:BOOT_TIME. When the IOC
+    has rebooted since the cache was written every entry is dropped, since
+    limits, units and even types may have changed, and all names from the
+    .db files are discovered again in one pass. If the IOC cannot be
+    reached the cached entries are used as they are, so clients can still
+    build their displays. get() discovers and caches names the cache does
+    not know yet. Names that did not connect are remembered in missing and
+    not searched for again until the IOC reboots or refresh() is called.
+    """
+
+    def __init__(self, ioc=None, path=None, timeout=2.0):
+        self.ioc = ioc or epicsdb.load_ioc()
+        self.path = path or epicsdb.CACHE_DIR / f"metadata-{self.ioc.prefix}.pickle"
+        self.timeout = timeout
+        self.infos = {}
+        self.missing = set()
+        self.boot_time = None
+        self.discovered = 0
+
+    def __contains__(self, pvname):
+        return pvname in self.infos
+
+    def __getitem__(self, pvname):
+        return self.infos[pvname]
+
+    def __len__(self):
+        return len(self.infos)
+
+    def _read(self):
+        try:
+            with open(self.path, "rb") as f:
+                version, boot_time, infos, missing = pickle.load(f)
+        except (OSError, pickle.PickleError, EOFError, ValueError, AttributeError):
+            return None, {}, set()
+        if version != CACHE_VERSION:
+            return None, {}, set()
+        return boot_time, infos, missing
+
+    def save(self):
+        epicsdb.write_cache(
+            self.path, (CACHE_VERSION, self.boot_time, self.infos, self.missing)
+        )
+
+    def load(self):
+        """Fill the cache from disk, rediscovering everything after an IOC reboot"""
+        cached_boot, self.infos, self.missing = self._read()
+        boot_time = read_boot_time(self.ioc.prefix, self.timeout)
+        if boot_time is None:
+            self.boot_time = cached_boot
+            return self
+        if boot_time != cached_boot:
+            self.infos = {}
+            self.missing = set()
+        self.boot_time = boot_time
+        unknown = self._unknown(self.ioc.names())
+        if unknown:
+            self.refresh(unknown)
+        return self
+
+    def refresh(self, pvnames=None):
+        """Discover pvnames (default every IOC record) again and save"""
+        pvnames = list(self.ioc.names() if pvnames is None else pvnames)
+        found = discover(pvnames, self.timeout)
+        self.discovered += len(found)
+        self.infos.update(found)
+        self.missing.difference_update(found)
+        self.missing.update(name for name in pvnames if name not in found)
+        self.save()
+        return found
+
+    def _unknown(self, pvnames):
+        return [
+            name
+            for name in pvnames
+            if name not in self.infos and name not in self.missing
+        ]
+
+    def get(self, pvname):
+        """PVInfo for pvname, discovering it on a miss, None if it never connects"""
+        if self._unknown([pvname]):
+            self.refresh([pvname])
+        return self.infos.get(pvname)
+
+    def get_many(self, pvnames):
+        """{pvname: PVInfo} with every miss discovered in one pass"""
+        unknown = self._unknown(pvnames)
+        if unknown:
+            self.refresh(unknown)
+        return {name: self.infos[name] for name in pvnames if name in self.infos}
+
+
+_CACHE = None
+
+
+def load(timeout=2.0):
+    """The process-wide MetadataCache, loaded on first use"""
+    global _CACHE
+    if _CACHE is None:
+        _CACHE = MetadataCache(timeout=timeout).load()
+    return _CACHE
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show or refresh cached PV metadata")
+    parser.add_argument("pvnames", nargs="*", help="PVs to describe, default a summary")
+    parser.add_argument(
+        "--refresh", action="store_true", help="discover every IOC record again"
+    )
+    parser.add_argument("--timeout", type=float, default=2.0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    cache = MetadataCache(timeout=args.timeout).load()
+    if args.refresh:
+        cache.refresh()
+    elapsed = time.perf_counter() - start
+    for pvname in args.pvnames:
+        info = cache.get(pvname)
+        print(info.format() if info else f"{pvname}: not connected")
+    print(
+        f"{len(cache)} PVs in {cache.path} ({len(cache.missing)} not connected), "
+        f"IOC booted {cache.boot_time or 'unknown'}, "
+        f"{cache.discovered} discovered in {elapsed * 1e3:.0f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
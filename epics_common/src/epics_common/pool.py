@@ -0,0 +1,192 @@
+"""
+PV Connection Pool
+Process-wide PV objects behind caget/caput/cainfo-style helpers
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+DEFAULT_SIZE = 4096
+CONNECT_TIMEOUT = 1.0  # s
+
+
+@dataclass
+class _Entry:
+    pv: object
+    created: float
+    last_used: float
+    uses: int = 0
+    owned: bool = False
+
+
+class PVPool:
+    """
+    Bounded set of connected PVs, least recently used evicted first
+
+    Every helper call looks the PV up here, so a script that reads or
+    writes the same names over and over searches for each channel once.
+    PVs are created without monitors so write-only channels cost nothing
+    between puts. PV.disconnect() keeps the CA channel open, so evicted PVs
+    also clear their channel if the pool opened it, and max_size bounds the
+    channels the pool holds open.
+    """
+
+    def __init__(self, max_size=DEFAULT_SIZE, connect_timeout=CONNECT_TIMEOUT):
+        self.max_size = max_size
+        self.connect_timeout = connect_timeout
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, pvname):
+        return pvname in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _create(self, pvname):
+        """(PV, owned), owned if no other user had a channel for pvname open"""
+        from epics import PV, ca
+
+        ca.use_initial_context()
+        owned = pvname not in ca._cache[ca.current_context()]
+        pv = PV(
+            pvname,
+            auto_monitor=False,
+            connection_timeout=self.connect_timeout,
+        )
+        return pv, owned
+
+    def _release(self, entries):
+        """Disconnect evicted PVs and clear the channels the pool opened"""
+        if not entries:
+            return
+        from epics import ca
+
+        for entry in entries:
+            pv = entry.pv
+            chid = pv.chid
+            pv.disconnect()
+            if entry.owned and chid is not None:
+                ca.clear_channel(chid)
+                ca._cache[pv.context].pop(pv.pvname, None)
+
+    def get_pv(self, pvname):
+        """The pooled PV for pvname, creating it (not yet connected) on a miss"""
+        now = time.monotonic()
+        evicted = []
+        with self._lock:
+            entry = self._entries.get(pvname)
+            if entry is None:
+                self.misses += 1
+                pv, owned = self._create(pvname)
+                entry = _Entry(pv, now, now, owned=owned)
+                self._entries[pvname] = entry
+                while len(self._entries) > self.max_size:
+                    evicted.append(self._entries.popitem(last=False)[1])
+                    self.evictions += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(pvname)
+            entry.last_used = now
+            entry.uses += 1
+        self._release(evicted)
+        return entry.pv
+
+    def warm_up(self, pvnames, timeout=2.0):
+        """Create PVs for all names so their searches run in parallel, wait for them"""
+        pvs = [self.get_pv(name) for name in pvnames]
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if all(pv.connected for pv in pvs):
+                break
+            time.sleep(0.01)
+        return sum(pv.connected for pv in pvs)
+
+    def idle(self, min_idle=0.0):
+        """{pvname: seconds since last use} for PVs idle at least min_idle"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                name: now - entry.last_used
+                for name, entry in self._entries.items()
+                if now - entry.last_used >= min_idle
+            }
+
+    def evict_idle(self, max_idle):
+        """Disconnect PVs unused for more than max_idle seconds"""
+        evicted = []
+        cutoff = time.monotonic() - max_idle
+        with self._lock:
+            for name in [n for n, e in self._entries.items() if e.last_used < cutoff]:
+                evicted.append(self._entries.pop(name))
+            self.evictions += len(evicted)
+        self._release(evicted)
+        return len(evicted)
+
+    def stats(self):
+        with self._lock:
+            entries = list(self._entries.values())
+        now = time.monotonic()
+        return {
+            "size": len(entries),
+            "connected": sum(e.pv.connected for e in entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "max_idle": max((now - e.last_used for e in entries), default=0.0),
+        }
+
+    def clear(self):
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        self._release(entries)
+
+
+POOL = PVPool()
+
+
+def caget(pvname, as_string=False, timeout=None, pool=None):
+    """Like epics.caget, over the pooled PV. None if it cannot connect"""
+    pv = (pool or POOL).get_pv(pvname)
+    if not pv.wait_for_connection(timeout=timeout):
+        return None
+    return pv.get(as_string=as_string, timeout=timeout, use_monitor=False)
+
+
+def caput(pvname, value, wait=False, verify=False, timeout=None, pool=None):
+    """
+    Like epics.caput, over the pooled PV. None if it cannot connect
+
+    verify=True puts with a completion callback and returns True only once
+    the IOC reports the record processed, instead of reading the value back.
+    """
+    pv = (pool or POOL).get_pv(pvname)
+    if not pv.wait_for_connection(timeout=timeout):
+        return None
+    if verify:
+        return pv.put(value, wait=True, timeout=timeout or 30.0) == 1
+    return pv.put(value, wait=wait, timeout=timeout or 30.0)
+
+
+def cainfo(pvname, print_out=True, timeout=None, pool=None):
+    """Like epics.cainfo, over the pooled PV"""
+    pv = (pool or POOL).get_pv(pvname)
+    if not pv.wait_for_connection(timeout=timeout):
+        return None
+    pv.get(timeout=timeout, use_monitor=False)
+    pv.get_ctrlvars(timeout=timeout or 5.0)
+    info = pv.info
+    if print_out:
+        print(info)
+    return info
+
+
+def warm_up(pvnames, timeout=2.0):
+    """Connect PVs in the shared pool ahead of first use"""
+    return POOL.warm_up(pvnames, timeout)
@@ -0,0 +1,111 @@
+"""
+Publish Scheduler
+Per-PV publish periods on a hashed timing wheel, taken from each record's SCAN
+"""
+
+import time
+
+
+def publish_periods(specs, passive=1.0, overrides=None):
+    """
+    {pvname: period in s} for PVSpecs from their SCAN field
+
+    Passive, event and I/O Intr records get passive. overrides replaces the
+    period of records by PV name or PVSpec.key, e.g. {"timestamp": 5.0}.
+    """
+    overrides = overrides or {}
+    periods = {}
+    for spec in specs:
+        period = overrides.get(spec.name, overrides.get(spec.key))
+        if period is None:
+            period = spec.scan_period or passive
+        periods[spec.name] = period
+    return periods
+
+
+class _Entry:
+    __slots__ = ("name", "ticks", "rounds")
+
+    def __init__(self, name, ticks):
+        self.name = name
+        self.ticks = ticks
+        self.rounds = 0
+
+
+class PublishScheduler:
+    """
+    Hashed timing wheel of PVs that are due for publishing
+
+    Periods are rounded to whole ticks. Each PV sits in the slot of its next
+    due tick with the number of extra turns of the wheel to wait, so
+    advancing one tick only touches that slot's entries and each due PV is
+    rescheduled in O(1), however many PVs and periods there are. due()
+    returns everything that fell due since the last call as one list, for a
+    single batched write.
+    """
+
+    def __init__(self, periods, tick=0.1, slots=256, start=None):
+        self.tick = tick
+        self.wheel = [[] for _ in range(slots)]
+        self.start = time.monotonic() if start is None else start
+        self.current = 0
+        self.periods = {}
+        self._deferred = {}
+        for name, period in periods.items():
+            self.add(name, period)
+
+    def _insert(self, entry, delay):
+        target = self.current + delay
+        entry.rounds = (delay - 1) // len(self.wheel)
+        self.wheel[target % len(self.wheel)].append(entry)
+
+    def add(self, name, period, first=None):
+        """
+        Publish name every period s, first due after first ticks
+
+        first defaults to the next tick, so everything goes out at startup.
+        """
+        ticks = max(1, round(period / self.tick))
+        self.periods[name] = ticks * self.tick
+        self._insert(_Entry(name, ticks), 1 if first is None else max(1, first))
+
+    def advance(self):
+        """Move the wheel one tick and return the PVs due on it"""
+        self.current += 1
+        index = self.current % len(self.wheel)
+        slot = self.wheel[index]
+        self.wheel[index] = []
+        due = []
+        for entry in slot:
+            if entry.rounds:
+                entry.rounds -= 1
+                self.wheel[index].append(entry)
+            else:
+                due.append(entry.name)
+                self._insert(entry, entry.ticks)
+        return due
+
+    def defer(self, names):
+        """Hand names out again with the next tick, e.g. after a dropped publish"""
+        self._deferred.update(dict.fromkeys(names))
+
+    def due(self, now=None):
+        """
+        PVs due since the last call, each once
+
+        Ticks missed while the caller was busy are caught up here, so a slow
+        frame delays publishes but never skips them. Names passed to defer()
+        are included again.
+        """
+        now = time.monotonic() if now is None else now
+        # The epsilon keeps now = start + k * tick from landing on tick k - 1
+        target = int((now - self.start) / self.tick + 1e-9)
+        if target <= self.current:
+            return []
+        if target == self.current + 1 and not self._deferred:
+            return self.advance()
+        due = self._deferred
+        self._deferred = {}
+        while self.current < target:
+            due.update(dict.fromkeys(self.advance()))
+        return list(due)
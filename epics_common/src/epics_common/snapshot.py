@@ -0,0 +1,239 @@
+"""
+Machine Snapshots
+Saves every PV in the IOC databases and restores the writable ones in bulk
+"""
+
+import argparse
+import hashlib
+import json
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+
+from . import epicsdb
+from .batch import BatchWriter
+from .lazy import lazy_import
+
+np = lazy_import("numpy")
+
+DEFAULT_DIR = Path("snapshots")
+# Client telemetry is written continuously by the clients themselves
+TELEMETRY = (":HEALTH:", ":PERF:")
+# Machine protection latches are set by the trip path and cleared by an operator
+PROTECTION = (":DUMP:TRIP",)
+
+
+def _same(saved, current):
+    if current is None:
+        return False
+    if isinstance(saved, str):
+        return saved == str(current)
+    saved = np.atleast_1d(np.asarray(saved, dtype=float))
+    current = np.atleast_1d(np.asarray(current, dtype=float))
+    if saved.shape != current.shape:
+        return False
+    return bool(np.allclose(saved, current, rtol=1e-9, atol=1e-12, equal_nan=True))
+
+
+@dataclass
+class Snapshot:
+    """PV values captured at one time, with a hash of their content"""
+
+    timestamp: float
+    prefix: str
+    values: dict = field(repr=False)
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def digest(self):
+        """SHA-256 of the sorted names and values, independent of timestamp"""
+        h = hashlib.sha256()
+        for name in sorted(self.values):
+            value = self.values[name]
+            h.update(name.encode() + b"\0")
+            if isinstance(value, str):
+                h.update(b"s" + value.encode())
+            else:
+                h.update(b"f" + np.asarray(value, dtype=np.float64).tobytes())
+        return h.hexdigest()
+
+    def diff(self, current):
+        """Names whose value in current differs from the snapshot"""
+        return [
+            name
+            for name, value in self.values.items()
+            if not _same(value, current.get(name))
+        ]
+
+    def save(self, directory=DEFAULT_DIR):
+        """
+        Write the snapshot as one compressed .npz and return its path
+
+        Scalars are stored as a single float64 array, waveforms concatenated
+        into another, so a full machine is a few kB on disk.
+        """
+        scalars, strings, arrays = {}, {}, {}
+        for name, value in self.values.items():
+            if isinstance(value, str):
+                strings[name] = value
+            elif np.ndim(value):
+                arrays[name] = np.asarray(value, dtype=np.float64).ravel()
+            else:
+                scalars[name] = float(value)
+        digest = self.digest
+        meta = {"timestamp": self.timestamp, "prefix": self.prefix, "digest": digest}
+        stamp = datetime.fromtimestamp(self.timestamp).strftime("%Y%m%d_%H%M%S")
+
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"snapshot_{stamp}_{digest[:12]}.npz"
+        np.savez_compressed(
+            path,
+            meta=np.array(json.dumps(meta)),
+            scalar_names=np.array(list(scalars), dtype=str),
+            scalars=np.fromiter(scalars.values(), dtype=np.float64, count=len(scalars)),
+            string_names=np.array(list(strings), dtype=str),
+            strings=np.array(list(strings.values()), dtype=str),
+            array_names=np.array(list(arrays), dtype=str),
+            array_lengths=np.array([len(a) for a in arrays.values()], dtype=np.int64),
+            array_data=(
+                np.concatenate(list(arrays.values())) if arrays else np.zeros(0)
+            ),
+        )
+        return path
+
+    @classmethod
+    def load(cls, path):
+        """Read a snapshot written by save(), checking its hash"""
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            values = dict(zip(data["scalar_names"].tolist(), data["scalars"].tolist()))
+            values.update(zip(data["string_names"].tolist(), data["strings"].tolist()))
+            offsets = np.cumsum(data["array_lengths"])[:-1]
+            chunks = np.split(data["array_data"], offsets)
+            values.update(zip(data["array_names"].tolist(), chunks))
+        snapshot = cls(meta["timestamp"], meta["prefix"], values)
+        if snapshot.digest != meta["digest"]:
+            raise ValueError(f"{path} does not match its content hash")
+        return snapshot
+
+
+@dataclass
+class RestoreResult:
+    """What restore() changed and whether the readback agreed"""
+
+    checked: int
+    changed: list
+    failed: int
+    mismatched: list
+    elapsed: float
+
+    @property
+    def ok(self):
+        return not self.failed and not self.mismatched
+
+
+def restorable(ioc, groups=None):
+    """Writable records to restore, optionally only these subsystems"""
+    prefixes = tuple(f"{ioc.prefix}:{g}:" for g in groups) if groups else None
+    return [
+        spec.name
+        for spec in ioc
+        if spec.writable
+        and not any(t in spec.name for t in TELEMETRY)
+        and not spec.name.endswith(PROTECTION)
+        and (prefixes is None or spec.name.startswith(prefixes))
+    ]
+
+
+def capture(ioc=None, writer=None, timeout=2.0):
+    """Read every PV in the IOC databases with one bulk get"""
+    ioc = ioc or epicsdb.load_ioc()
+    names = ioc.names()
+    writer = writer or BatchWriter(names, connect_timeout=timeout)
+    values = writer.read(names, timeout)
+    values = {name: value for name, value in values.items() if value is not None}
+    return Snapshot(time.time(), ioc.prefix, values)
+
+
+def restore(snapshot, ioc=None, writer=None, groups=None, timeout=2.0, dry_run=False):
+    """
+    Put back every restorable PV that differs from the snapshot
+
+    Reads the current values in bulk, writes only the differing PVs in one
+    batch and reads back just those to verify them.
+    """
+    start = time.perf_counter()
+    ioc = ioc or epicsdb.load_ioc()
+    names = [n for n in restorable(ioc, groups) if n in snapshot.values]
+    writer = writer or BatchWriter(names, connect_timeout=timeout)
+    current = writer.read(names, timeout)
+    changed = [n for n in names if not _same(snapshot.values[n], current[n])]
+    failed, mismatched = 0, []
+    if changed and not dry_run:
+        failed = writer.write((n, snapshot.values[n]) for n in changed)
+        readback = writer.read(changed, timeout)
+        mismatched = [n for n in changed if not _same(snapshot.values[n], readback[n])]
+    return RestoreResult(
+        len(names), changed, failed, mismatched, time.perf_counter() - start
+    )
+
+
+def find(reference, directory=DEFAULT_DIR):
+    """A snapshot path, or the newest snapshot in directory whose hash starts with reference"""
+    path = Path(reference)
+    if path.exists():
+        return path
+    matches = sorted(Path(directory).glob(f"snapshot_*_{reference}*.npz"))
+    if not matches:
+        raise FileNotFoundError(f"No snapshot matching {reference} in {directory}")
+    return matches[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Save and restore machine snapshots")
+    parser.add_argument("--dir", type=Path, default=DEFAULT_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("save", help="capture every PV in the IOC databases")
+    for name, help in (
+        ("restore", "put back PVs that differ from a snapshot"),
+        ("diff", "list PVs that differ from a snapshot"),
+    ):
+        command = commands.add_parser(name, help=help)
+        command.add_argument("snapshot", help="path or content hash prefix")
+        command.add_argument(
+            "--group", action="append", help="only this subsystem, e.g. STEER"
+        )
+    args = parser.parse_args()
+
+    ioc = epicsdb.load_ioc()
+    if args.command == "save":
+        start = time.perf_counter()
+        snapshot = capture(ioc)
+        path = snapshot.save(args.dir)
+        elapsed = time.perf_counter() - start
+        print(f"Saved {len(snapshot)}/{len(ioc)} PVs to {path} in {elapsed:.3f}s")
+        print(f"Hash: {snapshot.digest}")
+        return
+
+    snapshot = Snapshot.load(find(args.snapshot, args.dir))
+    result = restore(snapshot, ioc, groups=args.group, dry_run=args.command == "diff")
+    for name in result.changed:
+        print(f"  {name} -> {snapshot.values[name]!r}")
+    print(
+        f"{len(result.changed)} of {result.checked} PVs differ"
+        f" ({result.elapsed:.3f}s)"
+    )
+    if args.command == "restore":
+        print(
+            f"Failed puts: {result.failed}, readback mismatches: {len(result.mismatched)}"
+        )
+        for name in result.mismatched:
+            print(f"  mismatch: {name}")
+
+
+if __name__ == "__main__":
+    main()
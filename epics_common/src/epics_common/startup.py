@@ -0,0 +1,125 @@
+"""
+Startup Benchmark
+Cold-start time of the command line tools, each run in a fresh interpreter
+"""
+
+import argparse
+import csv
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from . import epicsdb
+
+REPO = Path(__file__).resolve().parents[3]
+# Modules whose import dominates startup, reported when a command loads them
+HEAVY = ("epics", "numpy", "pyray")
+
+
+def commands(csv_file, ca=False):
+    """{name: (argv, cwd)} of the commands to time"""
+    python = sys.executable
+    examples = REPO / "python-ca-examples"
+    cmds = {
+        "python -c pass": ([python, "-c", "pass"], None),
+        "load_ioc": (
+            [python, "-c", "from epics_common import epicsdb; epicsdb.load_ioc()"],
+            None,
+        ),
+        "data_logger analyze": (
+            [python, str(examples / "data_logger.py"), "analyze", str(csv_file)],
+            examples,
+        ),
+        "snapshot --help": ([python, "-m", "epics_common.snapshot", "--help"], None),
+        "import beam_dump": ([python, "-c", "import main"], REPO / "beam_dump"),
+    }
+    if ca:
+        pvname = f"{epicsdb.load_ioc().prefix}:DUMP:MEAN_X"
+        cmds["caget"] = (
+            [
+                python,
+                "-c",
+                f"from epics_common.pool import caget; caget({pvname!r}, timeout=2)",
+            ],
+            None,
+        )
+    return cmds
+
+
+def write_sample_csv(path, rows=1000):
+    """A data_logger CSV to analyze"""
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(
+            ["timestamp", "iso_time", "pv_name", "value", "status", "severity"]
+        )
+        start = time.time()
+        for i in range(rows):
+            writer.writerow([start + i, "", "bradm:aSubExample", i % 100, 0, 0])
+
+
+def heavy_imports(argv, cwd):
+    """{module: cumulative import time in s} of the HEAVY modules argv loads"""
+    result = subprocess.run(
+        argv[:1] + ["-X", "importtime"] + argv[1:],
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+    )
+    imports = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line.split("|")
+        # Lazily loaded packages only log their submodules, so count those too
+        package = name.strip().split(".")[0]
+        if package in HEAVY:
+            seconds = int(cumulative) * 1e-6
+            imports[package] = max(imports.get(package, 0.0), seconds)
+    return imports
+
+
+def measure(argv, cwd, repeat):
+    """Wall times in s of repeat runs, raises if the command fails"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(argv, cwd=cwd, capture_output=True, check=True)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time cold starts of the CLI tools")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument(
+        "--ca", action="store_true", help="also time a caget, needs the IOC running"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_file = Path(tmp) / "sample.csv"
+        write_sample_csv(csv_file)
+        print(f"{'command':<22}{'min ms':>9}{'median ms':>11}{'max ms':>9}  loads")
+        for name, (argv, cwd) in commands(csv_file, args.ca).items():
+            try:
+                times = measure(argv, cwd, args.repeat)
+            except subprocess.CalledProcessError as e:
+                print(f"{name:<22} failed: {e.stderr.decode().strip()[-200:]}")
+                continue
+            imports = heavy_imports(argv, cwd)
+            loads = (
+                ", ".join(f"{m} {t * 1e3:.0f} ms" for m, t in imports.items()) or "-"
+            )
+            print(
+                f"{name:<22}{min(times) * 1e3:>9.1f}"
+                f"{statistics.median(times) * 1e3:>11.1f}"
+                f"{max(times) * 1e3:>9.1f}  {loads}"
+            )
+
+
+if __name__ == "__main__":
+    main()
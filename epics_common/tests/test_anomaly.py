@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from epics_common.anomaly import DRIFT_DOWN, DRIFT_UP, STEP, AnomalyDetector
+
+
+def run(signal, **options):
+    """Anomalies raised by feeding a (samples, channels) array one row at a time"""
+    detector = AnomalyDetector([f"CH{j}" for j in range(signal.shape[1])], **options)
+    anomalies = []
+    for t, row in enumerate(signal):
+        anomalies.extend(detector.update(row, float(t)))
+    return anomalies
+
+
+def first(anomalies, kind, start=0):
+    return next((a for a in anomalies if a.kind == kind and a.timestamp >= start), None)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_slow_ramp_is_flagged_as_drift(seed):
+    rng = np.random.default_rng(seed)
+    noise = rng.standard_normal((5000, 1))
+    ramp = 0.002 * np.maximum(np.arange(5000) - 500, 0)[:, None]
+    anomalies = run(10.0 + noise + ramp)
+    drift = first(anomalies, DRIFT_UP, start=500)
+    assert drift is not None
+    # 0.002 sigma per sample passes 2 sigma after 1000 samples
+    assert drift.timestamp < 1500
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_one_sigma_shift_is_flagged(seed):
+    rng = np.random.default_rng(seed)
+    signal = rng.standard_normal((1000, 1))
+    signal[500:] -= 1.0
+    drift = first(run(signal), DRIFT_DOWN, start=500)
+    assert drift is not None and drift.timestamp < 600
+
+
+def test_large_step():
+    rng = np.random.default_rng(0)
+    signal = rng.standard_normal((300, 1))
+    signal[200:] += 20.0
+    step = first(run(signal), STEP)
+    assert step is not None and step.timestamp == 200.0
+
+
+def test_stationary_noise_rarely_flags():
+    rng = np.random.default_rng(1)
+    anomalies = run(rng.standard_normal((5000, 100)))
+    # 500k samples of white noise
+    assert len(anomalies) < 25
@@ -0,0 +1,28 @@
+import threading
+import time
+
+from epics_common.dispatch import MonitorDispatcher
+
+
+def test_stop_leaves_the_queue_to_a_busy_consumer():
+    delivered = []
+    threads = set()
+    busy = threading.Event()
+
+    def consumer(events):
+        threads.add(threading.current_thread())
+        busy.set()
+        time.sleep(0.2)
+        delivered.extend(e.value for e in events)
+
+    dispatcher = MonitorDispatcher(consumer, max_batch=1).start()
+    dispatcher.callback(pvname="TEST:PV", value=0)
+    busy.wait(1.0)
+    for value in range(1, 4):
+        dispatcher.callback(pvname="TEST:PV", value=value)
+    dispatcher.stop(timeout=0.05)
+    assert threading.current_thread() not in threads
+
+    dispatcher._thread.join(2.0)
+    assert delivered == [0, 1, 2, 3]
+    assert len(threads) == 1
@@ -0,0 +1,13 @@
+from epics_common.scheduler import PublishScheduler
+
+
+def test_deferred_names_come_back_with_the_next_tick():
+    scheduler = PublishScheduler({"FAST": 0.1, "SLOW": 1.0}, tick=0.1, start=0.0)
+    assert sorted(scheduler.due(0.1)) == ["FAST", "SLOW"]
+    # The publish of that tick was dropped
+    scheduler.defer(["FAST", "SLOW"])
+    assert scheduler.due(0.15) == []
+    assert sorted(scheduler.due(0.2)) == ["FAST", "SLOW"]
+    # Handed out once, SLOW is next due a period after it first went out
+    assert scheduler.due(0.3) == ["FAST"]
+    assert sorted(scheduler.due(1.1)) == ["FAST", "SLOW"]
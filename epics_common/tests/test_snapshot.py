@@ -0,0 +1,11 @@
+from epics_common.epicsdb import load_ioc
+from epics_common.snapshot import restorable
+
+
+def test_restore_leaves_machine_protection_alone():
+    ioc = load_ioc(use_cache=False)
+    names = restorable(ioc)
+    assert f"{ioc.prefix}:DUMP:TRIP" in ioc.names()
+    assert f"{ioc.prefix}:DUMP:TRIP" not in names
+    # Settings next to the trip are still restored
+    assert any(name.startswith(f"{ioc.prefix}:DUMP:") for name in names)
@@ -0,0 +1,401 @@
+import argparse
+import random
+import threading
+import time
+from dataclasses import dataclass
+import numpy as np
+import pyray as rl
+from epics import PV
+from epics_common import epicsdb, instrumentation
+from epics_common.dispatch import MonitorDispatcher
+
+IOC = epicsdb.load_ioc()
+IOC_PREFIX = IOC.prefix
+
+SCREEN_WIDTH = 1600
+SCREEN_HEIGHT = 900
+STATUS_HEIGHT = 28
+BOARD_HEIGHT = SCREEN_HEIGHT - STATUS_HEIGHT
+TILE_WIDTH = 192
+TILE_HEIGHT = 40
+HEADER_HEIGHT = 22
+MARGIN = 4
+LABEL_SIZE = 10
+VALUE_SIZE = 20
+SCROLL_STEP = 3 * (TILE_HEIGHT + MARGIN)
+
+BACKGROUND = rl.Color(18, 18, 24, 255)
+LABEL_COLOR = rl.Color(200, 200, 200, 255)
+SEVERITY_COLORS = (
+    rl.Color(30, 80, 40, 255),  # NO_ALARM
+    rl.Color(160, 120, 0, 255),  # MINOR
+    rl.Color(170, 30, 30, 255),  # MAJOR
+    rl.Color(110, 50, 150, 255),  # INVALID
+)
+DISCONNECTED_COLOR = rl.Color(55, 55, 60, 255)
+
+
+def format_value(spec: epicsdb.PVSpec, value) -> str:
+    """Display text for a monitor value, using the record's states, PREC and EGU"""
+    if value is None:
+        return "--"
+    states = spec.enum_strs
+    if states:
+        index = int(value)
+        return states[index] if 0 <= index < len(states) else str(index)
+    if isinstance(value, str) or spec.dtype is str:
+        return str(value)
+    if np.ndim(value):
+        if len(value) == 0:
+            return "[0]"
+        return f"[{len(value)}] max {np.max(value):.4g} {spec.egu}".rstrip()
+    if spec.dtype is int:
+        return f"{int(value)} {spec.egu}".rstrip()
+    if "PREC" in spec.fields:
+        return f"{value:.{spec.prec}f} {spec.egu}".rstrip()
+    return f"{value:.4g} {spec.egu}".rstrip()
+
+
+@dataclass(eq=False)
+class Tile:
+    spec: epicsdb.PVSpec
+    label: str
+    text: str = "--"
+    severity: int = 0
+    connected: bool = False
+    x: int = 0
+    y: int = -1  # content position, -1 while its group is hidden
+
+
+class Board:
+    """
+    One tile per PV, drawn into a render texture that is kept between frames
+
+    The consumer thread formats monitor batches into pending updates. Each
+    frame apply() takes them and marks only tiles whose text, severity or
+    connection changed, and render() redraws just those tiles into the
+    texture. The window then shows the whole board as one textured quad, so
+    the text of unchanged tiles is never drawn again until the view scrolls.
+    """
+
+    def __init__(self, specs):
+        self.tiles = {spec.name: Tile(spec, label(spec)) for spec in specs}
+        self.groups = sorted({spec.name.split(":")[1] for spec in specs})
+        self.group = None
+        self.scroll = 0
+        self.content_height = 0
+        self.headers = []
+        self.shown = []
+        self.dirty = set()
+        self.full_redraw = True
+        self.events = 0
+        self.redrawn = 0
+        self.target = None
+        self._pending = {}
+        self._connections = {}
+        self._lock = threading.Lock()
+        self.layout()
+
+    @instrumentation.timed("MONITOR:FORMAT")
+    def on_events(self, events):
+        """MonitorDispatcher consumer, formats values off the render thread"""
+        updates = {}
+        for event in events:
+            tile = self.tiles.get(event.pvname)
+            if tile is not None:
+                updates[event.pvname] = (
+                    format_value(tile.spec, event.value),
+                    event.severity,
+                )
+        with self._lock:
+            self._pending.update(updates)
+            self.events += len(events)
+
+    def on_connection(self, pvname=None, conn=None, **kwargs):
+        with self._lock:
+            self._connections[pvname] = bool(conn)
+
+    def apply(self):
+        """Take pending updates and mark the tiles they change, returns the count"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            connections, self._connections = self._connections, {}
+        changed = 0
+        for name, connected in connections.items():
+            tile = self.tiles[name]
+            if tile.connected != connected:
+                tile.connected = connected
+                self.dirty.add(tile)
+                changed += 1
+        for name, (text, severity) in pending.items():
+            tile = self.tiles[name]
+            if tile.text != text or tile.severity != severity:
+                tile.text, tile.severity = text, severity
+                self.dirty.add(tile)
+                changed += 1
+        return changed
+
+    def layout(self):
+        """Place the tiles of the selected group, or all groups, in rows"""
+        columns = max(1, (SCREEN_WIDTH - MARGIN) // (TILE_WIDTH + MARGIN))
+        for tile in self.tiles.values():
+            tile.y = -1
+        self.headers, self.shown = [], []
+        y = MARGIN
+        for group in self.groups:
+            if self.group not in (None, group):
+                continue
+            tiles = [
+                t for t in self.tiles.values() if t.spec.name.split(":")[1] == group
+            ]
+            self.headers.append((y, f"{group} ({len(tiles)})"))
+            y += HEADER_HEIGHT
+            for i, tile in enumerate(tiles):
+                row, column = divmod(i, columns)
+                tile.x = MARGIN + column * (TILE_WIDTH + MARGIN)
+                tile.y = y + row * (TILE_HEIGHT + MARGIN)
+            rows = -(-len(tiles) // columns)
+            y += rows * (TILE_HEIGHT + MARGIN) + MARGIN
+            self.shown.extend(tiles)
+        self.content_height = y
+        self.full_redraw = True
+        self.scroll_to(self.scroll)
+
+    def select_group(self, step):
+        """Cycle through all groups, then each group on its own"""
+        choices = [None] + self.groups
+        current = choices.index(self.group) if self.group in choices else 0
+        self.group = choices[(current + step) % len(choices)]
+        self.scroll = 0
+        self.layout()
+
+    def scroll_to(self, scroll):
+        scroll = max(0, min(int(scroll), self.content_height - BOARD_HEIGHT))
+        if scroll != self.scroll:
+            self.scroll = scroll
+            self.full_redraw = True
+
+    def visible(self, tile):
+        return (
+            tile.y >= 0
+            and tile.y + TILE_HEIGHT > self.scroll
+            and tile.y < self.scroll + BOARD_HEIGHT
+        )
+
+    def draw_tile(self, tile):
+        x, y = tile.x, tile.y - self.scroll
+        color = (
+            SEVERITY_COLORS[min(tile.severity, 3)]
+            if tile.connected
+            else DISCONNECTED_COLOR
+        )
+        rl.draw_rectangle(x, y, TILE_WIDTH, TILE_HEIGHT, color)
+        rl.draw_text(tile.label, x + 4, y + 3, LABEL_SIZE, LABEL_COLOR)
+        text = tile.text if tile.connected else "disconnected"
+        rl.draw_text(text, x + 4, y + 16, VALUE_SIZE, rl.RAYWHITE)
+
+    def render(self):
+        """Redraw changed tiles into the board texture, returns how many were drawn"""
+        if self.target is None:
+            self.target = rl.load_render_texture(SCREEN_WIDTH, BOARD_HEIGHT)
+            self.full_redraw = True
+        if self.full_redraw:
+            tiles = [t for t in self.shown if self.visible(t)]
+        else:
+            tiles = [t for t in self.dirty if self.visible(t)]
+        self.dirty.clear()
+        if not tiles and not self.full_redraw:
+            self.redrawn = 0
+            return 0
+
+        rl.begin_texture_mode(self.target)
+        if self.full_redraw:
+            rl.clear_background(BACKGROUND)
+            for y, text in self.headers:
+                if self.scroll - HEADER_HEIGHT < y < self.scroll + BOARD_HEIGHT:
+                    rl.draw_text(text, MARGIN, y - self.scroll + 4, 14, LABEL_COLOR)
+        for tile in tiles:
+            # Clip long values to the tile instead of drawing over a neighbour
+            rl.begin_scissor_mode(tile.x, tile.y - self.scroll, TILE_WIDTH, TILE_HEIGHT)
+            self.draw_tile(tile)
+            rl.end_scissor_mode()
+        rl.end_texture_mode()
+        self.full_redraw = False
+        self.redrawn = len(tiles)
+        return len(tiles)
+
+    def draw(self):
+        """Show the board texture, flipped because render textures are bottom-up"""
+        rl.draw_texture_rec(
+            self.target.texture,
+            rl.Rectangle(0, 0, SCREEN_WIDTH, -BOARD_HEIGHT),
+            rl.Vector2(0, 0),
+            rl.WHITE,
+        )
+
+    def close(self):
+        if self.target is not None:
+            rl.unload_render_texture(self.target)
+            self.target = None
+
+
+def label(spec: epicsdb.PVSpec) -> str:
+    """PV name without the IOC prefix, shortened to fit a tile"""
+    text = spec.name.removeprefix(f"{IOC_PREFIX}:")
+    max_chars = (TILE_WIDTH - 8) // 6
+    return text if len(text) <= max_chars else "..." + text[-max_chars + 3 :]
+
+
+def connect(specs, board: Board, dispatcher: MonitorDispatcher):
+    """Monitor every PV, values go through the dispatcher, connections to the board"""
+    return [
+        PV(
+            spec.name,
+            callback=dispatcher.callback,
+            connection_callback=board.on_connection,
+        )
+        for spec in specs
+    ]
+
+
+def synthetic_specs(count, per_group=100):
+    """Records that only exist in this process, for load testing the board"""
+    return [
+        epicsdb.PVSpec(
+            f"{IOC_PREFIX}:SIM{i // per_group:02d}:CH{i % per_group:02d}",
+            "ai",
+            {"PREC": "3", "EGU": "mA"},
+        )
+        for i in range(count)
+    ]
+
+
+def run_synthetic(specs, board: Board, dispatcher: MonitorDispatcher, rate, stop):
+    """Random walk every spec at rate Hz, fed through dispatcher.callback like CA"""
+    rng = random.Random()
+    values = [rng.uniform(0.0, 10.0) for _ in specs]
+    for spec in specs:
+        board.on_connection(spec.name, True)
+    start = time.monotonic()
+    sent = 0
+    while not stop.is_set():
+        due = int((time.monotonic() - start) * rate * len(specs))
+        while sent < due:
+            i = sent % len(specs)
+            values[i] = min(max(values[i] + rng.gauss(0.0, 0.3), -2.0), 12.0)
+            deviation = abs(values[i] - 5.0)
+            severity = 2 if deviation > 6.0 else 1 if deviation > 4.5 else 0
+            dispatcher.callback(
+                pvname=specs[i].name, value=values[i], severity=severity
+            )
+            sent += 1
+        stop.wait(0.005)
+
+
+def draw_status(board: Board, fps, event_rate, draw_ms):
+    rl.draw_rectangle(0, BOARD_HEIGHT, SCREEN_WIDTH, STATUS_HEIGHT, rl.BLACK)
+    connected = sum(t.connected for t in board.tiles.values())
+    alarms = sum(t.connected and t.severity > 0 for t in board.tiles.values())
+    text = (
+        f"{fps} FPS | draw {draw_ms:.2f} ms | {board.redrawn} tiles redrawn | "
+        f"{event_rate:.0f} updates/s | {connected}/{len(board.tiles)} connected | "
+        f"{alarms} in alarm | group: {board.group or 'ALL'}  "
+        f"(Tab: group, wheel/PgUp/PgDn: scroll)"
+    )
+    rl.draw_text(text, MARGIN, BOARD_HEIGHT + 7, 14, rl.RAYWHITE)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="State board of every IOC PV")
+    parser.add_argument("--group", help="only show this subsystem, e.g. VAC")
+    parser.add_argument(
+        "--synthetic",
+        type=int,
+        default=0,
+        help="show this many simulated PVs instead of the IOC, for load testing",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=2.0,
+        help="update rate of each simulated PV in Hz",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.synthetic:
+        specs = synthetic_specs(args.synthetic)
+    else:
+        specs = [spec for spec in IOC if not spec.name.endswith("_CALC")]
+
+    board = Board(specs)
+    if args.group:
+        if args.group.upper() not in board.groups:
+            raise SystemExit(
+                f"Unknown group {args.group}, expected one of {', '.join(board.groups)}"
+            )
+        board.group = args.group.upper()
+        board.layout()
+
+    rl.set_trace_log_level(rl.TraceLogLevel.LOG_WARNING)
+    rl.init_window(SCREEN_WIDTH, SCREEN_HEIGHT, "EPICS State Board")
+    rl.set_target_fps(60)
+    dispatcher = MonitorDispatcher(board.on_events, coalesce=True).start()
+    perf_reporter = instrumentation.start_from_env(IOC_PREFIX)
+    stop = threading.Event()
+    if args.synthetic:
+        threading.Thread(
+            target=run_synthetic,
+            args=(specs, board, dispatcher, args.rate, stop),
+            daemon=True,
+        ).start()
+        pvs = []
+    else:
+        pvs = connect(specs, board, dispatcher)
+
+    window_start, window_events, event_rate = time.monotonic(), 0, 0.0
+    draw_ms = 0.0
+    while not rl.window_should_close():
+        if rl.is_key_pressed(rl.KeyboardKey.KEY_TAB):
+            shift = rl.is_key_down(rl.KeyboardKey.KEY_LEFT_SHIFT)
+            board.select_group(-1 if shift else 1)
+        scroll = board.scroll - rl.get_mouse_wheel_move() * SCROLL_STEP
+        if rl.is_key_pressed(rl.KeyboardKey.KEY_PAGE_DOWN):
+            scroll += BOARD_HEIGHT
+        if rl.is_key_pressed(rl.KeyboardKey.KEY_PAGE_UP):
+            scroll -= BOARD_HEIGHT
+        if rl.is_key_pressed(rl.KeyboardKey.KEY_HOME):
+            scroll = 0
+        board.scroll_to(scroll)
+
+        board.apply()
+        now = time.monotonic()
+        if now - window_start >= 1.0:
+            event_rate = (board.events - window_events) / (now - window_start)
+            window_start, window_events = now, board.events
+
+        start = time.perf_counter()
+        with instrumentation.timer("MONITOR:DRAW"):
+            board.render()
+            rl.begin_drawing()
+            board.draw()
+            draw_status(board, rl.get_fps(), event_rate, draw_ms)
+        draw_ms = 0.9 * draw_ms + 0.1 * (time.perf_counter() - start) * 1e3
+        # Outside the timer, end_drawing also waits for the next frame
+        rl.end_drawing()
+
+    stop.set()
+    for pv in pvs:
+        pv.clear_callbacks()
+        pv.disconnect()
+    dispatcher.stop()
+    if perf_reporter:
+        perf_reporter.stop()
+    board.close()
+    rl.close_window()
+
+
+if __name__ == "__main__":
+    main()
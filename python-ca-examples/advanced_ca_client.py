@@ -4,6 +4,8 @@ Demonstrates advanced features: PV objects, callbacks, connection management
 """
 
 from epics import PV
+from epics_common import metadata
+from epics_common.dispatch import MonitorDispatcher
 import time
 import threading
 from datetime import datetime
@@ -13,25 +15,43 @@ from collections import deque
 class PVMonitor:
     """Class to monitor and log PV changes with statistics"""
     
-    def __init__(self, pv_name, buffer_size=100):
+    def __init__(self, pv_name, buffer_size=100, coalesce=False):
         self.pv_name = pv_name
-        self.pv = PV(pv_name, callback=self.on_change)
         self.buffer = deque(maxlen=buffer_size)
         self.change_count = 0
         self.lock = threading.Lock()
+        # Units and precision for printing come from the metadata cache
+        self.info = metadata.load().get(pv_name)
+        # Updates are queued on the CA thread and processed in batches
+        self.dispatcher = MonitorDispatcher(self.on_changes, coalesce=coalesce).start()
+        self.pv = PV(pv_name, callback=self.dispatcher.callback)
         
-    def on_change(self, pvname=None, value=None, timestamp=None, **kwargs):
-        """Callback when PV value changes"""
+    def on_changes(self, events):
+        """Handle a batch of PV changes on the dispatcher thread"""
+        lines = []
         with self.lock:
-            self.change_count += 1
-            dt = datetime.fromtimestamp(timestamp)
-            entry = {
-                'timestamp': dt,
-                'value': value,
-                'count': self.change_count
-            }
-            self.buffer.append(entry)
-            print(f"[{dt.strftime('%H:%M:%S.%f')[:-3]}] {pvname}: {value} (change #{self.change_count})")
+            for event in events:
+                self.change_count += 1
+                dt = datetime.fromtimestamp(event.timestamp)
+                entry = {
+                    'timestamp': dt,
+                    'value': event.value,
+                    'count': self.change_count
+                }
+                self.buffer.append(entry)
+                lines.append(f"[{dt.strftime('%H:%M:%S.%f')[:-3]}] {event.pvname}: {self.format_value(event.value)} (change #{self.change_count})")
+        print("\n".join(lines))
+    
+    def format_value(self, value):
+        """Value with the record's precision and units when they are known"""
+        info = self.info
+        if info is None or not isinstance(value, (int, float)):
+            return str(value)
+        if info.enum_strs and 0 <= int(value) < len(info.enum_strs):
+            return info.enum_strs[int(value)]
+        if isinstance(value, float):
+            return f"{value:.{info.prec}f} {info.egu}".rstrip()
+        return f"{value} {info.egu}".rstrip()
     
     def get_statistics(self):
         """Calculate statistics from buffered values"""
@@ -56,6 +76,7 @@ class PVMonitor:
     def disconnect(self):
         """Disconnect from PV"""
         self.pv.disconnect()
+        self.dispatcher.stop()
 
 
 class PVController:
@@ -63,6 +84,8 @@ class PVController:
     
     def __init__(self, pv_names):
         self.pvs = {name: PV(name) for name in pv_names}
+        # Type, count, host and limits for every PV in one cache read
+        self.info = metadata.load().get_many(pv_names)
         self._wait_for_connections()
     
     def _wait_for_connections(self, timeout=5.0):
@@ -80,6 +103,12 @@ class PVController:
             print(f"{status} {name}: {'Connected' if pv.connected else 'Disconnected'}")
         return False
     
+    def describe(self):
+        """Print type, count, host and limits of every PV from the metadata cache"""
+        for name in self.pvs:
+            info = self.info.get(name)
+            print(info.format() if info else f"{name}: no metadata")
+    
     def get(self, pv_name):
         """Get value from a specific PV"""
         if pv_name in self.pvs:
@@ -175,6 +204,7 @@ def demonstrate_controller():
     
     pv_names = ["bradm:aiExample", "bradm:aSubExample"]
     controller = PVController(pv_names)
+    controller.describe()
     
     # Read all values
     print("\nCurrent values:")
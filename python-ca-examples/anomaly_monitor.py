@@ -0,0 +1,114 @@
+"""
+Anomaly Monitor
+Flags step changes and slow drifts in every numeric PV of the chosen subsystems as updates arrive
+"""
+
+import argparse
+import time
+from datetime import datetime
+from epics import PV
+from epics_common import epicsdb
+from epics_common.anomaly import AnomalyDetector
+from epics_common.dispatch import MonitorDispatcher
+
+# Simulator readbacks; PERF, FLEET and HEALTH records describe the clients themselves
+DEFAULT_GROUPS = ("CRYO", "VAC", "RF", "TARGET", "DUMP")
+REPORT_INTERVAL = 5.0  # s between throughput reports
+
+
+def numeric_pvs(ioc, groups):
+    """Scalar analog and integer records of the groups, enums and waveforms left out"""
+    return [
+        spec.name
+        for group in groups
+        for spec in ioc.subsystem(group)
+        if spec.dtype in (float, int)
+        and spec.record_type not in epicsdb.ENUM_TYPES
+        and spec.nelm == 1
+        and ":HEALTH:" not in spec.name
+    ]
+
+
+class AnomalyMonitor:
+    """Monitor many PVs through one dispatcher and run the detector on every batch"""
+
+    def __init__(self, pv_names, **detector_options):
+        self.detector = AnomalyDetector(pv_names, **detector_options)
+        self.anomalies = 0
+        self.busy = 0.0
+        # Detection runs on the dispatcher thread, never on the CA callback thread
+        self.dispatcher = MonitorDispatcher(self.on_changes).start()
+        self.pvs = [PV(name, callback=self.dispatcher.callback) for name in pv_names]
+
+    def on_changes(self, events):
+        """Feed a batch of updates to the detector and print what it flags"""
+        start = time.perf_counter()
+        anomalies = self.detector.observe(events)
+        self.busy += time.perf_counter() - start
+        self.anomalies += len(anomalies)
+        for anomaly in anomalies:
+            dt = datetime.fromtimestamp(anomaly.timestamp)
+            print(f"[{dt.strftime('%H:%M:%S.%f')[:-3]}] {anomaly.kind:<10} {anomaly.pvname} = "
+                  f"{anomaly.value:.6g} (baseline {anomaly.baseline:.6g}, score {anomaly.score:+.1f})")
+
+    def report(self, elapsed):
+        """Print samples processed and detector cost since the start"""
+        samples = self.detector.samples
+        connected = sum(pv.connected for pv in self.pvs)
+        per_sample = self.busy / samples * 1e6 if samples else 0.0
+        print(f"--- {connected}/{len(self.pvs)} connected, {samples} samples "
+              f"({samples / elapsed:.0f}/s), {per_sample:.1f} us/sample, "
+              f"{self.anomalies} anomalies, backlog {self.dispatcher.backlog}")
+
+    def disconnect(self):
+        """Disconnect every PV and deliver anything still queued"""
+        for pv in self.pvs:
+            pv.disconnect()
+        self.dispatcher.stop()
+
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Flag steps and drifts in PVs as they update")
+    parser.add_argument("groups", nargs="*", default=DEFAULT_GROUPS, help="subsystems to watch, e.g. CRYO VAC")
+    parser.add_argument("--duration", type=float, default=0.0, help="seconds to run, 0 for until Ctrl+C")
+    parser.add_argument("--alpha", type=float, default=0.02, help="EWMA weight of each new sample")
+    parser.add_argument("--z-limit", type=float, default=6.0, help="z-score that counts as a step")
+    parser.add_argument("--cusum-k", type=float, default=0.5, help="CUSUM slack in standard deviations")
+    parser.add_argument("--cusum-h", type=float, default=10.0, help="CUSUM sum that counts as a drift")
+    parser.add_argument("--warmup", type=int, default=20, help="samples per PV before anything is flagged")
+    return parser.parse_args()
+
+
+def main():
+    """Main function"""
+    args = parse_args()
+    ioc = epicsdb.load_ioc()
+    pv_names = numeric_pvs(ioc, args.groups)
+
+    print("="*60)
+    print(f"Anomaly Monitor: {len(pv_names)} PVs in {', '.join(args.groups)}")
+    print("="*60)
+
+    monitor = AnomalyMonitor(
+        pv_names,
+        alpha=args.alpha,
+        z_limit=args.z_limit,
+        cusum_k=args.cusum_k,
+        cusum_h=args.cusum_h,
+        warmup=args.warmup,
+    )
+    start = time.time()
+    try:
+        while not args.duration or time.time() - start < args.duration:
+            time.sleep(REPORT_INTERVAL)
+            monitor.report(time.time() - start)
+    except KeyboardInterrupt:
+        print("\nStopped by user")
+    finally:
+        monitor.disconnect()
+        monitor.report(time.time() - start)
+
+
+if __name__ == "__main__":
+    main()
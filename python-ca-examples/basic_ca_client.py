@@ -3,7 +3,10 @@ Basic Channel Access Client using PyEPICS
 Demonstrates fundamental CA operations with the MyProject IOC
 """
 
-from epics import caget, caput, camonitor, cainfo
+from epics import camonitor
+from epics_common import metadata
+from epics_common.dispatch import MonitorDispatcher
+from epics_common.pool import caget, caput, warm_up
 import time
 from datetime import datetime
 
@@ -13,7 +16,9 @@ def display_pv_info(pv_name):
     print(f"\n{'='*60}")
     print(f"PV Information for: {pv_name}")
     print(f"{'='*60}")
-    cainfo(pv_name, print_out=True)
+    # Read from the on-disk metadata cache, only a PV it has not seen costs a round trip
+    info = metadata.load().get(pv_name)
+    print(info.format() if info else f"{pv_name}: not connected")
 
 
 def read_single_value(pv_name):
@@ -26,21 +31,20 @@ def read_single_value(pv_name):
 
 def write_value(pv_name, value):
     """Write a value to a PV"""
-    success = caput(pv_name, value)
+    # Waits for the put callback, so no second round trip to verify
+    success = caput(pv_name, value, verify=True)
     if success:
-        print(f"Successfully wrote {value} to {pv_name}")
-        # Verify the write
-        new_value = caget(pv_name)
-        print(f"Verified value: {new_value}")
+        print(f"Successfully wrote {value} to {pv_name} (processing complete)")
     else:
         print(f"Failed to write to {pv_name}")
     return success
 
 
-def monitor_callback(pvname=None, value=None, timestamp=None, **kwargs):
-    """Callback function for camonitor"""
-    dt = datetime.fromtimestamp(timestamp)
-    print(f"[{dt.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]}] {pvname} = {value}")
+def print_updates(events):
+    """Print a batch of monitor updates, called off the CA thread"""
+    for event in events:
+        dt = datetime.fromtimestamp(event.timestamp)
+        print(f"[{dt.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]}] {event.pvname} = {event.value}")
 
 
 def monitor_pv(pv_name, duration=10):
@@ -48,7 +52,9 @@ def monitor_pv(pv_name, duration=10):
     print(f"\nMonitoring {pv_name} for {duration} seconds...")
     print("Press Ctrl+C to stop early\n")
     
-    camonitor(pv_name, callback=monitor_callback)
+    # The CA callback only queues the update, printing happens on the dispatcher thread
+    dispatcher = MonitorDispatcher(print_updates).start()
+    camonitor(pv_name, callback=dispatcher.callback)
     
     try:
         time.sleep(duration)
@@ -65,6 +71,9 @@ def main():
     ai_pv = f"{pv_prefix}:aiExample"
     asub_pv = f"{pv_prefix}:aSubExample"
     
+    # Search for both PVs at once instead of one after the other on first use
+    warm_up([ai_pv, asub_pv])
+    
     print("="*60)
     print("Basic Channel Access Client - MyProject IOC")
     print("="*60)
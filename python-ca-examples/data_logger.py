@@ -3,21 +3,184 @@ PV Data Logger
 Demonstrates file I/O, data processing, and long-term monitoring
 """
 
+import argparse
 import csv
+import heapq
 import json
+import math
 from pathlib import Path
 from datetime import datetime
-from epics import PV
+from epics_common import instrumentation
+from epics_common.dispatch import MonitorDispatcher
+from epics_common.eventlog import EventLogWriter
+from epics_common.health import HealthMonitor
+from epics_common.lazy import lazy_import
 import time
 import threading
 
+# Only loaded when logging, so analyzing files never starts Channel Access
+epics = lazy_import("epics")
+np = lazy_import("numpy")
+
+
+COMPRESSION_MODES = ("deadband", "relative", "swinging-door")
+
+
+def _numeric(entry):
+    """Value of an entry as a float, or None for strings and arrays"""
+    value = entry['value']
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return None
+
+
+class Deadband:
+    """
+    Archive a sample only when it moves more than error from the last archived one
+    
+    With relative=True the band is error times the last archived value. Holding
+    each archived value until the next reproduces every received sample to
+    within the band. Status or severity changes and non-numeric values are
+    always archived.
+    """
+    
+    mode = "deadband"
+    
+    def __init__(self, error, relative=False):
+        self.error = error
+        self.relative = relative
+        if relative:
+            self.mode = "relative"
+        self.received = 0
+        self.archived = 0
+        self._last = None
+        self._pending = None
+    
+    def add(self, entry):
+        """Entries to write for one received sample"""
+        self.received += 1
+        value = _numeric(entry)
+        last = self._last
+        if value is not None and last is not None and _numeric(last) is not None \
+                and (entry['status'], entry['severity']) == (last['status'], last['severity']):
+            band = self.error * abs(_numeric(last)) if self.relative else self.error
+            if abs(value - _numeric(last)) <= band:
+                self._pending = entry
+                return []
+        self._last = entry
+        self._pending = None
+        self.archived += 1
+        return [entry]
+    
+    def flush(self):
+        """The latest sample if it was not archived, so the archive ends at the last update"""
+        if self._pending is None:
+            return []
+        entry, self._pending = self._pending, None
+        self._last = entry
+        self.archived += 1
+        return [entry]
+
+
+class SwingingDoor:
+    """
+    Swinging door trending: archive the corners of a piecewise linear fit
+    
+    Each archived point is the pivot of two doors E above and below it. Every
+    new sample narrows the range of slopes that keep all samples since the
+    pivot within E. When the range closes, the previous sample is archived on
+    a line inside it, at its own value whenever that line is allowed, and
+    becomes the next pivot. Linear interpolation between archived points is
+    therefore within error of every received sample. Status or severity
+    changes and non-numeric values are always archived.
+    """
+    
+    mode = "swinging-door"
+    
+    def __init__(self, error):
+        self.error = error
+        self.received = 0
+        self.archived = 0
+        self._pivot = None
+        self._pending = None
+        self._low = -math.inf
+        self._high = math.inf
+    
+    def _doors(self, entry):
+        """Slope range from the pivot that keeps entry within error"""
+        dt = entry['timestamp'] - self._pivot['timestamp']
+        rise = _numeric(entry) - _numeric(self._pivot)
+        return (rise - self.error) / dt, (rise + self.error) / dt
+    
+    def _archive_pending(self):
+        """Archive the pending sample on an allowed slope and make it the pivot"""
+        entry = self._pending
+        dt = entry['timestamp'] - self._pivot['timestamp']
+        slope = (_numeric(entry) - _numeric(self._pivot)) / dt
+        if not self._low <= slope <= self._high:
+            slope = min(max(slope, self._low), self._high)
+            entry = dict(entry, value=_numeric(self._pivot) + slope * dt)
+        self._pivot = entry
+        self._pending = None
+        self.archived += 1
+        return [entry]
+    
+    def add(self, entry):
+        """Entries to write for one received sample"""
+        self.received += 1
+        pivot = self._pivot
+        if _numeric(entry) is None or pivot is None or _numeric(pivot) is None \
+                or (entry['status'], entry['severity']) != (pivot['status'], pivot['severity']) \
+                or entry['timestamp'] <= (self._pending or pivot)['timestamp']:
+            out = self.flush()
+            # A new segment starts here, doors from the last pivot no longer apply
+            self._pivot = entry
+            self._low, self._high = -math.inf, math.inf
+            self.archived += 1
+            return out + [entry]
+        
+        low, high = self._doors(entry)
+        low, high = max(self._low, low), min(self._high, high)
+        if low <= high or self._pending is None:
+            self._low, self._high = low, high
+            self._pending = entry
+            return []
+        
+        out = self._archive_pending()
+        self._low, self._high = self._doors(entry)
+        self._pending = entry
+        return out
+    
+    def flush(self):
+        """Archive the sample held back as a possible corner"""
+        if self._pending is None:
+            return []
+        return self._archive_pending()
+
+
+def make_compressor(mode, error):
+    """Compressor for a COMPRESSION_MODES name, None for no compression"""
+    if mode in (None, "none"):
+        return None
+    if mode == "deadband":
+        return Deadband(error)
+    if mode == "relative":
+        return Deadband(error, relative=True)
+    if mode == "swinging-door":
+        return SwingingDoor(error)
+    raise ValueError(f"Unknown compression mode {mode!r}, expected one of {COMPRESSION_MODES}")
+
 
 class PVDataLogger:
     """Logger to record PV data to CSV and JSON formats"""
     
-    def __init__(self, pv_name, output_dir="logs"):
+    def __init__(self, pv_name, output_dir="logs", health=None, event_log=None, compressor=None):
         self.pv_name = pv_name
-        self.pv = PV(pv_name, callback=self._on_value_change)
+        self.health = health
+        # Optional epics_common.eventlog.EventLogWriter, may be shared by loggers
+        self.event_log = event_log
+        # Optional Deadband or SwingingDoor, only the samples it returns are archived
+        self.compressor = compressor
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(exist_ok=True)
         
@@ -35,6 +198,10 @@ class PVDataLogger:
         # Initialize CSV file
         self._initialize_csv()
         
+        # Monitor updates are queued on the CA thread and written in batches
+        self.dispatcher = MonitorDispatcher(self._log_events).start()
+        self.pv = epics.PV(pv_name, callback=self.dispatcher.callback)
+        
         print(f"Logger initialized for {pv_name}")
         print(f"CSV output: {self.csv_file}")
         print(f"JSON output: {self.json_file}")
@@ -45,40 +212,68 @@ class PVDataLogger:
             writer = csv.writer(f)
             writer.writerow(['timestamp', 'iso_time', 'pv_name', 'value', 'status', 'severity'])
     
-    def _on_value_change(self, pvname=None, value=None, timestamp=None, **kwargs):
-        """Callback when PV value changes"""
+    @instrumentation.timed("LOGGER:WRITE_BATCH")
+    def _log_events(self, events):
+        """Record a batch of monitor updates, runs on the dispatcher thread"""
         if not self.is_logging:
             return
         
+        start = time.perf_counter()
+        failed = 0
         with self.lock:
-            dt = datetime.fromtimestamp(timestamp)
-            entry = {
-                'timestamp': timestamp,
-                'iso_time': dt.isoformat(),
-                'pv_name': pvname,
-                'value': value,
-                'status': kwargs.get('status', 0),
-                'severity': kwargs.get('severity', 0)
-            }
-            self.data_buffer.append(entry)
+            entries = []
+            for event in events:
+                dt = datetime.fromtimestamp(event.timestamp)
+                entries.append({
+                    'timestamp': event.timestamp,
+                    'iso_time': dt.isoformat(),
+                    'pv_name': event.pvname,
+                    'value': event.value,
+                    'status': event.status,
+                    'severity': event.severity
+                })
             
-            # Write to CSV immediately
-            self._append_to_csv(entry)
+            # Raw events go to the stream export, consumers never parse the CSV
+            if self.event_log:
+                try:
+                    self.event_log.append_batch(events)
+                except OSError as e:
+                    failed = len(entries)
+                    print(f"Warning: Could not append to {self.event_log.directory}: {e}")
             
-            print(f"[{dt.strftime('%H:%M:%S')}] Logged: {pvname} = {value}")
+            if self.compressor:
+                entries = [kept for entry in entries for kept in self.compressor.add(entry)]
+            if entries:
+                failed = max(failed, self._archive(entries))
+                last = entries[-1]
+                print(f"[{last['iso_time'][11:19]}] Logged {len(entries)}: {last['pv_name']} = {last['value']}")
+        
+        if self.health:
+            self.health.record(time.perf_counter() - start, failed)
+    
+    def _archive(self, entries):
+        """Keep entries for the JSON summary and append them to the CSV, returns failures"""
+        self.data_buffer.extend(entries)
+        # One CSV append per batch rather than per update
+        try:
+            self._append_to_csv(entries)
+        except OSError as e:
+            print(f"Warning: Could not write {self.csv_file}: {e}")
+            return len(entries)
+        return 0
     
-    def _append_to_csv(self, entry):
-        """Append entry to CSV file"""
+    def _append_to_csv(self, entries):
+        """Append entries to CSV file"""
         with open(self.csv_file, 'a', newline='') as f:
             writer = csv.writer(f)
-            writer.writerow([
+            writer.writerows([
                 entry['timestamp'],
                 entry['iso_time'],
                 entry['pv_name'],
                 entry['value'],
                 entry['status'],
                 entry['severity']
-            ])
+            ] for entry in entries)
     
     def save_json_summary(self):
         """Save all logged data to JSON file"""
@@ -90,6 +285,13 @@ class PVDataLogger:
                 'total_samples': len(self.data_buffer),
                 'data': self.data_buffer
             }
+            if self.compressor:
+                data['compression'] = {
+                    'mode': self.compressor.mode,
+                    'error': self.compressor.error,
+                    'received': self.compressor.received,
+                    'archived': self.compressor.archived
+                }
             
             with open(self.json_file, 'w') as f:
                 json.dump(data, f, indent=2)
@@ -122,9 +324,17 @@ class PVDataLogger:
     
     def stop_logging(self):
         """Stop logging and save data"""
+        self.pv.disconnect()
+        self.dispatcher.stop()
         self.is_logging = False
+        if self.compressor:
+            with self.lock:
+                entries = self.compressor.flush()
+                if entries:
+                    self._archive(entries)
+            print(f"Archived {self.compressor.archived} of {self.compressor.received} updates "
+                  f"({self.compressor.mode}, error {self.compressor.error})")
         self.save_json_summary()
-        self.pv.disconnect()
 
 
 class DataAnalyzer:
@@ -177,16 +387,208 @@ class DataAnalyzer:
             print(f"  Max: {max(numeric_values)}")
             print(f"  Average: {sum(numeric_values) / len(numeric_values):.2f}")
             print(f"  Range: {max(numeric_values) - min(numeric_values)}")
+    
+    @staticmethod
+    def iter_csv(csv_file):
+        """Yield (timestamp, value) rows of a CSV one at a time, NaN if not numeric"""
+        with open(csv_file, 'r', newline='') as f:
+            reader = csv.reader(f)
+            header = next(reader, [])
+            if not header:
+                return
+            t_col, v_col = header.index('timestamp'), header.index('value')
+            for row in reader:
+                try:
+                    value = float(row[v_col])
+                except ValueError:
+                    value = math.nan
+                yield float(row[t_col]), value
+    
+    @staticmethod
+    def parse_value(text):
+        """A logged CSV value as a float, a float array, or the string itself"""
+        try:
+            return float(text)
+        except ValueError:
+            pass
+        # numpy prints arrays as [1. 2. 3.], summarized with ... beyond 1000 elements
+        if text.startswith('[') and text.endswith(']') and '...' not in text:
+            try:
+                return np.array(text[1:-1].replace(',', ' ').split(), dtype=float)
+            except ValueError:
+                pass
+        return text
+    
+    @staticmethod
+    def iter_records(csv_file):
+        """Yield (timestamp, pv_name, value) rows of a CSV one at a time, values parsed"""
+        with open(csv_file, 'r', newline='') as f:
+            reader = csv.reader(f)
+            header = next(reader, [])
+            if not header:
+                return
+            t_col, n_col, v_col = (header.index(c) for c in ('timestamp', 'pv_name', 'value'))
+            for row in reader:
+                yield float(row[t_col]), row[n_col], DataAnalyzer.parse_value(row[v_col])
+    
+    @staticmethod
+    def csv_pv_name(csv_file):
+        """PV name of the first row, or the file stem for an empty file"""
+        with open(csv_file, 'r', newline='') as f:
+            for row in csv.DictReader(f):
+                return row['pv_name']
+        return Path(csv_file).stem
+    
+    @staticmethod
+    def compression_of(csv_file):
+        """Compression mode recorded in the JSON summary next to a CSV, or None"""
+        try:
+            with open(Path(csv_file).with_suffix('.json'), 'r') as f:
+                return json.load(f).get('compression', {}).get('mode')
+        except (OSError, ValueError):
+            return None
+    
+    @staticmethod
+    def reconstruct(csv_file, times, mode=None):
+        """
+        Values of a logged PV at times, NaN outside the logged span
+        
+        Swinging door archives are interpolated linearly between archived
+        points and everything else holds the last archived value, which
+        reproduces every received sample to within the logger's error bound.
+        mode defaults to the one in the JSON summary.
+        """
+        mode = mode or DataAnalyzer.compression_of(csv_file)
+        rows = np.array(list(DataAnalyzer.iter_csv(csv_file)), dtype=float).reshape(-1, 2)
+        stamps, values = rows[:, 0], rows[:, 1]
+        times = np.asarray(times, dtype=float)
+        if not len(stamps):
+            return np.full(times.shape, math.nan)
+        if mode == "swinging-door":
+            return np.interp(times, stamps, values, left=math.nan, right=math.nan)
+        index = np.searchsorted(stamps, times, side='right') - 1
+        result = values[np.maximum(index, 0)]
+        return np.where((index >= 0) & (times <= stamps[-1]), result, math.nan)
+    
+    @staticmethod
+    def iter_aligned(csv_files, period=None, start=None, end=None, chunk_size=4096):
+        """
+        As-of join of logged CSV files onto one timeline, in NumPy chunks
+        
+        Yields (times, values) with values[i, j] the latest value of file j
+        at or before times[i], NaN before its first sample. Ticks are every
+        period seconds from start (default the first sample), or every
+        distinct timestamp when period is None. The files are streamed
+        through a k-way merge, so memory holds one row per file and one
+        chunk however long the logs are. Each file must be in time order,
+        as PVDataLogger writes them.
+        """
+        def column(j, csv_file):
+            for t, v in DataAnalyzer.iter_csv(csv_file):
+                yield t, j, v
+        
+        merged = heapq.merge(*(column(j, f) for j, f in enumerate(csv_files)))
+        latest = np.full(len(csv_files), math.nan)
+        times = np.empty(chunk_size)
+        values = np.empty((chunk_size, len(csv_files)))
+        n = 0
+        first = start
+        ticks = 0
+        tick = start
+        last = None
+        
+        for t, j, v in merged:
+            if first is None:
+                first = tick = t
+            # Every tick before this sample is complete
+            while tick < t and (end is None or tick <= end):
+                times[n] = tick
+                values[n] = latest
+                n += 1
+                if n == chunk_size:
+                    yield times.copy(), values.copy()
+                    n = 0
+                if period is None:
+                    tick = t
+                else:
+                    ticks += 1
+                    tick = first + ticks * period
+            if end is not None and t > end:
+                break
+            latest[j] = v
+            last = t
+        else:
+            # The last tick, if the final sample is at or after it
+            if last is not None and tick <= last and (end is None or tick <= end):
+                times[n] = tick
+                values[n] = latest
+                n += 1
+        
+        if n:
+            yield times[:n].copy(), values[:n].copy()
+    
+    @staticmethod
+    def align_csv(csv_files, period=None, start=None, end=None):
+        """All chunks of iter_aligned as (times, values, pv_names)"""
+        chunks = list(DataAnalyzer.iter_aligned(csv_files, period, start, end))
+        names = [DataAnalyzer.csv_pv_name(f) for f in csv_files]
+        if not chunks:
+            return np.empty(0), np.empty((0, len(csv_files))), names
+        times, values = zip(*chunks)
+        return np.concatenate(times), np.concatenate(values), names
+    
+    @staticmethod
+    def analyze_aligned(csv_files, period=None, output=None):
+        """Align CSV files and print their coverage and correlations"""
+        times, values, names = DataAnalyzer.align_csv(csv_files, period)
+        
+        print(f"\n{'='*60}")
+        print(f"As-of join of {len(csv_files)} files")
+        print(f"{'='*60}")
+        if not len(times):
+            print("No data found in files")
+            return
+        print(f"Ticks: {len(times)}" + (f" every {period} s" if period else ""))
+        print(f"Start time: {datetime.fromtimestamp(times[0]).isoformat()}")
+        print(f"End time: {datetime.fromtimestamp(times[-1]).isoformat()}")
+        
+        valid = ~np.isnan(values)
+        print(f"\n{'PV':<32}{'Ticks':>8}{'Mean':>14}")
+        for j, name in enumerate(names):
+            column = values[valid[:, j], j]
+            mean = f"{column.mean():.4g}" if len(column) else "-"
+            print(f"{name:<32}{len(column):>8}{mean:>14}")
+        
+        # Correlate only ticks where every PV has a value
+        rows = values[valid.all(axis=1)]
+        if len(rows) > 1 and len(names) > 1:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                corr = np.corrcoef(rows, rowvar=False)
+            print(f"\nCorrelation over {len(rows)} ticks:")
+            width = max(len(n) for n in names) + 2
+            print(" " * width + "".join(f"{j:>8}" for j in range(len(names))))
+            for j, name in enumerate(names):
+                print(f"{name:<{width}}" + "".join(f"{c:>8.3f}" for c in corr[j]))
+        
+        if output:
+            np.savez(output, times=times, values=values, pv_names=np.array(names))
+            print(f"\nSaved {output}")
 
 
-def demonstrate_logging():
+def demonstrate_logging(event_log_dir=None, compression=None, error=0.1):
     """Demonstrate data logging capabilities"""
     print("="*60)
     print("PV Data Logger Demonstration")
     print("="*60)
     
+    perf_reporter = instrumentation.start_from_env("bradm")
+    health = HealthMonitor("bradm", "LOGGER").start()
+
+    event_log = EventLogWriter(event_log_dir) if event_log_dir else None
+    
     # Start logging
-    logger = PVDataLogger("bradm:aSubExample")
+    logger = PVDataLogger("bradm:aSubExample", health=health, event_log=event_log,
+                          compressor=make_compressor(compression, error))
     
     # Wait for connection
     if not logger.pv.wait_for_connection(timeout=5.0):
@@ -195,7 +597,7 @@ def demonstrate_logging():
     
     # Generate some test data
     print("\nGenerating test data for 10 seconds...")
-    pv_writer = PV("bradm:aSubExample")
+    pv_writer = epics.PV("bradm:aSubExample")
     
     start_time = time.time()
     counter = 0
@@ -225,6 +627,12 @@ def demonstrate_logging():
     # Stop and save
     logger.stop_logging()
     pv_writer.disconnect()
+    if event_log:
+        event_log.close()
+        print(f"Event log: {event_log.appended} records in {event_log.directory}")
+    health.stop()
+    if perf_reporter:
+        perf_reporter.stop()
     
     # Analyze the saved file
     print("\n" + "="*60)
@@ -234,10 +642,38 @@ def demonstrate_logging():
     DataAnalyzer.analyze_csv(logger.csv_file)
 
 
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Log PV data and analyze logged files")
+    commands = parser.add_subparsers(dest="command")
+    demo = commands.add_parser("demo", help="log bradm:aSubExample for 10 seconds (default)")
+    demo.add_argument("--event-log", type=Path, help="also append updates to this event log")
+    demo.add_argument("--compression", choices=COMPRESSION_MODES, help="only archive updates outside the error bound")
+    demo.add_argument("--error", type=float, default=0.1,
+                      help="error bound, in PV units or as a fraction for relative (default 0.1)")
+    analyze = commands.add_parser("analyze", help="print statistics of logged CSV files")
+    analyze.add_argument("files", nargs="+", type=Path)
+    align = commands.add_parser("align", help="as-of join logged CSV files onto one timeline")
+    align.add_argument("files", nargs="+", type=Path)
+    align.add_argument("--period", type=float, help="tick every PERIOD s (default every update)")
+    align.add_argument("--output", type=Path, help="save times, values and pv_names to a .npz file")
+    return parser.parse_args()
+
+
 def main():
     """Main function"""
+    args = parse_args()
+    if args.command == "analyze":
+        for csv_file in args.files:
+            DataAnalyzer.analyze_csv(csv_file)
+        return
+    if args.command == "align":
+        DataAnalyzer.analyze_aligned(args.files, args.period, args.output)
+        return
+    
     try:
-        demonstrate_logging()
+        demonstrate_logging(getattr(args, "event_log", None), getattr(args, "compression", None),
+                            getattr(args, "error", 0.1))
     except Exception as e:
         print(f"\nError: {e}")
         print("\nMake sure:")
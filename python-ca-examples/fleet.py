@@ -0,0 +1,441 @@
+"""
+CA Client Fleet Simulator
+Runs many simulated clients in worker processes to find the IOC's client-count limit
+"""
+
+import argparse
+import math
+import multiprocessing
+import os
+import queue
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from epics_common import epicsdb
+from epics_common.health import HealthMonitor
+
+PERSONALITIES = ("logger", "monitor", "controller")
+REPORT_INTERVAL = 1.0  # s between worker reports
+# Readbacks from the simulators that clients watch; waveforms are left out
+WATCHED_GROUPS = ("DUMP", "TARGET", "VAC", "RF", "CRYO")
+
+
+def fleet_clients(ioc):
+    """Client names that have both fleet.db and health.db records"""
+    return sorted(
+        spec.name.split(":")[1]
+        for spec in ioc
+        if spec.name.endswith(":PERSONALITY")
+        and f"{ioc.prefix}:{spec.name.split(':')[1]}:HEALTH:HEARTBEAT" in ioc
+    )
+
+
+def watched_pvs(ioc):
+    """Scalar simulator PVs for personalities to monitor, log and read"""
+    return [
+        spec.name
+        for group in WATCHED_GROUPS
+        for spec in ioc.subsystem(group)
+        if spec.dtype in (float, int) and ":HEALTH:" not in spec.name
+    ]
+
+
+class ClientWorker:
+    """One simulated client, built from the example logger, monitor and controller"""
+
+    def __init__(self, client, personality, pvnames, options, seed):
+        self.client = client
+        self.personality = personality
+        self.pvnames = pvnames
+        self.options = options
+        self.prefix = options.prefix
+        self.rng = random.Random(seed)
+        self.health = HealthMonitor(self.prefix, client)
+        self.heartbeat_sent = {}
+        self.heartbeat_latency = []
+        self.puts = 0
+        self.gets = 0
+        self.failed = 0
+        self.injected = defaultdict(int)
+        self.loggers = []
+        self.monitors = []
+        self.controller = None
+
+    def connect(self):
+        """Create the personality's PVs and wait for them, returns seconds taken"""
+        from epics import PV
+        from advanced_ca_client import PVController, PVMonitor
+        from data_logger import PVDataLogger
+
+        start = time.perf_counter()
+        base = f"{self.prefix}:{self.client}"
+        if self.personality == "logger":
+            log_dir = os.path.join(self.options.log_dir, self.client)
+            os.makedirs(log_dir, exist_ok=True)
+            self.loggers = [
+                PVDataLogger(name, output_dir=log_dir, health=self.health)
+                for name in self.pvnames
+            ]
+            pvs = [logger.pv for logger in self.loggers]
+        elif self.personality == "monitor":
+            self.monitors = [PVMonitor(name, coalesce=True) for name in self.pvnames]
+            pvs = [monitor.pv for monitor in self.monitors]
+        else:
+            self.controller = PVController(self.pvnames + [f"{base}:SETPOINT"])
+            pvs = list(self.controller.pvs.values())
+
+        # The client watches its own heartbeat to time the IOC round trip
+        self.heartbeat_pv = PV(f"{base}:HEALTH:HEARTBEAT", callback=self._on_heartbeat)
+        pvs.append(self.heartbeat_pv)
+        for pv in pvs:
+            pv.wait_for_connection(timeout=self.options.connect_timeout)
+        PV(f"{base}:PERSONALITY").put(self.personality)
+        # Connects the health record channels outside the latency figures
+        self.health.publish()
+        return time.perf_counter() - start
+
+    def _on_heartbeat(self, value=None, **kwargs):
+        """Heartbeat monitor callback, records publish-to-update latency"""
+        sent = self.heartbeat_sent.pop(value, None)
+        if sent is not None:
+            self.heartbeat_latency.append(time.perf_counter() - sent)
+
+    def events(self):
+        """Monitor updates handled so far"""
+        if self.loggers:
+            return sum(logger.dispatcher.delivered for logger in self.loggers)
+        return sum(monitor.change_count for monitor in self.monitors)
+
+    def control_cycle(self):
+        """Read every watched PV and write the setpoint with put-callback"""
+        start = time.perf_counter()
+        values = self.controller.get_all()
+        self.gets += len(values)
+        setpoint = f"{self.prefix}:{self.client}:SETPOINT"
+        ok = self.controller.pvs[setpoint].put(self.rng.uniform(0, 100), wait=True, timeout=1.0)
+        self.puts += 1
+        failed = 0 if ok == 1 else 1
+        self.failed += failed
+        self.health.record(time.perf_counter() - start, failed)
+
+    def publish_heartbeat(self):
+        """Write the health records, noting when the next heartbeat was sent"""
+        self.heartbeat_sent[self.health.heartbeat + 1] = time.perf_counter()
+        self.health.publish()
+
+    def inject_failures(self, dt):
+        """Randomly crash, stall or report errors at the configured rates"""
+        options = self.options
+        if self.rng.random() < options.crash_rate * dt:
+            # Exit without cleanup, as a device losing power would
+            os._exit(3)
+        if self.rng.random() < options.stall_rate * dt:
+            self.injected["stalls"] += 1
+            time.sleep(options.stall_time)
+        if self.rng.random() < options.error_rate * dt:
+            self.injected["errors"] += 1
+            self.health.record(0.0, failed=1)
+
+    def report(self, connect_time=None):
+        """Counters since the last report, for the fleet runner"""
+        latency, self.heartbeat_latency = self.heartbeat_latency, []
+        return {
+            'client': self.client,
+            'personality': self.personality,
+            'pid': os.getpid(),
+            'time': time.time(),
+            'events': self.events(),
+            'puts': self.puts,
+            'gets': self.gets,
+            'failed': self.failed,
+            'connect_time': connect_time,
+            'heartbeat_latency': latency,
+            'injected': dict(self.injected),
+        }
+
+    def close(self):
+        """Stop loggers and monitors and disconnect"""
+        for logger in self.loggers:
+            logger.stop_logging()
+        for monitor in self.monitors:
+            monitor.disconnect()
+        if self.controller:
+            self.controller.disconnect_all()
+        self.heartbeat_pv.disconnect()
+
+
+def run_client(client, personality, pvnames, options, seed, results, stop):
+    """Worker process entry point, each process has its own CA context"""
+    # The example classes print every update
+    sys.stdout = open(os.devnull, 'w')
+    worker = ClientWorker(client, personality, pvnames, options, seed)
+    results.put(worker.report(connect_time=worker.connect()))
+
+    tick = 1.0 / options.rate
+    last_heartbeat = last_report = time.perf_counter()
+    try:
+        while not stop.is_set():
+            now = time.perf_counter()
+            if worker.controller:
+                worker.control_cycle()
+            if now - last_heartbeat >= options.heartbeat:
+                worker.publish_heartbeat()
+                last_heartbeat = now
+            if now - last_report >= REPORT_INTERVAL:
+                results.put(worker.report())
+                last_report = now
+            worker.inject_failures(tick)
+            stop.wait(max(tick - (time.perf_counter() - now), 0.0))
+    finally:
+        results.put(worker.report())
+        worker.close()
+
+
+class Fleet:
+    """Starts, restarts and collects reports from the client processes"""
+
+    def __init__(self, clients, pvnames, options):
+        self.clients = clients
+        self.pvnames = pvnames
+        self.options = options
+        self.ctx = multiprocessing.get_context('spawn')
+        self.results = self.ctx.Queue()
+        self.rng = random.Random(options.seed)
+        self.processes = {}
+        self.stops = {}
+        self.restart_at = {}
+        self.latest = {}
+        self.window = self._new_window()
+        self.levels = []
+        self.storm_started = None
+        self.storm_pending = 0
+
+    def _new_window(self):
+        return {
+            'start': time.perf_counter(),
+            'connects': [],
+            'heartbeat_latency': [],
+            'crashes': 0,
+        }
+
+    def personality(self, index):
+        return PERSONALITIES[index % len(PERSONALITIES)]
+
+    def start(self, client):
+        """Launch one client process"""
+        index = self.clients.index(client)
+        pvnames = self.rng.sample(self.pvnames, min(self.options.pvs, len(self.pvnames)))
+        stop = self.ctx.Event()
+        process = self.ctx.Process(
+            target=run_client,
+            args=(
+                client,
+                self.personality(index),
+                pvnames,
+                self.options,
+                self.rng.randrange(2**32),
+                self.results,
+                stop,
+            ),
+            daemon=True,
+        )
+        process.start()
+        self.processes[client] = process
+        self.stops[client] = stop
+        self.restart_at.pop(client, None)
+
+    def stop_all(self, timeout=5.0):
+        """Ask every client to finish cleanly, killing any that do not"""
+        for stop in self.stops.values():
+            stop.set()
+        deadline = time.perf_counter() + timeout
+        for process in self.processes.values():
+            process.join(max(deadline - time.perf_counter(), 0.0))
+            if process.is_alive():
+                process.kill()
+        self.processes.clear()
+
+    def storm(self):
+        """Kill every client at once and start them all again"""
+        running = list(self.processes)
+        self.storm_started = time.perf_counter()
+        self.storm_pending = len(running)
+        for client in running:
+            self.processes[client].kill()
+        for client in running:
+            self.processes[client].join()
+            self.start(client)
+        return len(running)
+
+    def supervise(self):
+        """Schedule restarts of crashed clients"""
+        now = time.perf_counter()
+        for client, process in list(self.processes.items()):
+            if not process.is_alive() and client not in self.restart_at:
+                self.window['crashes'] += 1
+                self.restart_at[client] = now + self.options.restart_delay
+        for client, when in list(self.restart_at.items()):
+            if now >= when:
+                self.start(client)
+
+    def collect(self, timeout):
+        """Drain worker reports into the current window"""
+        deadline = time.perf_counter() + timeout
+        while True:
+            try:
+                report = self.results.get(timeout=max(deadline - time.perf_counter(), 0.001))
+            except queue.Empty:
+                return
+            previous = self.latest.get(report['client'])
+            if report['connect_time'] is not None:
+                self.window['connects'].append(report['connect_time'])
+                previous = None  # counters restart with a new process
+                if self.storm_pending:
+                    self.storm_pending -= 1
+                    if not self.storm_pending:
+                        elapsed = time.perf_counter() - self.storm_started
+                        print(f"--- reconnect storm: all clients back in {elapsed:.2f}s ---")
+            report['delta'] = {
+                key: report[key] - (previous[key] if previous else 0)
+                for key in ('events', 'puts', 'gets', 'failed')
+            }
+            self.window['heartbeat_latency'].extend(report['heartbeat_latency'])
+            for key in ('events', 'puts', 'gets', 'failed'):
+                self.window.setdefault(key, 0)
+                self.window[key] += max(report['delta'][key], 0)
+            self.latest[report['client']] = report
+            if time.perf_counter() >= deadline:
+                return
+
+    def summarize(self):
+        """Rates and latencies for the current window, then start a new one"""
+        window, self.window = self.window, self._new_window()
+        elapsed = max(time.perf_counter() - window['start'], 1e-9)
+        latency = sorted(window['heartbeat_latency'])
+        connects = sorted(window['connects'])
+        return {
+            'clients': sum(p.is_alive() for p in self.processes.values()),
+            'events_rate': window.get('events', 0) / elapsed,
+            'puts_rate': window.get('puts', 0) / elapsed,
+            'gets_rate': window.get('gets', 0) / elapsed,
+            'failed': window.get('failed', 0),
+            'crashes': window['crashes'],
+            'reconnects': len(connects),
+            'connect_max': connects[-1] if connects else 0.0,
+            'connect_p50': connects[len(connects) // 2] if connects else 0.0,
+            'heartbeat_mean': sum(latency) / len(latency) if latency else 0.0,
+            'heartbeat_p99': latency[math.ceil(0.99 * len(latency)) - 1] if latency else 0.0,
+            'heartbeat_max': latency[-1] if latency else 0.0,
+        }
+
+
+def print_summary(elapsed, s):
+    """One status line per report interval"""
+    print(
+        f"[{elapsed:6.1f}s] clients={s['clients']:<3} "
+        f"events/s={s['events_rate']:8.1f} puts/s={s['puts_rate']:7.1f} gets/s={s['gets_rate']:8.1f} "
+        f"failed={s['failed']:<3} crashes={s['crashes']:<2} reconnects={s['reconnects']:<3} "
+        f"connect p50/max={s['connect_p50'] * 1e3:.0f}/{s['connect_max'] * 1e3:.0f}ms "
+        f"heartbeat mean/p99/max={s['heartbeat_mean'] * 1e3:.1f}/{s['heartbeat_p99'] * 1e3:.1f}/{s['heartbeat_max'] * 1e3:.1f}ms"
+    )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Simulated CA client fleet")
+    parser.add_argument("--clients", type=int, default=6, help="number of client processes")
+    parser.add_argument("--ramp", type=int, default=0, help="start this many clients and add as many every --ramp-interval")
+    parser.add_argument("--ramp-interval", type=float, default=10.0)
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds to run, 0 for until Ctrl+C")
+    parser.add_argument("--pvs", type=int, default=10, help="PVs per client")
+    parser.add_argument("--rate", type=float, default=10.0, help="controller cycles per second")
+    parser.add_argument("--heartbeat", type=float, default=1.0, help="heartbeat period in seconds")
+    parser.add_argument("--crash-rate", type=float, default=0.0, help="crashes per client per second")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="heartbeat stalls per client per second")
+    parser.add_argument("--stall-time", type=float, default=8.0, help="seconds a stalled client stops heartbeating")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="injected faults per client per second")
+    parser.add_argument("--restart-delay", type=float, default=2.0, help="seconds before a crashed client restarts")
+    parser.add_argument("--storm-every", type=float, default=0.0, help="restart every client at once this often")
+    parser.add_argument("--connect-timeout", type=float, default=5.0)
+    parser.add_argument("--log-dir", default=os.path.join(tempfile.gettempdir(), "fleet_logs"))
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def main():
+    """Run the fleet, printing aggregate figures once per second"""
+    options = parse_args()
+    ioc = epicsdb.load_ioc()
+    options.prefix = ioc.prefix
+    clients = fleet_clients(ioc)
+    if options.clients > len(clients):
+        print(f"Only {len(clients)} fleet clients have records, add FLEETnn entries")
+        print("to the fleet.db and health.db sections of user.substitutions")
+        return
+    clients = clients[:options.clients]
+    pvnames = watched_pvs(ioc)
+
+    print("="*60)
+    print(f"CA Client Fleet - {len(clients)} clients, {len(pvnames)} watchable PVs")
+    print("="*60)
+
+    fleet = Fleet(clients, pvnames, options)
+    step = options.ramp or len(clients)
+    active = clients[:step]
+    for client in active:
+        fleet.start(client)
+
+    start = last_ramp = last_storm = time.perf_counter()
+    level = []
+    try:
+        while not options.duration or time.perf_counter() - start < options.duration:
+            fleet.collect(timeout=1.0)
+            fleet.supervise()
+            summary = fleet.summarize()
+            level.append(summary)
+            now = time.perf_counter()
+            print_summary(now - start, summary)
+
+            if options.storm_every and now - last_storm >= options.storm_every:
+                print(f"--- reconnect storm: restarting {fleet.storm()} clients ---")
+                last_storm = now
+            if options.ramp and now - last_ramp >= options.ramp_interval and len(active) < len(clients):
+                fleet.levels.append((len(active), level))
+                level = []
+                added = clients[len(active):len(active) + step]
+                for client in added:
+                    fleet.start(client)
+                active += added
+                last_ramp = now
+                print(f"--- ramp: {len(active)} clients ---")
+    except KeyboardInterrupt:
+        print("\nStopping fleet...")
+
+    fleet.levels.append((len(active), level))
+    fleet.stop_all()
+    fleet.collect(timeout=0.5)
+
+    print("\n" + "="*60)
+    print("Fleet Summary")
+    print("="*60)
+    print(f"{'clients':>8} {'events/s':>10} {'puts/s':>8} {'gets/s':>9} {'hb p99 ms':>10} {'hb max ms':>10} {'reconnects':>11}")
+    for count, summaries in fleet.levels:
+        # Skip the first second of each level while new clients connect
+        steady = summaries[1:] or summaries
+        if not steady:
+            continue
+        n = len(steady)
+        print(
+            f"{count:>8} "
+            f"{sum(s['events_rate'] for s in steady) / n:>10.1f} "
+            f"{sum(s['puts_rate'] for s in steady) / n:>8.1f} "
+            f"{sum(s['gets_rate'] for s in steady) / n:>9.1f} "
+            f"{max(s['heartbeat_p99'] for s in steady) * 1e3:>10.1f} "
+            f"{max(s['heartbeat_max'] for s in steady) * 1e3:>10.1f} "
+            f"{sum(s['reconnects'] for s in summaries):>11}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Log Playback
+Re-publishes logged PV updates to the IOC at the recorded timing, N times faster, or as fast as possible
+"""
+
+import argparse
+import heapq
+import math
+import time
+from pathlib import Path
+from epics_common.batch import BatchWriter
+from epics_common.eventlog import EventLogReader
+from data_logger import DataAnalyzer
+
+REPORT_INTERVAL = 1.0  # s between progress reports
+MAX_BATCH = 4096  # puts per flush, bounds memory when playing as fast as possible
+
+
+def iter_event_log(directory, chunk_size=4096):
+    """Yield (timestamp, pv_name, value) from an event log in offset order"""
+    reader = EventLogReader(directory)
+    try:
+        while True:
+            records = reader.poll(chunk_size)
+            if not records:
+                return
+            for record in records:
+                yield record.timestamp, record.pvname, record.value
+    finally:
+        reader.close()
+
+
+def iter_source(path):
+    """Records of an event log directory or a PVDataLogger CSV file"""
+    if Path(path).is_dir():
+        return iter_event_log(path)
+    return DataAnalyzer.iter_records(path)
+
+
+def source_pvs(path):
+    """PV names in a source, a pass over the records for an event log"""
+    if Path(path).is_dir():
+        return {name for _, name, _ in iter_event_log(path)}
+    return {DataAnalyzer.csv_pv_name(path)}
+
+
+class Playback:
+    """
+    Replays recorded updates from any number of logs on one timeline
+
+    The sources are streamed through a k-way merge on timestamp, so updates
+    of different PVs go out in the order they were recorded and memory holds
+    one record per source plus one batch. Time is divided into ticks and
+    every update that falls due within a tick is put in one batch with a
+    single flush, at most one tick after its recorded time. speed 0 plays
+    as fast as the IOC accepts, MAX_BATCH puts per flush.
+    """
+
+    def __init__(self, sources, speed=1.0, tick=0.01, start=0.0, end=None, prefix=None, connect_timeout=5.0):
+        self.sources = [Path(source) for source in sources]
+        self.speed = speed
+        self.tick = tick
+        self.start = start
+        self.end = end
+        self.prefix = prefix
+        self.pv_names = sorted({self.rename(name) for source in self.sources for name in source_pvs(source)})
+        # Channels are searched in parallel, PVs that never connect count as failed puts
+        self.writer = BatchWriter(self.pv_names, connect_timeout)
+        self.updates = 0
+        self.batches = 0
+        self.failed = 0
+        self.max_lag = 0.0
+        self.position = 0.0
+        self.elapsed = 0.0
+
+    def rename(self, pv_name):
+        """Replace the IOC prefix of a recorded PV name, if one was given"""
+        if not self.prefix:
+            return pv_name
+        return f"{self.prefix}:{pv_name.split(':', 1)[-1]}"
+
+    def records(self):
+        """All sources merged in timestamp order, ties in source order"""
+        merged = heapq.merge(*(iter_source(source) for source in self.sources), key=lambda r: r[0])
+        return ((t, self.rename(name), value) for t, name, value in merged)
+
+    def write(self, batch):
+        """Put one batch and flush once"""
+        self.failed += self.writer.write(batch)
+        self.updates += len(batch)
+        self.batches += 1
+
+    def run(self, report=None):
+        """Play the window from start to end s into the recording, calling report(self) every second"""
+        records = self.records()
+        record = next(records, None)
+        if record is None:
+            return
+        begin = record[0] + self.start
+        end = math.inf if self.end is None else record[0] + self.end
+
+        # Bring every PV to its state at the start of the window in one batch
+        state = {}
+        while record is not None and record[0] < begin:
+            state[record[1]] = record[2]
+            record = next(records, None)
+        if state:
+            self.write(list(state.items()))
+
+        wall_start = time.perf_counter()
+        last_report = wall_start
+        while record is not None and record[0] <= end:
+            if self.speed:
+                # Sleep to the end of the tick the next update falls due in
+                due = (record[0] - begin) / self.speed
+                mark = math.ceil(due / self.tick) * self.tick
+                delay = wall_start + mark - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                now = time.perf_counter() - wall_start
+                horizon = min(begin + max(mark, now) * self.speed, end)
+                self.max_lag = max(self.max_lag, now - due)
+            else:
+                horizon = end
+
+            batch = []
+            while record is not None and record[0] <= horizon and len(batch) < MAX_BATCH:
+                batch.append(record[1:])
+                self.position = record[0] - begin
+                record = next(records, None)
+            self.write(batch)
+
+            now = time.perf_counter()
+            self.elapsed = now - wall_start
+            if report and now - last_report >= REPORT_INTERVAL:
+                report(self)
+                last_report = now
+        self.elapsed = time.perf_counter() - wall_start
+
+
+def print_progress(playback):
+    """One line of playback position and throughput"""
+    elapsed = max(playback.elapsed, 1e-9)
+    print(f"--- {playback.position:8.1f} s recorded in {elapsed:6.1f} s "
+          f"({playback.position / elapsed:.1f}x), {playback.updates} puts ({playback.updates / elapsed:.0f}/s) "
+          f"in {playback.batches} batches, {playback.failed} failed, max lag {playback.max_lag * 1e3:.1f} ms")
+
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Re-publish logged PV data to the IOC")
+    parser.add_argument("sources", nargs="+", type=Path, help="PVDataLogger CSV files and event log directories")
+    speed = parser.add_mutually_exclusive_group()
+    speed.add_argument("--speed", type=float, default=1.0, help="playback speed, 10 for ten times faster (default 1)")
+    speed.add_argument("--max-speed", action="store_true", help="put updates as fast as the IOC accepts them")
+    parser.add_argument("--tick", type=float, default=0.01, help="s of playback batched into one flush (default 0.01)")
+    parser.add_argument("--from", dest="start", type=float, default=0.0, help="start this many s into the recording")
+    parser.add_argument("--to", dest="end", type=float, help="stop this many s into the recording")
+    parser.add_argument("--prefix", help="replace the recorded IOC prefix, e.g. to replay onto a test IOC")
+    return parser.parse_args()
+
+
+def main():
+    """Main function"""
+    args = parse_args()
+    speed = 0.0 if args.max_speed else args.speed
+
+    print("="*60)
+    print(f"Log Playback: {len(args.sources)} sources at {'maximum speed' if not speed else f'{speed:g}x'}")
+    print("="*60)
+
+    playback = Playback(args.sources, speed, args.tick, args.start, args.end, args.prefix)
+    print(f"{len(playback.pv_names)} PVs: {', '.join(playback.pv_names[:8])}"
+          f"{', ...' if len(playback.pv_names) > 8 else ''}")
+    try:
+        playback.run(print_progress)
+    except KeyboardInterrupt:
+        print("\nStopped by user")
+    print_progress(playback)
+
+
+if __name__ == "__main__":
+    main()
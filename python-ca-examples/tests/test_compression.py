@@ -0,0 +1,65 @@
+import random
+
+import numpy as np
+import pytest
+
+from data_logger import Deadband, SwingingDoor
+
+
+def entry(t, value, severity=0):
+    return {'timestamp': t, 'iso_time': '', 'pv_name': 'TEST', 'value': value,
+            'status': 0, 'severity': severity}
+
+
+def compress(compressor, entries):
+    archived = [kept for e in entries for kept in compressor.add(e)]
+    return archived + compressor.flush()
+
+
+def max_error(entries, archived, interpolate):
+    """Largest difference between each received value and the archive's reconstruction"""
+    stamps = np.array([a['timestamp'] for a in archived])
+    values = np.array([a['value'] for a in archived], dtype=float)
+    times = np.array([e['timestamp'] for e in entries])
+    if interpolate:
+        rebuilt = np.interp(times, stamps, values)
+    else:
+        rebuilt = values[np.searchsorted(stamps, times, side='right') - 1]
+    return np.max(np.abs(rebuilt - [e['value'] for e in entries]))
+
+
+def flat_then_ramp():
+    """Flat line, then a 5/s ramp sampled every second starting with a severity change"""
+    entries = [entry(0.1 * k, 100.0) for k in range(50)]
+    entries += [entry(5.0 + k, 100.0 + 5.0 * k, severity=1) for k in range(10)]
+    return entries
+
+
+def random_walk(seed):
+    rng = random.Random(seed)
+    value, entries = 0.0, []
+    for k in range(2000):
+        value += rng.gauss(0, 0.3)
+        entries.append(entry(0.01 * k, value, severity=int(k % 500 == 499)))
+    return entries
+
+
+@pytest.mark.parametrize('entries', [flat_then_ramp()] + [random_walk(seed) for seed in range(5)])
+def test_swinging_door_error_bound(entries):
+    archived = compress(SwingingDoor(0.5), entries)
+    assert len(archived) < len(entries)
+    assert max_error(entries, archived, interpolate=True) <= 0.5 + 1e-9
+
+
+def test_swinging_door_restarts_doors_after_severity_change():
+    archived = compress(SwingingDoor(0.5), flat_then_ramp())
+    # Doors left over from the flat line must not clamp the ramp's corners
+    for a in archived:
+        if a['severity'] == 1:
+            assert abs(a['value'] - (100.0 + 5.0 * (a['timestamp'] - 5.0))) <= 0.5
+
+
+@pytest.mark.parametrize('entries', [flat_then_ramp()] + [random_walk(seed) for seed in range(5)])
+def test_deadband_error_bound(entries):
+    archived = compress(Deadband(0.5), entries)
+    assert max_error(entries, archived, interpolate=False) <= 0.5 + 1e-9
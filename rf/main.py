@@ -0,0 +1,189 @@
+import argparse
+import concurrent.futures
+import sys
+import time
+import numpy as np
+from epics_common import epicsdb, instrumentation
+from epics_common.batch import BatchWriter
+from epics_common.health import HealthMonitor
+
+IOC = epicsdb.load_ioc()
+IOC_PREFIX = IOC.prefix
+PVS = IOC.pv_map("RF", writable=True)
+
+NUM_KLYSTRONS = 5
+PULSE_FREQUENCY = 14.0  # Hz
+SAMPLES = PVS["pulse_time"].nelm
+SAMPLE_PERIOD = 2e-6  # s
+PULSE_START = 0.2e-3  # s
+PULSE_LENGTH = 1.2e-3  # s
+RISE_TIME = 15e-6  # s
+FILL_TIME = 60e-6  # s, cavity filling time constant
+DROOP = 0.03  # fractional power loss across the flat top
+CENTER_FREQUENCY = 2856.0  # MHz
+ARC_PROBABILITY = 2e-4  # per klystron per pulse
+TRIP_TIME = 5.0  # s off after an arc
+
+
+class KlystronGallery:
+    """All klystron pulses computed together as (klystron, sample) blocks"""
+
+    def __init__(self, n=NUM_KLYSTRONS, seed=None):
+        self.n = n
+        self.rng = np.random.default_rng(seed)
+        self.time = np.arange(SAMPLES) * SAMPLE_PERIOD
+        t = self.time - PULSE_START
+        in_pulse = (t >= 0) & (t <= PULSE_LENGTH)
+        rise = 1.0 - np.exp(-np.clip(t, 0, None) / RISE_TIME)
+        self.envelope = np.where(in_pulse, rise, 0.0)
+        self.droop = np.where(in_pulse, 1.0 - DROOP * t / PULSE_LENGTH, 0.0)
+        # Reflection is high while the cavity fills and when the drive stops
+        fill = np.exp(-np.clip(t, 0, None) / FILL_TIME)
+        self.reflection = np.where(in_pulse, fill, 0.0)
+        self.flat_top = (t > 5 * FILL_TIME) & (t < PULSE_LENGTH - RISE_TIME)
+
+        self.peak_power = self.rng.uniform(4.5, 5.5, n)  # MW
+        self.base_reflection = self.rng.uniform(0.08, 0.15, n)
+        self.phase_offset = self.rng.uniform(0.0, 360.0, n)
+        self.frequency = CENTER_FREQUENCY + self.rng.normal(0.0, 0.002, n)
+        self.on = np.ones(n, dtype=bool)
+        self.trip_until = np.zeros(n)
+        self.pulse_count = 0
+
+    @instrumentation.timed("RF:PULSE")
+    def pulse(self, now):
+        """Forward power (MW), reflected power (kW) and phase (deg) waveforms"""
+        n = self.n
+        self.on = now >= self.trip_until
+        self.frequency += self.rng.normal(0.0, 1e-4, n)
+        self.phase_offset = (self.phase_offset + self.rng.normal(0.0, 0.05, n)) % 360
+
+        amplitude = self.peak_power * (1.0 + self.rng.normal(0.0, 0.005, n)) * self.on
+        ripple = 1.0 + 0.01 * np.sin(
+            2 * np.pi * 50e3 * self.time + self.rng.uniform(0, 2 * np.pi, (n, 1))
+        )
+        forward = amplitude[:, None] * self.envelope * self.droop * ripple
+
+        gamma = self.base_reflection[:, None] + (
+            1.0 - self.base_reflection[:, None]
+        ) * (self.reflection * 0.6)
+        arcs = self.on & (self.rng.random(n) < ARC_PROBABILITY)
+        gamma[arcs] = np.maximum(gamma[arcs], 0.9 * self.envelope)
+        reflected = forward * gamma**2 * 1e3
+
+        slope = self.rng.normal(0.0, 2.0, (n, 1)) * (self.time - PULSE_START) * 1e3
+        noise = self.rng.normal(0.0, 0.2, (n, SAMPLES))
+        phase = (self.phase_offset[:, None] + slope + noise) % 360
+
+        self.trip_until[arcs] = now + TRIP_TIME
+        self.pulse_count += 1
+        return forward, reflected, phase
+
+    def summary(self, forward, reflected, phase):
+        """Flat-top averages per klystron"""
+        top = self.flat_top
+        angle = np.deg2rad(phase[:, top])
+        mean_phase = np.rad2deg(
+            np.arctan2(np.sin(angle).mean(axis=1), np.cos(angle).mean(axis=1))
+        )
+        return (
+            forward[:, top].mean(axis=1),
+            reflected[:, top].mean(axis=1),
+            mean_phase % 360,
+        )
+
+
+@instrumentation.timed("RF:PUBLISH")
+def publish_to_epics(
+    writer: BatchWriter, gallery: KlystronGallery, waveforms, publish_waveforms
+) -> int:
+    forward, reflected, phase = waveforms
+    fwd, ref, phs = gallery.summary(forward, reflected, phase)
+    items = []
+    for i in range(gallery.n):
+        kly = f"kly{i + 1}"
+        items += [
+            (PVS[f"{kly}_pwr_fwd"].name, fwd[i]),
+            (PVS[f"{kly}_pwr_ref"].name, ref[i]),
+            (PVS[f"{kly}_phase"].name, phs[i]),
+            (PVS[f"{kly}_freq"].name, gallery.frequency[i]),
+            (PVS[f"{kly}_status"].name, int(gallery.on[i])),
+        ]
+        if publish_waveforms:
+            items += [
+                (PVS[f"{kly}_pwr_fwd_wf"].name, forward[i]),
+                (PVS[f"{kly}_pwr_ref_wf"].name, reflected[i]),
+                (PVS[f"{kly}_phase_wf"].name, phase[i]),
+            ]
+    items.append((PVS["pulse_count"].name, gallery.pulse_count))
+    items.append((PVS["system_status"].name, int(gallery.on.all())))
+    return writer.write(items)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Klystron gallery RF simulator")
+    parser.add_argument(
+        "--waveforms",
+        action="store_true",
+        help="also publish every pulse as waveform PVs",
+    )
+    parser.add_argument(
+        "--rate", type=float, default=PULSE_FREQUENCY, help="pulse rate in Hz"
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    print("Klystron Gallery RF Simulator")
+    print("Press Ctrl+C to exit\n")
+
+    gallery = KlystronGallery()
+    writer = BatchWriter(pv.name for pv in PVS.values())
+    writer.write([(PVS["pulse_time"].name, gallery.time * 1e6)])
+    epics_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    perf_reporter = instrumentation.start_from_env(IOC_PREFIX)
+    health = HealthMonitor(IOC_PREFIX, "RF").start()
+    period = 1.0 / args.rate
+    next_pulse = time.time()
+
+    try:
+        while True:
+            now = time.time()
+            if now < next_pulse:
+                time.sleep(next_pulse - now)
+            next_pulse += period
+
+            waveforms = gallery.pulse(now)
+            health.submit(
+                epics_executor,
+                publish_to_epics,
+                writer,
+                gallery,
+                waveforms,
+                args.waveforms,
+            )
+
+            if gallery.pulse_count % int(args.rate / 2 or 1) == 0:
+                fwd, ref, _ = gallery.summary(*waveforms)
+                line = ""
+                for i in range(gallery.n):
+                    color = "\033[92m" if gallery.on[i] else "\033[91m"
+                    line += f"K{i + 1}={color}{fwd[i]:.2f}MW\033[0m "
+                sys.stdout.write(
+                    f"\r{line}| total={fwd.sum():.2f}MW | "
+                    f"pulses={gallery.pulse_count}  "
+                )
+                sys.stdout.flush()
+
+    except KeyboardInterrupt:
+        print("\n\nSimulator stopped.")
+        print(f"Total pulses: {gallery.pulse_count}")
+        health.stop()
+        if perf_reporter:
+            perf_reporter.stop()
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
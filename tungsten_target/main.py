@@ -3,33 +3,46 @@ import sys
 import random
 import concurrent.futures
 from datetime import datetime
-from epics import caput
+import numpy as np
+from epics_common import epicsdb, instrumentation
+from epics_common.alarms import AlarmEngine
+from epics_common.batch import BatchWriter
+from epics_common.health import HealthMonitor
+from epics_common.scheduler import PublishScheduler, publish_periods
 
 NUM_TARGETS = 36
 PULSE_FREQUENCY = 14.0
-IOC_PREFIX = "bradm"
-PVS = {
-    "temp1": f"{IOC_PREFIX}:TARGET:TEMP1",
-    "temp2": f"{IOC_PREFIX}:TARGET:TEMP2",
-    "temp3": f"{IOC_PREFIX}:TARGET:TEMP3",
-    "temp4": f"{IOC_PREFIX}:TARGET:TEMP4",
-    "rot_speed": f"{IOC_PREFIX}:TARGET:ROT_SPEED",
-    "position": f"{IOC_PREFIX}:TARGET:POSITION",
-    "cool_flow": f"{IOC_PREFIX}:TARGET:COOL_FLOW",
-    "cool_temp_in": f"{IOC_PREFIX}:TARGET:COOL_TEMP_IN",
-    "cool_temp_out": f"{IOC_PREFIX}:TARGET:COOL_TEMP_OUT",
-    "power": f"{IOC_PREFIX}:TARGET:POWER",
-    "beam_current": f"{IOC_PREFIX}:TARGET:BEAM_CURRENT",
-    "neutron_rate": f"{IOC_PREFIX}:TARGET:NEUTRON_RATE",
-    "vibration": f"{IOC_PREFIX}:TARGET:VIBRATION",
-    "pulse_count": f"{IOC_PREFIX}:TARGET:PULSE_COUNT",
-    "timestamp": f"{IOC_PREFIX}:TARGET:TIMESTAMP",
+# PV names, units and limits come from tungsten_target.db via user.substitutions
+IOC = epicsdb.load_ioc()
+IOC_PREFIX = IOC.prefix
+PVS = IOC.pv_map("TARGET", writable=True)
+# Records publish at their SCAN rate, Passive ones at PASSIVE_PERIOD unless
+# overridden here by key
+PASSIVE_PERIOD = 0.5  # s
+PUBLISH_PERIODS = {"timestamp": 1.0, "segment_temps": 1.0}
+# HealthMonitor publishes the HEALTH records itself
+PUBLISHED = [pv for pv in PVS.values() if ":HEALTH:" not in pv.name]
+# Segment thermal model, one segment takes each pulse
+# Sized so the segment just hit peaks near 720 K at 500 kW, below the 750 K
+# HIGH limit of TEMPn, with the ring average near 680 K
+SEGMENT_HEAT_CAPACITY = 600.0  # J/K, about 4.5 kg of tungsten
+SEGMENT_COOLING = 36.0  # W/K to the coolant at nominal flow
+SEGMENT_CONDUCTANCE = 5.0  # W/K between neighbouring segments
+NOMINAL_FLOW = 45.0  # L/min
+# TEMPn read the segments that took the beam 0, 9, 18 and 27 pulses ago
+SENSOR_LAGS = np.array([0, 9, 18, 27])
+SEVERITY_COLORS = {
+    0: "\033[92m",  # Green, NO_ALARM
+    1: "\033[93m",  # Yellow, MINOR
+    2: "\033[91m",  # Red, MAJOR
+    3: "\033[95m",  # Magenta, INVALID
 }
 
 
 class TargetSimulator:
     def __init__(self):
-        self.temps = [680.0, 685.0, 675.0, 690.0]
+        self.segments = np.full(NUM_TARGETS, 680.0)  # K
+        self.temps = self.segments[SENSOR_LAGS]
         self.cooling_flow = 45.0  # L/min
         self.cooling_temp_in = 18.0  # C
         self.beam_current = 50.0  # uA
@@ -38,11 +51,30 @@ class TargetSimulator:
         self.pulse_count = 0
         self.start_time = time.time()
 
+    def step_segments(self, position, dt=1.0 / PULSE_FREQUENCY):
+        """
+        Advance every segment by one pulse period
+
+        The segment under the beam takes the pulse energy, heat then
+        conducts to the neighbouring segments around the ring, and every
+        segment decays towards the coolant temperature with a cooling
+        coefficient that scales with the flow. Builds a new array so a
+        publish in progress never sees a half-updated map.
+        """
+        segments = self.segments.copy()
+        segments[position] += self.beam_power * 1e3 * dt / SEGMENT_HEAT_CAPACITY
+        neighbours = np.roll(segments, 1) + np.roll(segments, -1) - 2 * segments
+        segments += SEGMENT_CONDUCTANCE * dt / SEGMENT_HEAT_CAPACITY * neighbours
+        cooling = SEGMENT_COOLING * (self.cooling_flow / NOMINAL_FLOW) ** 0.8
+        coolant = self.cooling_temp_in + 273.15
+        decay = np.exp(-cooling * dt / SEGMENT_HEAT_CAPACITY)
+        self.segments = coolant + (segments - coolant) * decay
+        sensors = self.segments[(position - SENSOR_LAGS) % NUM_TARGETS]
+        self.temps = sensors + np.random.normal(0.0, 0.5, len(SENSOR_LAGS))
+
+    @instrumentation.timed("TARGET:UPDATE")
     def update(self, position):
-        for i in range(4):  # Add heat when position is near sensor
-            heat_input = 0.5 if position % 9 == i * 2 else 0.0
-            self.temps[i] += random.gauss(0, 0.5) + heat_input - 0.3
-            self.temps[i] = max(600, min(850, self.temps[i]))
+        self.step_segments(position)
         self.cooling_flow = 45.0 + random.gauss(0, 1.0)
         self.cooling_flow = max(40, min(50, self.cooling_flow))
         temp_rise = self.beam_power / (self.cooling_flow * 4.186)
@@ -54,33 +86,32 @@ class TargetSimulator:
         self.rotation_speed = PULSE_FREQUENCY + random.gauss(0, 0.05)
         self.pulse_count += 1
 
-    def publish_to_epics(self, position):
-        try:
-            caput(PVS["temp1"], self.temps[0], wait=False)
-            caput(PVS["temp2"], self.temps[1], wait=False)
-            caput(PVS["temp3"], self.temps[2], wait=False)
-            caput(PVS["temp4"], self.temps[3], wait=False)
-            caput(PVS["rot_speed"], self.rotation_speed, wait=False)
-            caput(PVS["position"], position, wait=False)
-            caput(PVS["cool_flow"], self.cooling_flow, wait=False)
-            caput(PVS["cool_temp_in"], self.cooling_temp_in, wait=False)
-            caput(PVS["cool_temp_out"], self.cooling_temp_out, wait=False)
-            caput(PVS["power"], self.beam_power, wait=False)
-            caput(PVS["beam_current"], self.beam_current, wait=False)
-            caput(PVS["neutron_rate"], self.beam_power * 1e13, wait=False)
-            caput(
-                PVS["vibration"],
-                max(0, 1.0 + (sum(self.temps) / 4 - 680) / 100),
-                wait=False,
-            )
-            caput(PVS["pulse_count"], self.pulse_count, wait=False)
-            caput(
-                PVS["timestamp"],
-                datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                wait=False,
-            )
-        except Exception as e:
-            print(f"\nWarning: Could not publish to EPICS: {e}")
+    @instrumentation.timed("TARGET:PUBLISH")
+    def publish_to_epics(self, writer: BatchWriter, due, position) -> int:
+        """Write the PVs in due with a single flush, returns the failed count"""
+        values = [
+            (PVS["temp1"].name, self.temps[0]),
+            (PVS["temp2"].name, self.temps[1]),
+            (PVS["temp3"].name, self.temps[2]),
+            (PVS["temp4"].name, self.temps[3]),
+            (PVS["segment_temps"].name, self.segments),
+            (PVS["rot_speed"].name, self.rotation_speed),
+            (PVS["position"].name, position),
+            (PVS["cool_flow"].name, self.cooling_flow),
+            (PVS["cool_temp_in"].name, self.cooling_temp_in),
+            (PVS["cool_temp_out"].name, self.cooling_temp_out),
+            (PVS["power"].name, self.beam_power),
+            (PVS["beam_current"].name, self.beam_current),
+            (PVS["neutron_rate"].name, self.beam_power * 1e13),
+            (PVS["vibration"].name, max(0, 1.0 + (sum(self.temps) / 4 - 680) / 100)),
+            (PVS["pulse_count"].name, self.pulse_count),
+            (PVS["timestamp"].name, datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+        ]
+        due = set(due)
+        failed = writer.write((pv, value) for pv, value in values if pv in due)
+        if failed:
+            instrumentation.count("TARGET:PUBLISH_ERRORS", failed)
+        return failed
 
 
 def main():
@@ -89,18 +120,33 @@ def main():
 
     simulator = TargetSimulator()
     epics_executor = concurrent.futures.ThreadPoolExecutor()
-    last_publish_time = 0
-    publish_interval = 0.5
+    perf_reporter = instrumentation.start_from_env(IOC_PREFIX)
+    health = HealthMonitor(IOC_PREFIX, "TARGET").start()
+    # Channels search in the background, unconnected PVs count as failed puts
+    writer = BatchWriter([pv.name for pv in PUBLISHED], connect_timeout=0)
+    scheduler = PublishScheduler(
+        publish_periods(PUBLISHED, PASSIVE_PERIOD, PUBLISH_PERIODS)
+    )
+    temp_alarms = AlarmEngine(PVS[f"temp{i}"] for i in range(1, 5))
+    position = 0
 
     try:
         while True:
             elapsed = time.time() - simulator.start_time
-            position = round(elapsed / (1 / PULSE_FREQUENCY)) % NUM_TARGETS
-            simulator.update(position)
-
-            if elapsed - last_publish_time >= publish_interval:
-                epics_executor.submit(simulator.publish_to_epics, position)
-                last_publish_time = elapsed
+            # Step the model once per beam pulse, the display runs faster
+            while simulator.pulse_count < int(elapsed * PULSE_FREQUENCY):
+                position = simulator.pulse_count % NUM_TARGETS
+                simulator.update(position)
+
+            # Everything due on this tick goes out in one batch, a dropped
+            # batch goes out again with the next tick
+            due = scheduler.due()
+            if due:
+                future = health.submit(
+                    epics_executor, simulator.publish_to_epics, writer, due, position
+                )
+                if future is None:
+                    scheduler.defer(due)
 
             line = ""
             for i in range(NUM_TARGETS):
@@ -109,13 +155,11 @@ def main():
                 else:
                     line += "• "  # Inactive target
 
+            # Color by the worst sensor using the TEMPn record alarm limits
+            temp_alarms.evaluate(simulator.temps, elapsed)
+            color = SEVERITY_COLORS[int(temp_alarms.severity.max())]
             avg_temp = sum(simulator.temps) / 4
-            if avg_temp > 750:
-                temp_str = f"\033[91m{avg_temp:.0f}K\033[0m"  # Red
-            elif avg_temp > 700:
-                temp_str = f"\033[93m{avg_temp:.0f}K\033[0m"  # Yellow
-            else:
-                temp_str = f"\033[92m{avg_temp:.0f}K\033[0m"  # Green
+            temp_str = f"{color}{avg_temp:.0f}K\033[0m"
 
             sys.stdout.write(
                 f"\r{line} | "
@@ -132,6 +176,9 @@ def main():
     except KeyboardInterrupt:
         print("\n\nMonitor stopped.")
         print(f"Total pulses: {simulator.pulse_count}")
+        health.stop()
+        if perf_reporter:
+            perf_reporter.stop()
         sys.exit(0)
 
 
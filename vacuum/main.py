@@ -0,0 +1,185 @@
+import argparse
+import concurrent.futures
+import sys
+import time
+import numpy as np
+from epics_common import epicsdb, instrumentation
+from epics_common.batch import BatchWriter
+from epics_common.health import HealthMonitor
+
+IOC = epicsdb.load_ioc()
+IOC_PREFIX = IOC.prefix
+PVS = IOC.pv_map("VAC", writable=True)
+
+ATMOSPHERE = 760.0  # Torr
+STEP = 0.1  # s
+# Pressure where the turbo pumps take over from the roughing pumps
+CROSSOVER = 1e-2  # Torr
+ROUGHING_SPEED = 10.0  # L/s per gauge volume
+# Volume (L), turbo pump speed (L/s), outgassing (Torr L/s) and
+# conductance to the neighbouring gauge volume (L/s) for each section
+SECTIONS = {
+    "INJ": (50.0, 200.0, 2e-7, 20.0),
+    "ACC": (30.0, 400.0, 5e-8, 10.0),
+    "BL": (40.0, 300.0, 1e-8, 15.0),
+    "TGT": (80.0, 500.0, 5e-7, 30.0),
+}
+BURST_LOAD = 2e-5  # Torr L/s
+BURST_DECAY = 2.0  # s
+GAUGE_NOISE = 0.02  # relative
+GAUGES = [pv for pv in PVS.values() if pv.name.split(":")[2] in SECTIONS]
+
+
+class VacuumNetwork:
+    """Gauge volumes along the beamline coupled by conductances"""
+
+    def __init__(self, gauges, pressure=ATMOSPHERE, seed=None):
+        sections = [g.name.split(":")[2] for g in gauges]
+        params = np.array([SECTIONS[s] for s in sections])
+        self.names = [g.name for g in gauges]
+        self.sections = sections
+        self.volume = params[:, 0]
+        self.turbo_speed = params[:, 1]
+        self.outgassing = params[:, 2]
+        self.floor = np.array([g.lopr or 0.0 for g in gauges])
+        self.ceiling = np.array([g.hopr or ATMOSPHERE for g in gauges])
+
+        # Series conductance between neighbours as a graph Laplacian
+        n = len(gauges)
+        link = 1.0 / (1.0 / params[:-1, 3] + 1.0 / params[1:, 3])
+        self.laplacian = np.zeros((n, n))
+        idx = np.arange(n - 1)
+        self.laplacian[idx, idx + 1] = -link
+        self.laplacian[idx + 1, idx] = -link
+        self.laplacian[np.diag_indices(n)] = -self.laplacian.sum(axis=1)
+
+        self.pressure = np.full(n, pressure)
+        self.leak = np.zeros(n)
+        self.burst = np.zeros(n)
+        self.rng = np.random.default_rng(seed)
+        self.time = 0.0
+
+    def pump_speed(self):
+        """Roughing pumps at high pressure blending into the turbos below crossover"""
+        blend = 1.0 / (1.0 + (self.pressure / CROSSOVER) ** 2)
+        return ROUGHING_SPEED + (self.turbo_speed - ROUGHING_SPEED) * blend
+
+    def add_leak(self, index, load):
+        self.leak[index] += load
+
+    @instrumentation.timed("VAC:STEP")
+    def step(self, dt=STEP, burst_rate=0.0):
+        """Advance every gauge volume by dt with one implicit solve"""
+        hits = self.rng.random(len(self.burst)) < burst_rate * dt
+        self.burst[hits] += BURST_LOAD
+        gas = self.outgassing + self.leak + self.burst
+
+        # (V/dt + S + L) P' = V/dt P + Q, stable for any dt and conductance
+        system = self.laplacian.copy()
+        system[np.diag_indices_from(system)] += self.volume / dt + self.pump_speed()
+        self.pressure = np.linalg.solve(system, self.volume / dt * self.pressure + gas)
+
+        self.burst *= np.exp(-dt / BURST_DECAY)
+        self.time += dt
+
+    def readings(self):
+        """Gauge readings with noise, floored at each gauge's lower limit"""
+        noise = self.rng.lognormal(0.0, GAUGE_NOISE, len(self.pressure))
+        return np.maximum(self.pressure * noise, self.floor)
+
+    def status_ok(self, readings):
+        return bool(np.all(readings <= self.ceiling))
+
+
+@instrumentation.timed("VAC:PUBLISH")
+def publish_to_epics(writer: BatchWriter, network: VacuumNetwork, readings) -> int:
+    items = list(zip(network.names, readings))
+    items.append((PVS["status"].name, int(network.status_ok(readings))))
+    return writer.write(items)
+
+
+def section_summary(network: VacuumNetwork, readings):
+    parts = []
+    for section in SECTIONS:
+        mask = np.array([s == section for s in network.sections])
+        worst = readings[mask].max()
+        ceiling = network.ceiling[mask].min()
+        color = "\033[92m" if worst <= ceiling else "\033[91m"
+        parts.append(f"{section}={color}{worst:.1e}\033[0m")
+    return " | ".join(parts)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Vacuum system simulator")
+    parser.add_argument(
+        "--base", action="store_true", help="start at base pressure, not vented"
+    )
+    parser.add_argument(
+        "--leak",
+        action="append",
+        default=[],
+        metavar="SECTION:GAUGE",
+        help="add a 1e-6 Torr L/s leak at a gauge, e.g. ACC:P03",
+    )
+    parser.add_argument(
+        "--burst-rate",
+        type=float,
+        default=0.002,
+        help="gas bursts per gauge per second",
+    )
+    parser.add_argument(
+        "--speed", type=float, default=1.0, help="simulated seconds per second"
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    print("Vacuum System Simulator")
+    print("Press Ctrl+C to exit\n")
+
+    network = VacuumNetwork(GAUGES)
+    if args.base:
+        for _ in range(2000):
+            network.step(dt=10.0)
+        network.time = 0.0
+    for leak in args.leak:
+        network.add_leak(network.names.index(f"{IOC_PREFIX}:VAC:{leak}"), 1e-6)
+
+    writer = BatchWriter(network.names + [PVS["status"].name])
+    epics_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    perf_reporter = instrumentation.start_from_env(IOC_PREFIX)
+    health = HealthMonitor(IOC_PREFIX, "VAC").start()
+    last_publish_time = 0.0
+    publish_interval = 1.0
+    start_time = time.time()
+
+    try:
+        while True:
+            elapsed = time.time() - start_time
+            while network.time < elapsed * args.speed:
+                network.step(burst_rate=args.burst_rate)
+
+            readings = network.readings()
+            if elapsed - last_publish_time >= publish_interval:
+                health.submit(
+                    epics_executor, publish_to_epics, writer, network, readings
+                )
+                last_publish_time = elapsed
+
+            summary = section_summary(network, readings)
+            sys.stdout.write(f"\r{summary} | t={network.time:.1f}s  ")
+            sys.stdout.flush()
+
+            time.sleep(STEP)
+
+    except KeyboardInterrupt:
+        print("\n\nSimulator stopped.")
+        health.stop()
+        if perf_reporter:
+            perf_reporter.stop()
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()